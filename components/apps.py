@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class ComponentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'components'
+
+    def ready(self) -> None:
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        from . import instrumentation, signals  # noqa: F401
+        from .responses import install
+        from .search import create_table
+        from .sqlite import configure_connection
+        connection_created.connect(configure_connection, dispatch_uid='components.sqlite')
+        # Records the tables read by the queries of responses to cache
+        connection_created.connect(install, dispatch_uid='components.responses')
+        # Times the queries of the requests sampled for instrumentation
+        connection_created.connect(instrumentation.install, dispatch_uid='components.instrumentation')
+        # The FTS5 table is no model, it is created once the component tables are migrated
+        post_migrate.connect(create_table, sender=self, dispatch_uid='components.search')
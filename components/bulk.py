@@ -0,0 +1,153 @@
+"""Bulk writes of components and their relations.
+
+Imports and syncs change hundreds to thousands of components at a time, which per row
+`save()` turns into as many transactions, and `OrderedModel` into extra queries for the
+next `order` of every link and f-node. `save_components` writes a whole batch with
+`bulk_create`/`bulk_update` in one transaction instead: the component manager stamps the
+timestamps and maintains the search index, relations are diffed against the stored rows
+and ordered relations get contiguous orders.
+"""
+from typing import Any, Dict, List, Sequence, Type
+
+from django.db import models as django_models, transaction
+from ordered_model.models import OrderedModel
+
+from . import changes
+from .models import AnnotatedQualification, Component, OrderedFNode, OrderedLink
+from .sqlite import BATCH_SIZE
+
+# Fields a batch may set, by attname
+FIELDS = {
+    field.attname: field for field in Component._meta.concrete_fields
+    if field.editable and not field.primary_key and field.name not in ('creator', 'last_modifier')
+}
+REQUIRED = {name for name, field in FIELDS.items() if not field.null and not field.blank and not field.has_default()}
+# Relation: (model, foreign key to the component, the related row it is matched by)
+RELATIONS: Dict[str, tuple] = {
+    'links': (OrderedLink, 'base_component', 'link'),
+    'f_nodes': (OrderedFNode, 'base_component', 'f_node'),
+    'qualifications': (AnnotatedQualification, 'component', 'qualification'),
+}
+
+
+def check_references(rows: Sequence[Dict[str, Any]]) -> None:
+    """Raise `ValueError` when a foreign key of `rows` refers to a missing row."""
+    references: Dict[Type[django_models.Model], set] = {}
+    for row in rows:
+        for name, value in row.items():
+            if name in FIELDS and FIELDS[name].is_relation and value is not None:
+                references.setdefault(FIELDS[name].related_model, set()).add(value)
+        for relation, (model, _, target) in RELATIONS.items():
+            related_model = model._meta.get_field(target).related_model
+            for values in row.get(relation) or ():
+                references.setdefault(related_model, set()).add(values[f'{target}_id'])
+    for model, pks in references.items():
+        missing = pks - set(model._default_manager.filter(pk__in=pks).values_list('pk', flat=True))
+        if missing:
+            raise ValueError(f"Unknown {model.__name__} IDs: {', '.join(map(str, sorted(missing)))}")
+
+
+def sync_relation(model: Type[django_models.Model], fk: str, target: str,
+                  wanted: Dict[Any, List[Dict[str, Any]]]) -> None:
+    """Make the `model` rows of each component in `wanted` equal its list of field values.
+
+    Rows are matched by their `target`: matched rows are updated where they differ,
+    missing ones created and the others deleted. Ordered models get the orders 0 to n-1
+    in the order of the list.
+    """
+    if not wanted:
+        return
+    fk_attname = model._meta.get_field(fk).attname
+    target_attname = model._meta.get_field(target).attname
+    ordered = issubclass(model, OrderedModel)
+
+    stored: Dict[tuple, List[django_models.Model]] = {}
+    for row in model._default_manager.filter(**{f'{fk_attname}__in': list(wanted)}).order_by('pk'):
+        stored.setdefault((getattr(row, fk_attname), getattr(row, target_attname)), []).append(row)
+
+    created, updated, fields = [], [], set()
+    for key, rows in wanted.items():
+        for position, values in enumerate(rows):
+            if ordered:
+                values = {**values, 'order': position}
+            matches = stored.get((key, values[target_attname]))
+            if not matches:
+                created.append(model(**{fk_attname: key}, **values))
+                continue
+            row = matches.pop(0)
+            changed = {name for name, value in values.items() if getattr(row, name) != value}
+            if changed:
+                for name in changed:
+                    setattr(row, name, values[name])
+                updated.append(row)
+                fields |= changed
+
+    stale = [row.pk for rows in stored.values() for row in rows]
+    if stale:
+        model._default_manager.filter(pk__in=stale).delete()
+    if updated:
+        model._default_manager.bulk_update(updated, fields, batch_size=BATCH_SIZE)
+    # The orders above are already right
+    model._default_manager.bulk_create(created, batch_size=BATCH_SIZE, **({'keep_orders': True} if ordered else {}))
+
+
+def save_components(rows: Sequence[Dict[str, Any]], user) -> List[Component]:
+    """Create and update components with their relations in one transaction.
+
+    Each row maps field attnames to values; rows with a `pk` update that component and
+    keep the fields they omit. `links` and `f_nodes` are lists of `{'link_id': ...}`
+    and `{'f_node_id': ...}` and `qualifications` of `{'qualification_id': ...,
+    'annotation': ...}`; given, they replace the component's relation. Returns the
+    components in the order of `rows`.
+    """
+    for index, row in enumerate(rows):
+        unknown = set(row) - set(FIELDS) - set(RELATIONS) - {'pk'}
+        if unknown:
+            raise ValueError(f"Row {index}: unknown fields {', '.join(sorted(unknown))}")
+        missing = REQUIRED - set(row) if 'pk' not in row else set()
+        missing |= {name for name in REQUIRED & set(row) if row[name] is None}
+        if missing:
+            raise ValueError(f"Row {index}: missing fields {', '.join(sorted(missing))}")
+
+    components = []
+    with transaction.atomic():
+        # In batches, so the `IN` lists stay within SQLite's limit of query parameters
+        for start in range(0, len(rows), BATCH_SIZE):
+            components.extend(save_batch(rows[start:start + BATCH_SIZE], user))
+    return components
+
+
+def save_batch(rows: Sequence[Dict[str, Any]], user) -> List[Component]:
+    check_references(rows)
+    pks = [row['pk'] for row in rows if 'pk' in row]
+    existing = Component.objects.in_bulk(pks)
+    missing = set(pks) - set(existing)
+    if missing:
+        raise ValueError(f"Unknown Component IDs: {', '.join(map(str, sorted(missing)))}")
+
+    components, created, updated, fields = [], [], [], {'last_modifier'}
+    for row in rows:
+        values = {name: value for name, value in row.items() if name in FIELDS}
+        if 'pk' in row:
+            component = existing[row['pk']]
+            for name, value in values.items():
+                setattr(component, name, value)
+            component.last_modifier = user
+            fields.update(FIELDS[name].name for name in values)
+            updated.append(component)
+        else:
+            component = Component(**values, creator=user, last_modifier=user)
+            created.append(component)
+        components.append(component)
+
+    Component.objects.bulk_create(created)
+    if updated:
+        Component.objects.bulk_update(updated, fields, batch_size=BATCH_SIZE)
+    # The components are stamped already, their relations need not touch them again
+    with changes.untouched():
+        for relation, (model, fk, target) in RELATIONS.items():
+            sync_relation(model, fk, target, {
+                component.pk: row[relation] for component, row in zip(components, rows)
+                if row.get(relation) is not None
+            })
+    return components
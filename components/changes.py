@@ -0,0 +1,59 @@
+"""The changes of the components since a point in time, for clients mirroring the catalogue.
+
+A component counts as changed when its row is saved and when its links, f-nodes,
+qualifications or reviews (the models of `components.counters.COUNTERS`) change: the
+receivers in `components.signals` and the querysets in `components.managers` touch its
+`last_modified` then. Deleted components leave a `ComponentTombstone`. `QuerySet.update()`
+of the relations and raw SQL are not seen.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterable, Iterator
+
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import Component, ComponentTombstone
+from .sqlite import BATCH_SIZE
+
+_untouched = threading.local()
+
+
+def touch(pks: Iterable[Any]) -> None:
+    """Set the `last_modified` of the components in `pks` to now, for a change of their relations."""
+    if getattr(_untouched, 'active', False):
+        return
+    from .managers import rows_changed
+    pks = [pk for pk in set(pks) if pk is not None]
+    now = timezone.now()
+    for start in range(0, len(pks), BATCH_SIZE):
+        Component._base_manager.filter(pk__in=pks[start:start + BATCH_SIZE]).update(last_modified=now)
+    if pks:
+        rows_changed.send(sender=Component)
+
+
+@contextmanager
+def untouched() -> Iterator[None]:
+    """Leave the timestamps of the components alone, for writes that set them explicitly."""
+    previous = getattr(_untouched, 'active', False)
+    _untouched.active = True
+    try:
+        yield
+    finally:
+        _untouched.active = previous
+
+
+def record_deleted(pks: Iterable[Any]) -> None:
+    now = timezone.now()
+    ComponentTombstone.objects.bulk_create([ComponentTombstone(component_id=pk, deleted=now) for pk in pks])
+
+
+def changed_since(queryset: QuerySet, since: datetime) -> QuerySet:
+    """The components of `queryset` changed after `since`, oldest change first."""
+    return queryset.filter(last_modified__gt=since).order_by('last_modified', 'id')
+
+
+def deleted_since(since: datetime) -> QuerySet:
+    """The tombstones of the components deleted after `since`, oldest first."""
+    return ComponentTombstone.objects.filter(deleted__gt=since)
@@ -0,0 +1,40 @@
+"""Validators of conditional GET requests, answered with `304 Not Modified` when they match."""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def etag(*parts: Any, weak: bool = False) -> str:
+    """Return an ETag of the JSON encodable `parts`, weak if the encoding of the body may differ."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    response_etag = quote_etag(hashlib.sha256(encoded.encode('utf-8')).hexdigest())
+    return f'W/{response_etag}' if weak else response_etag
+
+
+def is_conditional(request: HttpRequest) -> bool:
+    return any(header in request.headers for header in (
+        'If-Match', 'If-None-Match', 'If-Modified-Since', 'If-Unmodified-Since',
+    ))
+
+
+def set_validators(response: HttpResponse, response_etag: str, last_modified: Optional[datetime] = None) -> None:
+    response['ETag'] = response_etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+
+
+def not_modified(request: HttpRequest, response_etag: str,
+                 last_modified: Optional[datetime] = None) -> Optional[HttpResponse]:
+    """Return the `304 Not Modified` (or `412`) response of `request` if its validators match, else None."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=response_etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, response_etag, last_modified)
+    return response
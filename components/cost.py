@@ -0,0 +1,215 @@
+"""Query cost analysis of the GraphQL schema.
+
+The cost of an operation is the number of nodes it resolves, i.e. the rows it may load.
+A connection contributes its page size, `first`/`last` or else the relay maximum, per
+parent object, so nested connections multiply. `QueryCostExtension` estimates the cost
+from the document before execution, rejects operations over the `GRAPHQL_QUERY_COST_LIMIT`
+setting or clamps their page sizes, and reports the estimated and the actual cost in the
+response `extensions`. `components.optimizer.limit_prefetches` reads the clamped pages
+of nested connections only, instead of slicing whole prefetched lists.
+"""
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from graphql import (
+    DocumentNode, ExecutionResult, FieldNode, FragmentDefinitionNode, GraphQLError, GraphQLObjectType,
+    GraphQLSchema, get_named_type, get_nullable_type, get_operation_ast, is_abstract_type, is_composite_type,
+    is_list_type,
+)
+from graphql.execution.collect_fields import collect_sub_fields
+from graphql.execution.values import get_argument_values, get_variable_values
+from strawberry.extensions import SchemaExtension
+from strawberry.types.info import Info
+
+
+class PageLimit(NamedTuple):
+    """The largest page size of the connections nested in at least `depth` other connections."""
+    size: int
+    depth: int
+
+
+page_limit: ContextVar[Optional[PageLimit]] = ContextVar('page_limit', default=None)
+
+
+def clamp_page_size(info: Info, first: Optional[int], last: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
+    """Lower the `first`/`last` arguments of a connection to the page limit of the operation."""
+    limit = page_limit.get()
+    if limit is None or sum(key == 'edges' for key in info.path.as_list()) < limit.depth:
+        return first, last
+    if first is None and last is not None:
+        return first, min(last, limit.size)
+    return min(first if first is not None else info.schema.config.relay_max_results, limit.size), last
+
+
+def is_connection(graphql_type) -> bool:
+    return isinstance(graphql_type, GraphQLObjectType) and {'edges', 'pageInfo'} <= set(graphql_type.fields)
+
+
+class QueryCost:
+    """Estimate and count the nodes an operation resolves."""
+
+    def __init__(self, schema: GraphQLSchema, document: DocumentNode, operation_name: Optional[str],
+                 variables: Optional[Dict[str, Any]], max_results: int):
+        self.schema = schema
+        self.max_results = max_results
+        self.operation = get_operation_ast(document, operation_name)
+        if self.operation is None:
+            raise ValueError('Unknown operation.')
+        self.root_type = schema.get_root_type(self.operation.operation)
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions if isinstance(definition, FragmentDefinitionNode)
+        }
+        coerced = get_variable_values(schema, self.operation.variable_definitions or (), variables or {})
+        if isinstance(coerced, list):
+            raise ValueError('Invalid variables.')
+        self.variables = coerced
+        self.node_interface = schema.get_type('Node')
+
+    def is_node(self, graphql_type) -> bool:
+        return graphql_type is self.node_interface or self.node_interface in getattr(graphql_type, 'interfaces', ())
+
+    def subfields(self, graphql_type, field_nodes: List[Any]) -> Iterator[Tuple[Any, List[FieldNode]]]:
+        """Yield the field definitions selected on `graphql_type` with their nodes."""
+        for nodes in collect_sub_fields(self.schema, self.fragments, self.variables, graphql_type, field_nodes).values():
+            name = nodes[0].name.value
+            if not name.startswith('__'):
+                yield graphql_type.fields[name], nodes
+
+    def estimate(self, limit: Optional[PageLimit] = None) -> int:
+        return self._estimate(self.root_type, [self.operation], 1, 0, 0, limit)
+
+    def _estimate(self, graphql_type, field_nodes, count: int, depth: int, page: int,
+                  limit: Optional[PageLimit]) -> int:
+        if is_abstract_type(graphql_type):
+            return max((
+                self._estimate(possible_type, field_nodes, count, depth, page, limit)
+                for possible_type in self.schema.get_possible_types(graphql_type)
+            ), default=0)
+
+        cost = count if self.is_node(graphql_type) else 0
+        for field, nodes in self.subfields(graphql_type, field_nodes):
+            field_type = get_named_type(field.type)
+            if not is_composite_type(field_type):
+                continue
+            arguments = get_argument_values(field, nodes[0], self.variables)
+            child_count, child_depth, child_page = count, depth, page
+            if is_connection(field_type):
+                child_page = self.page_size(arguments, depth, limit)
+                child_depth = depth + 1
+            if is_list_type(get_nullable_type(field.type)):
+                if is_connection(graphql_type):
+                    length = page
+                else:
+                    # e.g. the IDs of `nodes`, else as many items as a page may have
+                    length = next((len(value) for value in arguments.values() if isinstance(value, list)),
+                                  self.max_results)
+                child_count = count * length
+            cost += self._estimate(field_type, nodes, child_count, child_depth, child_page, limit)
+        return cost
+
+    def page_size(self, arguments: Dict[str, Any], depth: int, limit: Optional[PageLimit]) -> int:
+        size = arguments.get('first')
+        if size is None:
+            size = arguments.get('last')
+        size = self.max_results if size is None else min(size, self.max_results)
+        if limit is not None and depth >= limit.depth:
+            size = min(size, limit.size)
+        return size
+
+    def fit(self, budget: int) -> Optional[PageLimit]:
+        """Return the largest page limit keeping the estimate within `budget`, nested connections first."""
+        for depth in (1, 0):
+            if self.estimate(PageLimit(1, depth)) > budget:
+                continue
+            low, high = 1, self.max_results
+            while low < high:
+                size = (low + high + 1) // 2
+                if self.estimate(PageLimit(size, depth)) <= budget:
+                    low = size
+                else:
+                    high = size - 1
+            return PageLimit(low, depth)
+        return None
+
+    def actual(self, data: Optional[Dict[str, Any]]) -> int:
+        """Count the nodes in the `data` of the operation's result."""
+        return self._count(self.root_type, [self.operation], data)
+
+    def _count(self, graphql_type, field_nodes, value) -> int:
+        if value is None:
+            return 0
+        if isinstance(value, list):
+            return sum(self._count(graphql_type, field_nodes, item) for item in value)
+
+        cost = 1 if self.is_node(graphql_type) else 0
+        possible_types = self.schema.get_possible_types(graphql_type) if is_abstract_type(graphql_type) \
+            else [graphql_type]
+        fields = {}
+        for possible_type in possible_types:
+            for field, nodes in self.subfields(possible_type, field_nodes):
+                fields.setdefault(nodes[0].alias.value if nodes[0].alias else nodes[0].name.value, (field, nodes))
+        for key, item in value.items():
+            if key in fields and is_composite_type(get_named_type(fields[key][0].type)):
+                field, nodes = fields[key]
+                cost += self._count(get_named_type(field.type), nodes, item)
+        return cost
+
+
+class QueryCostExtension(SchemaExtension):
+    """Enforce the query cost budget and report the costs in the response `extensions`.
+
+    Over `GRAPHQL_QUERY_COST_LIMIT`, the default `reject` policy of
+    `GRAPHQL_QUERY_COST_POLICY` fails the operation. The opt-in `clamp` policy lowers the
+    page sizes of the nested connections, and of the outer ones if that does not suffice,
+    to the largest size within the budget, noted only in the `extensions`.
+    """
+
+    report: Optional[Dict[str, Any]] = None
+
+    def on_execute(self) -> Iterator[None]:
+        execution_context = self.execution_context
+        if execution_context.result is not None:
+            # Answered by an earlier extension, e.g. from the response cache
+            yield
+            return
+        try:
+            analysis = QueryCost(
+                execution_context.schema._schema, execution_context.graphql_document,
+                execution_context.operation_name, execution_context.variables,
+                execution_context.schema.config.relay_max_results,
+            )
+        except ValueError:
+            # Let the execution report the invalid operation or variables
+            yield
+            return
+
+        budget = getattr(settings, 'GRAPHQL_QUERY_COST_LIMIT', None)
+        estimated = analysis.estimate()
+        self.report = {'estimated': estimated, 'budget': budget}
+        limit = None
+        if budget is not None and estimated > budget:
+            if getattr(settings, 'GRAPHQL_QUERY_COST_POLICY', 'reject') == 'clamp':
+                limit = analysis.fit(budget)
+            if limit is None:
+                execution_context.result = ExecutionResult(data=None, errors=[GraphQLError(
+                    f'The estimated query cost of {estimated} exceeds the budget of {budget}, '
+                    f'request smaller pages with `first` or `last` on the nested connections.',
+                    extensions={'code': 'QUERY_COST_EXCEEDED', 'cost': estimated, 'budget': budget},
+                )])
+                yield
+                return
+            self.report.update(requested=estimated, estimated=analysis.estimate(limit),
+                               clampedPageSize=limit.size, clampedFromDepth=limit.depth)
+
+        token = page_limit.set(limit)
+        try:
+            yield
+        finally:
+            page_limit.reset(token)
+        if execution_context.result is not None:
+            self.report['actual'] = analysis.actual(execution_context.result.data)
+
+    def get_results(self) -> Dict[str, Any]:
+        return {'cost': self.report} if self.report is not None else {}
@@ -0,0 +1,82 @@
+"""Denormalized relation counts of the components, maintained on write.
+
+`BaseComponent.links_count`/`f_nodes_count` and `Component.qualifications_count`/
+`reviews_count` hold the number of rows of the counted models below. Saving and
+deleting single rows is counted by the receivers in `components.signals`, the querysets
+in `components.managers` count `bulk_create()` and `delete()` per batch. Foreign key
+changes through `QuerySet.update()` and raw SQL are not seen; the `recount` command
+repairs the counters afterwards.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Tuple, Type
+
+from django.db import models as django_models
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from . import models
+from .optimizer import total_count_subquery
+
+# Counted model: (foreign key to the component, counter column, relation on the component)
+COUNTERS: Dict[Type[django_models.Model], Tuple[str, str, str]] = {
+    models.OrderedLink: ('base_component', 'links_count', 'links'),
+    models.OrderedFNode: ('base_component', 'f_nodes_count', 'f_nodes'),
+    models.AnnotatedQualification: ('component', 'qualifications_count', 'qualifications'),
+    models.Review: ('component', 'reviews_count', 'reviews'),
+}
+
+_suspended = threading.local()
+
+
+def key_attname(model: Type[django_models.Model]) -> str:
+    return model._meta.get_field(COUNTERS[model][0]).attname
+
+
+def counted_model(model: Type[django_models.Model]) -> Type[django_models.Model]:
+    return model._meta.get_field(COUNTERS[model][0]).related_model
+
+
+def add(model: Type[django_models.Model], counts: Mapping[Any, int]) -> None:
+    """Add `counts`, a delta per component primary key, to the counters of `model`."""
+    _, counter, _ = COUNTERS[model]
+    by_delta: Dict[int, list] = {}
+    for pk, delta in counts.items():
+        if pk is not None and delta:
+            by_delta.setdefault(delta, []).append(pk)
+    for delta, pks in by_delta.items():
+        # A drifted counter must not fail deletes on the non-negative constraint
+        value = F(counter) + delta if delta > 0 else Greatest(F(counter) + delta, 0)
+        counted_model(model)._base_manager.filter(pk__in=pks).update(**{counter: value})
+
+
+def recount(model: Type[django_models.Model], pks: Optional[Iterable[Any]] = None) -> int:
+    """Recompute the counters of `model`, of all components or those in `pks`.
+
+    Returns the number of components whose counter was wrong.
+    """
+    _, counter, relation = COUNTERS[model]
+    target = counted_model(model)
+    queryset = target._base_manager.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=[pk for pk in pks if pk is not None])
+    actual = total_count_subquery(target, relation)
+    drifted = queryset.annotate(actual=actual).exclude(**{counter: F('actual')}).count()
+    if drifted:
+        queryset.update(**{counter: actual})
+    return drifted
+
+
+@contextmanager
+def suspended(model: Type[django_models.Model]) -> Iterator[None]:
+    """Make the signal receivers ignore `model`, whose counts are maintained in bulk."""
+    previous = getattr(_suspended, 'models', frozenset())
+    _suspended.models = previous | {model}
+    try:
+        yield
+    finally:
+        _suspended.models = previous
+
+
+def is_suspended(model: Type[django_models.Model]) -> bool:
+    return model in getattr(_suspended, 'models', ())
@@ -0,0 +1,191 @@
+"""Synthetic component datasets for tests, benchmarks and the `seed` command.
+
+Rows are written with batched `bulk_create`, which skips `Model.save()`. The managers
+stamp missing timestamps, but the generated ones are given explicitly so a seed always
+yields the same rows, and the `order` of the ordered relations is filled in as well.
+"""
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Callable, List, Optional, Sequence, Type
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import models as django_models, transaction
+from django.utils import timezone
+from faker import Faker
+
+from . import changes, models
+from .sqlite import BATCH_SIZE
+
+# Fixed point in time the generated timestamps lie before, so a seed always yields the same rows
+SEED_EPOCH = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+SEED_PERIOD = timedelta(days=5 * 365)
+
+
+def bulk_get_or_create(model: Type[django_models.Model], instances: Sequence[django_models.Model],
+                       field: str) -> List[django_models.Model]:
+    """Insert the `instances` missing in the database and return all of them, matched by `field`."""
+    model.objects.bulk_create(instances, ignore_conflicts=True, batch_size=BATCH_SIZE)
+    values = [getattr(instance, field) for instance in instances]
+    existing = {}
+    for start in range(0, len(values), BATCH_SIZE):
+        for instance in model.objects.filter(**{f'{field}__in': values[start:start + BATCH_SIZE]}):
+            existing[getattr(instance, field)] = instance
+    return [existing[value] for value in values]
+
+
+def create_components(count: int, relations: int = 3) -> None:
+    """Create `count` components with `relations` links, f-nodes, qualifications and reviews each."""
+    user, _ = User.objects.get_or_create(username='tester')
+    type_, _ = models.Type.objects.get_or_create(name='Resistor')
+    library, _ = models.Library.objects.get_or_create(ref='lib')
+    lifecycle_state, _ = models.LifecycleState.objects.get_or_create(name='Active')
+    manufacturer, _ = models.Company.objects.get_or_create(name='ACME', url='https://example.com')
+    mounting, _ = models.MountingType.objects.get_or_create(name='SMD')
+    package, _ = models.Package.objects.get_or_create(name='0603')
+    qualifications = [models.Qualification.objects.get_or_create(name=f'Q{i}')[0] for i in range(relations)]
+    links = [
+        models.Link.objects.get_or_create(name=f'Link {i}', url=f'https://example.com/{i}')[0]
+        for i in range(relations)
+    ]
+    f_nodes = [models.FNode.objects.get_or_create(ref=f'F{i}')[0] for i in range(relations)]
+    now = timezone.now()
+
+    for start in range(0, count, BATCH_SIZE):
+        with transaction.atomic():
+            components = models.Component.objects.bulk_create([
+                models.Component(
+                    type=type_, library=library, creator=user, last_modifier=user,
+                    lifecycle_state=lifecycle_state, manufacturer=manufacturer, mpn=f'MPN-{i}',
+                    mounting=mounting, package=package, created=now, last_modified=now
+                )
+                for i in range(start, min(start + BATCH_SIZE, count))
+            ])
+            bulk_create_relations(
+                components,
+                links=lambda component: links,
+                f_nodes=lambda component: f_nodes,
+                qualifications=lambda component: qualifications,
+                reviews=lambda component: [(user, now)] * relations,
+            )
+
+
+def bulk_create_relations(components: Sequence[models.Component], links: Callable, f_nodes: Callable,
+                          qualifications: Callable, reviews: Callable) -> None:
+    """Create the ordered links and f-nodes, the qualifications and the reviews of `components`.
+
+    Each argument maps a component to its related rows; `reviews` returns
+    `(reviewer, date)` pairs. Every other review refers to one of the component's
+    qualifications, when it has any. The components keep their `last_modified`.
+    """
+    with changes.untouched():
+        _bulk_create_relations(components, links, f_nodes, qualifications, reviews)
+
+
+def _bulk_create_relations(components: Sequence[models.Component], links: Callable, f_nodes: Callable,
+                           qualifications: Callable, reviews: Callable) -> None:
+    ordered_links, ordered_f_nodes, annotated_qualifications = [], [], []
+    for component in components:
+        ordered_links.extend(
+            models.OrderedLink(link=link, base_component=component, order=order)
+            for order, link in enumerate(links(component))
+        )
+        ordered_f_nodes.extend(
+            models.OrderedFNode(f_node=f_node, base_component=component, order=order)
+            for order, f_node in enumerate(f_nodes(component))
+        )
+        annotated_qualifications.extend(
+            models.AnnotatedQualification(qualification=qualification, component=component)
+            for qualification in qualifications(component)
+        )
+    # The components are new, so the orders above are already right
+    models.OrderedLink.objects.bulk_create(ordered_links, batch_size=BATCH_SIZE, keep_orders=True)
+    models.OrderedFNode.objects.bulk_create(ordered_f_nodes, batch_size=BATCH_SIZE, keep_orders=True)
+    models.AnnotatedQualification.objects.bulk_create(annotated_qualifications, batch_size=BATCH_SIZE)
+
+    by_component = {}
+    for annotated_qualification in annotated_qualifications:
+        by_component.setdefault(annotated_qualification.component_id, []).append(annotated_qualification)
+    review_rows = []
+    for component in components:
+        annotated = by_component.get(component.pk, [])
+        for i, (reviewer, date) in enumerate(reviews(component)):
+            review_rows.append(models.Review(
+                component=component, reviewer=reviewer, date=date,
+                annotated_qualification=annotated[i // 2 % len(annotated)] if annotated and i % 2 else None,
+            ))
+    models.Review.objects.bulk_create(review_rows, batch_size=BATCH_SIZE)
+
+
+def generate(count: int, users: int = 100, seed: int = 0, max_relations: int = 5, password: str = 'password',
+             log: Optional[Callable[[str], None]] = None) -> None:
+    """Generate a realistic component graph, identical for the same arguments.
+
+    Users, lookup rows, links and f-nodes are shared pools sized relative to `count`.
+    Each component gets between 0 and `max_relations` links, f-nodes, qualifications
+    and reviews, with timestamps spread over the five years before `SEED_EPOCH`.
+    """
+    rng = random.Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+    log = log or (lambda message: None)
+
+    # A single hash for all users, `create_user` would spend a full hash on each of them
+    hashed_password = make_password(password)
+    user_rows = []
+    for i in range(users):
+        first, last = fake.first_name(), fake.last_name()
+        user_rows.append(User(
+            username=f'{first}.{last}.{i}'.lower(), email=f'{first}.{last}.{i}@example.com'.lower(),
+            first_name=first, last_name=last, password=hashed_password, date_joined=SEED_EPOCH - SEED_PERIOD,
+        ))
+    user_rows = bulk_get_or_create(User, user_rows, 'username')
+    log(f'{len(user_rows)} users')
+
+    def pool(model, size, **fields):
+        return bulk_get_or_create(model, [model(**{k: v(i) for k, v in fields.items()}) for i in range(size)],
+                                  next(iter(fields)))
+
+    types = pool(models.Type, 40, name=lambda i: f'{fake.word().title()} {i}')
+    lifecycle_states = pool(models.LifecycleState, 5, name=['Active', 'NRND', 'EOL', 'Obsolete', 'Preview'].__getitem__)
+    mountings = pool(models.MountingType, 4, name=['SMD', 'THT', 'Press-fit', 'Chassis'].__getitem__)
+    packages = pool(models.Package, 200, name=lambda i: f'PKG-{i:04d}')
+    libraries = pool(models.Library, 50, ref=lambda i: f'lib-{i:03d}')
+    qualifications = pool(models.Qualification, 30, name=lambda i: f'AEC-Q{i:03d}')
+    companies = bulk_get_or_create(models.Company, [
+        models.Company(name=f'{fake.company()} {i}', url=f'https://company-{i}.example.com') for i in range(300)
+    ], 'name')
+    links = bulk_get_or_create(models.Link, [
+        models.Link(name=f'Datasheet {i}', url=f'https://docs.example.com/{i}.pdf')
+        for i in range(max(100, count // 10))
+    ], 'name')
+    f_nodes = pool(models.FNode, max(100, count // 10), ref=lambda i: f'F{i:07d}')
+    log('lookup tables, links and f-nodes')
+
+    period = int(SEED_PERIOD.total_seconds())
+    for start in range(0, count, BATCH_SIZE):
+        with transaction.atomic():
+            rows = []
+            for i in range(start, min(start + BATCH_SIZE, count)):
+                created = SEED_EPOCH - timedelta(seconds=rng.randrange(period))
+                last_modified = created + (SEED_EPOCH - created) * rng.random()
+                rows.append(models.Component(
+                    type=rng.choice(types), library=rng.choice(libraries), value=f'{rng.randrange(1, 1000)}k',
+                    description=fake.sentence(), creator=rng.choice(user_rows),
+                    last_modifier=rng.choice(user_rows), created=created, last_modified=last_modified,
+                    lifecycle_state=rng.choice(lifecycle_states), manufacturer=rng.choice(companies),
+                    mpn=fake.bothify('??###-####').upper(), mounting=rng.choice(mountings),
+                    package=rng.choice(packages) if rng.random() < 0.95 else None, stock=rng.randrange(100000),
+                ))
+            components = models.Component.objects.bulk_create(rows)
+            bulk_create_relations(
+                components,
+                links=lambda component: rng.sample(links, rng.randint(0, max_relations)),
+                f_nodes=lambda component: rng.sample(f_nodes, rng.randint(0, max_relations)),
+                qualifications=lambda component: rng.sample(qualifications, rng.randint(0, min(max_relations, 30))),
+                reviews=lambda component: [
+                    (rng.choice(user_rows), component.created + (SEED_EPOCH - component.created) * rng.random())
+                    for _ in range(rng.randint(0, max_relations))
+                ],
+            )
+        log(f'{min(start + BATCH_SIZE, count)}/{count} components')
@@ -0,0 +1,153 @@
+"""Cache of parsed and validated GraphQL documents, shared with persisted queries."""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from graphql import DocumentNode, GraphQLError
+from strawberry.extensions import SchemaExtension
+from strawberry.schema.execute import parse_document, validate_document
+
+
+@dataclass
+class CachedDocument:
+    """A parsed document and its validation errors per set of validation rules."""
+    query: str
+    document: DocumentNode
+    errors: Dict[Tuple, List[GraphQLError]] = field(default_factory=dict)
+
+
+class DocumentCache:
+    """Bounded LRU cache of GraphQL documents keyed by the sha256 of their text."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, CachedDocument]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash(query: str) -> str:
+        return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedDocument]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CachedDocument) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def query(self, key: str) -> Optional[str]:
+        """Return the text of a cached document without counting it as a hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.query if entry is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+document_cache = DocumentCache(maxsize=getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 256))
+
+
+class PersistedQueryError(Exception):
+    """A persisted query could not be resolved to a document."""
+    message = 'PersistedQueryError'
+    code = 'PERSISTED_QUERY_ERROR'
+
+    def as_graphql_error(self) -> GraphQLError:
+        return GraphQLError(self.message, extensions={'code': self.code})
+
+
+class PersistedQueryNotFound(PersistedQueryError):
+    message = 'PersistedQueryNotFound'
+    code = 'PERSISTED_QUERY_NOT_FOUND'
+
+
+class PersistedQueryHashMismatch(PersistedQueryError):
+    message = 'provided sha does not match query'
+    code = 'PERSISTED_QUERY_HASH_MISMATCH'
+
+
+def resolve_persisted_query(sha256_hash: Optional[str], query: Optional[str]) -> str:
+    """Return the query text for an automatic persisted query request.
+
+    Clients send only the hash once a document is known. If it is unknown, they
+    resend the hash together with the full text, which registers the document.
+    """
+    if query is not None:
+        if DocumentCache.hash(query) != sha256_hash:
+            raise PersistedQueryHashMismatch()
+        return query
+
+    query = document_cache.query(sha256_hash or '')
+    if query is None:
+        raise PersistedQueryNotFound()
+    return query
+
+
+class DocumentCacheExtension(SchemaExtension):
+    """Reuse parsed and validated documents from `document_cache` across executions."""
+
+    _entry: Optional[CachedDocument] = None
+
+    def on_parse(self) -> Iterator[None]:
+        execution_context = self.execution_context
+        key = DocumentCache.hash(execution_context.query)
+
+        entry = document_cache.get(key)
+        if entry is None:
+            try:
+                document = parse_document(execution_context.query, **execution_context.parse_options)
+            except GraphQLError:
+                # Let the regular parsing step report the syntax error
+                yield
+                return
+            entry = CachedDocument(query=execution_context.query, document=document)
+            document_cache.set(key, entry)
+
+        self._entry = entry
+        execution_context.graphql_document = entry.document
+        yield
+
+    def on_validate(self) -> Iterator[None]:
+        execution_context = self.execution_context
+        entry = self._entry
+
+        if entry is not None and execution_context.errors is None and execution_context.validation_rules:
+            rules = tuple(execution_context.validation_rules)
+            errors = entry.errors.get(rules)
+            if errors is None:
+                errors = entry.errors[rules] = validate_document(
+                    execution_context.schema._schema,
+                    entry.document,
+                    rules,
+                )
+            execution_context.errors = list(errors)
+        yield
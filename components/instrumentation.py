@@ -0,0 +1,207 @@
+"""Lightweight per-request instrumentation of the SQL queries and GraphQL resolvers.
+
+A sampled request, a fraction `INSTRUMENTATION_SAMPLE_RATE` of them, gets a `Recorder`.
+The execute wrapper installed on every connection counts and times its SQL queries,
+attributed to the GraphQL field resolving at the time, and `InstrumentationExtension`
+times the resolvers. The same SQL template run `N_PLUS_ONE_THRESHOLD` times or more under
+one field is reported as an N+1 pattern. `InstrumentationMiddleware` sends the totals in
+a `Server-Timing` header and the extension the whole report in the response `extensions`.
+Requests that are not sampled only pay a context variable lookup per query and field.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from inspect import isawaitable
+from typing import Any, Dict, Iterator, Optional, Set
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from strawberry.extensions import SchemaExtension
+
+# Runs of one SQL template under one field from which they count as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = 5
+# Slowest resolver paths reported
+MAX_RESOLVERS = 20
+# `IN` lists of any length, and the placeholders in them, are the same template
+IN_LIST = re.compile(r'IN \((?:%s(?:, )?)+\)')
+
+_recorder: ContextVar[Optional['Recorder']] = ContextVar('instrumentation_recorder', default=None)
+_field: ContextVar[str] = ContextVar('instrumentation_field', default='')
+
+
+def sampled() -> bool:
+    rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def sql_template(sql: str) -> str:
+    return IN_LIST.sub('IN (...)', sql)
+
+
+class Recorder:
+    """The SQL queries and resolver timings of one request, and the threads they ran in.
+
+    A recorder that is not `reported` only collects, for the request summaries of `components.profiling`.
+    """
+
+    def __init__(self, reported: bool = True):
+        self.reported = reported
+        self.start = time.perf_counter()
+        self.threads: Set[int] = {threading.get_ident()}
+        self.sql_count = 0
+        self.sql_duration = 0.0
+        self.resolvers: Dict[str, list] = defaultdict(lambda: [0, 0.0])
+        self.templates: Counter = Counter()
+
+    def executed(self, sql: str, duration: float) -> None:
+        self.sql_count += 1
+        self.sql_duration += duration
+        self.threads.add(threading.get_ident())
+        self.templates[_field.get(), sql_template(sql)] += 1
+
+    def resolved(self, path: str, duration: float) -> None:
+        timing = self.resolvers[path]
+        timing[0] += 1
+        timing[1] += duration
+        self.threads.add(threading.get_ident())
+
+    def n_plus_one(self) -> list:
+        return [
+            {'field': field or None, 'sql': sql, 'count': count}
+            for (field, sql), count in self.templates.most_common() if count >= N_PLUS_ONE_THRESHOLD
+        ]
+
+    def report(self) -> Dict[str, Any]:
+        """The totals in milliseconds, the slowest resolver paths and the N+1 patterns."""
+        resolvers = sorted(self.resolvers.items(), key=lambda item: item[1][1], reverse=True)[:MAX_RESOLVERS]
+        return {
+            'duration': (time.perf_counter() - self.start) * 1000,
+            'sql': {'count': self.sql_count, 'duration': self.sql_duration * 1000},
+            'resolvers': [
+                {'path': path, 'count': count, 'duration': duration * 1000}
+                for path, (count, duration) in resolvers
+            ],
+            'nPlusOne': self.n_plus_one(),
+        }
+
+    def server_timing(self) -> str:
+        duration = (time.perf_counter() - self.start) * 1000
+        timings = [
+            f'sql;dur={self.sql_duration * 1000:.3f};desc="{self.sql_count} queries"',
+            f'app;dur={duration:.3f}',
+        ]
+        patterns = len(self.n_plus_one())
+        if patterns:
+            timings.append(f'n-plus-one;desc="patterns: {patterns}"')
+        return ', '.join(timings)
+
+
+def record_sql(execute, sql, params, many, context):
+    """Database execute wrapper timing the queries of sampled requests."""
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.executed(sql, time.perf_counter() - start)
+
+
+def install(connection, **kwargs) -> None:
+    """Install `record_sql` on a new connection, connected to `connection_created`."""
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+class InstrumentationMiddleware:
+    """Record sampled requests and send their SQL and total time in a `Server-Timing` header."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not sampled():
+            return self.get_response(request)
+        recorder = Recorder()
+        token = _recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        response['Server-Timing'] = recorder.server_timing()
+        return response
+
+    async def __acall__(self, request):
+        if not sampled():
+            return await self.get_response(request)
+        recorder = Recorder()
+        token = _recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        response['Server-Timing'] = recorder.server_timing()
+        return response
+
+
+class InstrumentationExtension(SchemaExtension):
+    """Time the resolvers of sampled operations and report them in the response `extensions`.
+
+    Operations of a request sampled by `InstrumentationMiddleware` are recorded with it,
+    others, e.g. those executed directly, are sampled here.
+    """
+
+    recorder: Optional[Recorder] = None
+
+    def on_operation(self) -> Iterator[None]:
+        self.recorder = _recorder.get()
+        if self.recorder is not None or not sampled():
+            yield
+            return
+        self.recorder = Recorder()
+        token = _recorder.set(self.recorder)
+        try:
+            yield
+        finally:
+            _recorder.reset(token)
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        recorder = _recorder.get()
+        if recorder is None:
+            return _next(root, info, *args, **kwargs)
+
+        path = '.'.join(str(key) for key in info.path.as_list() if not isinstance(key, int))
+        start = time.perf_counter()
+        token = _field.set(path)
+        try:
+            result = _next(root, info, *args, **kwargs)
+        finally:
+            _field.reset(token)
+        if not isawaitable(result):
+            recorder.resolved(path, time.perf_counter() - start)
+            return result
+
+        async def timed():
+            token = _field.set(path)
+            try:
+                return await result
+            finally:
+                _field.reset(token)
+                recorder.resolved(path, time.perf_counter() - start)
+
+        return timed()
+
+    def get_results(self) -> Dict[str, Any]:
+        if self.recorder is None or not self.recorder.reported:
+            return {}
+        return {'instrumentation': self.recorder.report()}
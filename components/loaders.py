@@ -0,0 +1,67 @@
+"""Per-request DataLoaders that batch foreign key lookups of the async GraphQL view."""
+from functools import partial
+from typing import Any, Dict, Hashable, List, Optional, Type
+
+from asgiref.sync import sync_to_async
+from django.db import models
+from strawberry.dataloader import DataLoader
+from strawberry.extensions.field_extension import FieldExtension
+from strawberry.types.info import Info
+from strawberry_django_plus.utils import resolvers
+
+from . import lookups
+
+
+async def load_instances(model: Type[models.Model], keys: List[Hashable]) -> List[Optional[models.Model]]:
+    """Fetch all instances of `model` for the given primary keys with a single `IN` query."""
+    instances = await sync_to_async(model._default_manager.in_bulk)(keys)
+    return [instances.get(key) for key in keys]
+
+
+class ModelLoaders:
+    """One DataLoader per model, deduplicating and batching primary key lookups."""
+
+    def __init__(self):
+        self._loaders: Dict[Type[models.Model], DataLoader] = {}
+
+    def for_model(self, model: Type[models.Model]) -> DataLoader:
+        loader = self._loaders.get(model)
+        if loader is None:
+            loader = self._loaders[model] = DataLoader(load_fn=partial(load_instances, model))
+        return loader
+
+    def load(self, model: Type[models.Model], pk: Hashable):
+        return self.for_model(model).load(pk)
+
+
+class ForeignKeyLoaderExtension(FieldExtension):
+    """Resolve a foreign key that was not selected with a JOIN without a query per row.
+
+    Lookup tables are read from the lookup cache when it is enabled. Other models go
+    through the request's `ModelLoaders`; without loaders in the context (e.g.
+    `schema.execute_sync`), the field resolves as usual.
+    """
+
+    def apply(self, field) -> None:
+        self.django_name = getattr(field, 'django_name', None) or field.python_name
+
+    def resolve(self, next_, source: Any, info: Info, **kwargs: Any) -> Any:
+        if not isinstance(source, models.Model):
+            return next_(source, info, **kwargs)
+
+        field = source._meta.get_field(self.django_name)
+        loaders: Optional[ModelLoaders] = getattr(info.context, 'loaders', None)
+        is_lookup = lookups.is_lookup_model(field.related_model)
+        if field.is_cached(source) or (loaders is None and not is_lookup):
+            return next_(source, info, **kwargs)
+
+        pk = getattr(source, field.attname)
+        if pk is None:
+            return None
+        if is_lookup:
+            instance = lookups.get_cached(field.related_model, pk)
+            return instance if instance is not None else get_lookup(field.related_model, pk)
+        return loaders.load(field.related_model, pk)
+
+
+get_lookup = resolvers.async_safe(lookups.get)
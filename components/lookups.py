@@ -0,0 +1,65 @@
+"""Process-local cache of the small, rarely changing lookup tables.
+
+Enable it by pointing the `LOOKUP_CACHE` setting to an alias of `CACHES`. Rows are
+stored per primary key and a miss loads the whole (small) table at once. Saving or
+deleting a row invalidates its entry through the receivers in `components.signals`.
+"""
+from typing import Dict, Hashable, Optional, Type
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models as django_models
+
+from . import models, responses
+
+LOOKUP_MODELS = (
+    models.Company,
+    models.LifecycleState,
+    models.MountingType,
+    models.Package,
+    models.Qualification,
+    models.Type,
+)
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'LOOKUP_CACHE', None) is not None
+
+
+def is_lookup_model(model: Type[django_models.Model]) -> bool:
+    return is_enabled() and model in LOOKUP_MODELS
+
+
+def _cache():
+    return caches[settings.LOOKUP_CACHE]
+
+
+def _key(model: Type[django_models.Model], pk: Hashable) -> str:
+    return f'lookup:{model._meta.label_lower}:{pk}'
+
+
+def load_table(model: Type[django_models.Model]) -> Dict[Hashable, django_models.Model]:
+    """Read all rows of `model` and store them in the cache."""
+    instances = model._default_manager.in_bulk()
+    _cache().set_many({_key(model, pk): instance for pk, instance in instances.items()})
+    return instances
+
+
+def get_cached(model: Type[django_models.Model], pk: Hashable) -> Optional[django_models.Model]:
+    """Return the cached `model` instance with primary key `pk`, without touching the database."""
+    # No query records the table for a cached response
+    responses.record(model)
+    return _cache().get(_key(model, pk))
+
+
+def get(model: Type[django_models.Model], pk: Hashable) -> Optional[django_models.Model]:
+    """Return the `model` instance with primary key `pk`, loading the table on a miss."""
+    instance = get_cached(model, pk)
+    if instance is None:
+        instance = load_table(model).get(pk)
+    return instance
+
+
+def invalidate(model: Type[django_models.Model], pk: Hashable) -> None:
+    if is_enabled():
+        _cache().delete(_key(model, pk))
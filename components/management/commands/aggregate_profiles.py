@@ -0,0 +1,58 @@
+"""Aggregate profiles: Django command to report the hot functions of the captured request profiles."""
+import io
+import json
+import pstats
+import statistics
+from collections import defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from components.profiling import profile_dir
+
+
+class Command(BaseCommand):
+    help = 'Sum the request profiles captured by the profiling middleware and print their hottest functions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help='Directory of the profiles, PROFILING_DIR by default.')
+        parser.add_argument('--path', default='', help='Only the profiles of requests whose path contains this.')
+        parser.add_argument('--sort', choices=('tottime', 'cumulative'), default='tottime',
+                            help='Rank the functions by their own time or including their callees.')
+        parser.add_argument('-n', '--limit', type=int, default=30, help='The number of functions printed.')
+
+    def handle(self, *args, **options) -> None:
+        directory = Path(options['dir']) if options['dir'] else profile_dir()
+
+        requests = defaultdict(list)
+        profiles = []
+        for path in sorted(directory.glob('*.prof')):
+            try:
+                with open(path.with_suffix('.json')) as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                summary = None
+            if summary is not None:
+                if options['path'] not in summary['path']:
+                    continue
+                requests[summary['path'].split('?')[0]].append(summary)
+            elif options['path']:
+                continue
+            profiles.append(str(path))
+        if not profiles:
+            raise CommandError(f'No profiles in {directory}.')
+
+        self.stdout.write(f'{len(profiles)} profiles in {directory}')
+        for path, summaries in sorted(requests.items()):
+            durations = [summary['duration'] for summary in summaries]
+            queries = statistics.mean(summary['instrumentation']['sql']['count'] for summary in summaries)
+            slow = sum(summary['reason'] == 'slow' for summary in summaries)
+            self.stdout.write(
+                f'  {path}: {len(summaries)} requests ({slow} slow), p50 {statistics.median(durations):.1f} ms, '
+                f'max {max(durations):.1f} ms, {queries:.1f} queries on average'
+            )
+
+        output = io.StringIO()
+        stats = pstats.Stats(*profiles, stream=output)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(output.getvalue())
@@ -0,0 +1,224 @@
+"""Bench: Django command to benchmark the REST and GraphQL component listings."""
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import django
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from components.datasets import create_components
+from components.models import Component
+
+# Fields added to the GraphQL component selection at each nesting depth
+GRAPHQL_DEPTHS = [
+    'id mpn stock value created lastModified',
+    'type { id name } manufacturer { id name } lifecycleState { id name } mounting { id name } '
+    'package { id name } library { id ref } creator { id username } lastModifier { id username }',
+    'links { totalCount } reviews { totalCount } qualifications { totalCount } fNodes { totalCount }',
+    'links { edges { node { id name url } } } reviews { edges { node { id date reviewer { id username } } } } '
+    'qualifications { edges { node { id name } } } fNodes { edges { node { id ref } } }',
+]
+
+
+def graphql_query(page_size: int, depth: int) -> str:
+    fields = ' '.join(GRAPHQL_DEPTHS[:depth + 1])
+    return f'{{ components(first: {page_size}) {{ totalCount edges {{ node {{ {fields} }} }} }} }}'
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class SQLRecorder:
+    """Execute wrapper counting the queries of the connection and their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the REST and GraphQL component listings and write the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--components', type=int, default=1000,
+                            help='The number of components in the dataset.')
+        parser.add_argument('-r', '--relations', type=int, default=3,
+                            help='The number of links, f-nodes, qualifications and reviews per component.')
+        parser.add_argument('--page-sizes', default='10,100,1000',
+                            help='Comma separated page sizes to request.')
+        parser.add_argument('--depths', default=','.join(str(d) for d in range(len(GRAPHQL_DEPTHS))),
+                            help='Comma separated GraphQL nesting depths to request.')
+        parser.add_argument('--apis', default='rest,graphql',
+                            help='Comma separated APIs to benchmark.')
+        parser.add_argument('-n', '--iterations', type=int, default=20,
+                            help='Timed iterations per scenario and mode.')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Untimed iterations before the warm measurements.')
+        parser.add_argument('--database', default=os.path.join(tempfile.gettempdir(), 'bench_components.sqlite3'),
+                            help='Database file the dataset is built in.')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database and reuse its dataset on the next run.')
+        parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare with the results of a previous run and fail on regressions.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative p95 latency increase over the baseline.')
+
+    def handle(self, *args, **options) -> None:
+        connection.settings_dict['TEST']['NAME'] = options['database']
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            missing = options['components'] - Component.objects.count()
+            if missing > 0:
+                self.stderr.write(f'Creating {missing} components...')
+                create_components(missing, options['relations'])
+            # The requested pages are measured, not those the cost policy leaves of them
+            with override_settings(GRAPHQL_QUERY_COST_LIMIT=None):
+                results = self.run_scenarios(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        report = {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'components': options['components'],
+                'relations': options['relations'],
+                'iterations': options['iterations'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def run_scenarios(self, options):
+        from components.schema import schema
+        from components.views import AsyncGraphQLView, ComponentViewSet
+
+        factory = RequestFactory()
+        rest_view = ComponentViewSet.as_view()
+        graphql_view = async_to_sync(AsyncGraphQLView.as_view(schema=schema))
+        page_sizes = [int(p) for p in options['page_sizes'].split(',')]
+        depths = [int(d) for d in options['depths'].split(',')]
+        apis = options['apis'].split(',')
+
+        scenarios = []
+        for page_size in page_sizes:
+            if 'rest' in apis:
+                def request(page_size=page_size):
+                    response = rest_view(factory.get('/api-auth/components/', {'page_size': page_size}))
+                    response.render()
+                    return response
+                scenarios.append(({'api': 'rest', 'page_size': page_size, 'depth': None}, request))
+            if 'graphql' in apis:
+                for depth in depths:
+                    def request(page_size=page_size, depth=depth):
+                        body = json.dumps({'query': graphql_query(page_size, depth)})
+                        return graphql_view(factory.post('/graphql/', body, content_type='application/json'))
+                    scenarios.append(({'api': 'graphql', 'page_size': page_size, 'depth': depth}, request))
+
+        results = []
+        for scenario, request in scenarios:
+            for mode in ('cold', 'warm'):
+                result = {**scenario, 'mode': mode, **self.measure(request, mode, options)}
+                results.append(result)
+                self.stderr.write(
+                    f"{scenario['api']:8} page_size={scenario['page_size']:<5} depth={scenario['depth']!s:4} "
+                    f"{mode:4} p50={result['p50_ms']:9.2f}ms p95={result['p95_ms']:9.2f}ms "
+                    f"queries={result['queries']}"
+                )
+        return results
+
+    def reset(self) -> None:
+        """Drop all process caches and the database connection to measure a cold request."""
+        from components.documents import document_cache
+        document_cache.clear()
+        for cache in caches.all():
+            cache.clear()
+        connection.close()
+
+    def measure(self, request, mode, options):
+        if mode == 'warm':
+            for _ in range(options['warmup']):
+                request()
+
+        latencies, queries, sql_times = [], [], []
+        for _ in range(options['iterations']):
+            if mode == 'cold':
+                self.reset()
+            recorder = SQLRecorder()
+            with connection.execute_wrapper(recorder):
+                start = time.perf_counter()
+                response = request()
+                latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(f'Request failed with status {response.status_code}: {response.content[:500]}')
+            queries.append(recorder.count)
+            sql_times.append(recorder.duration)
+
+        if mode == 'cold':
+            self.reset()
+        tracemalloc.start()
+        try:
+            request()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'mean_ms': sum(latencies) / len(latencies) * 1000,
+            'queries': percentile(queries, 50),
+            'sql_ms': percentile(sql_times, 50) * 1000,
+            'peak_memory_kib': peak / 1024,
+        }
+
+    def compare(self, results, baseline_path, tolerance) -> None:
+        with open(baseline_path) as f:
+            baseline = {self.key(r): r for r in json.load(f)['results']}
+
+        regressions = []
+        for result in results:
+            previous = baseline.get(self.key(result))
+            if previous is None:
+                continue
+            if result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{self.key(result)}: p95 {previous['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+            if result['queries'] > previous['queries']:
+                regressions.append(f"{self.key(result)}: queries {previous['queries']} -> {result['queries']}")
+
+        if regressions:
+            raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+        self.stderr.write('No regressions against the baseline.')
+
+    @staticmethod
+    def key(result) -> str:
+        return f"{result['api']}:{result['page_size']}:{result['depth']}:{result['mode']}"
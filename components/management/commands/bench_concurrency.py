@@ -0,0 +1,145 @@
+"""Bench concurrency: Django command to measure lock contention of concurrent readers and writers."""
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.test import RequestFactory
+
+from components.datasets import generate
+from components.management.commands.bench import percentile
+from components.models import Component, Review, UserModel
+from components.sqlite import configure_connection, current_pragmas
+
+# The connection profiles compared: SQLite's defaults with a rollback journal and the configured one
+PROFILES = {
+    'defaults': {'journal_mode': 'delete'},
+    'settings': None,
+}
+
+
+def read(factory: RequestFactory, view) -> None:
+    """Request a page of the REST listing."""
+    response = view(factory.get('/api-auth/components/', {'page_size': 50}))
+    response.render()
+
+
+def write(rng: random.Random, pks: List[int], reviewers: List[int]) -> None:
+    """Review a component and change its stock in one transaction."""
+    pk = rng.choice(pks)
+    with transaction.atomic():
+        Component.objects.filter(pk=pk).update(stock=F('stock') + 1)
+        Review.objects.create(component_id=pk, reviewer_id=rng.choice(reviewers))
+
+
+def worker(role: str, index: int, pragmas: Dict[str, Any], start_at: float, duration: float) -> Dict[str, Any]:
+    """Run reads or writes from a forked process until `duration` has passed."""
+    from components.views import ComponentViewSet
+
+    settings.SQLITE_PRAGMAS = pragmas
+    rng = random.Random(index)
+    factory = RequestFactory()
+    view = ComponentViewSet.as_view()
+    pks = list(Component.objects.values_list('pk', flat=True))
+    reviewers = list(UserModel.objects.values_list('pk', flat=True))
+
+    latencies, errors = [], 0
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = start_at + duration
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            if role == 'reader':
+                read(factory, view)
+            else:
+                write(rng, pks, reviewers)
+        except OperationalError:
+            # "database is locked" once the busy timeout has passed
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    connections.close_all()
+    return {'role': role, 'latencies': latencies, 'errors': errors}
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent reader and writer processes against one database file and report their latencies.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--components', type=int, default=2000,
+                            help='The number of components in the dataset.')
+        parser.add_argument('--readers', type=int, default=4,
+                            help='The number of reading processes.')
+        parser.add_argument('--writers', type=int, default=2,
+                            help='The number of writing processes.')
+        parser.add_argument('-d', '--duration', type=float, default=10.0,
+                            help='Seconds each profile is measured for.')
+        parser.add_argument('--profiles', default=','.join(PROFILES),
+                            help='Comma separated connection profiles to compare.')
+        parser.add_argument('--database', default=os.path.join(tempfile.gettempdir(), 'bench_concurrency.sqlite3'),
+                            help='Database file the dataset is built in.')
+        parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options) -> None:
+        if connection.vendor != 'sqlite':
+            raise CommandError('The connection profiles are SQLite pragmas.')
+        unknown = set(options['profiles'].split(',')) - set(PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+        results = []
+        connection.settings_dict['TEST']['NAME'] = options['database']
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stderr.write(f"Creating {options['components']} components...")
+            generate(options['components'], users=options['components'] // 20 + 1)
+            for name in options['profiles'].split(','):
+                results.extend(self.run_profile(name, PROFILES[name] or settings.SQLITE_PRAGMAS, options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def run_profile(self, name: str, pragmas: Dict[str, Any], options) -> List[Dict[str, Any]]:
+        # The journal mode is persistent, switch the file before the workers connect
+        configure_connection(connection=connection, pragmas=pragmas)
+        pragmas = {**pragmas, 'journal_mode': current_pragmas(connection)['journal_mode']}
+        # Forked processes must not share the parent's connection
+        connections.close_all()
+
+        roles = ['reader'] * options['readers'] + ['writer'] * options['writers']
+        start_at = time.time() + 1.0
+        with multiprocessing.get_context('fork').Pool(len(roles)) as pool:
+            outcomes = pool.starmap(worker, [
+                (role, index, pragmas, start_at, options['duration']) for index, role in enumerate(roles)
+            ])
+
+        results = []
+        for role in ('reader', 'writer'):
+            latencies = [latency for outcome in outcomes if outcome['role'] == role for latency in outcome['latencies']]
+            if not latencies:
+                continue
+            result = {
+                'profile': name, 'role': role, 'operations': len(latencies),
+                'throughput': len(latencies) / options['duration'],
+                'errors': sum(outcome['errors'] for outcome in outcomes if outcome['role'] == role),
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'max_ms': max(latencies) * 1000,
+            }
+            results.append(result)
+            self.stderr.write(
+                f"{name:9} {role:7} ops/s={result['throughput']:8.1f} p50={result['p50_ms']:8.2f}ms "
+                f"p95={result['p95_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms max={result['max_ms']:8.2f}ms "
+                f"errors={result['errors']}"
+            )
+        return results
@@ -0,0 +1,107 @@
+"""Bench counts: Django command to compare the ways the REST listing counts related rows."""
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.generics import GenericAPIView
+
+from components.datasets import create_components
+from components.management.commands.bench import SQLRecorder, percentile
+from components.models import Component
+from components.optimizer import total_count_subquery
+from components.serializers import ComponentSerializer
+from components.views import ComponentViewSet, component_queryset
+
+# The relations counted by `ComponentSerializer`, with the join `Count` follows for each of them
+RELATIONS = {
+    'links': 'ordered_links',
+    'f_nodes': 'ordered_f_nodes',
+    'qualifications': 'annotated_qualifications',
+    'reviews': 'reviews',
+}
+
+
+def strategies():
+    """Return the listing queryset with each way of counting the relations."""
+    base = component_queryset(Component.objects.all(), ComponentSerializer())
+    return {
+        'distinct_joins': base.annotate(**{
+            f'total_count_{relation}': Count(join, distinct=True) for relation, join in RELATIONS.items()
+        }),
+        'subqueries': base.annotate(**{
+            f'total_count_{relation}': total_count_subquery(Component, relation) for relation in RELATIONS
+        }),
+        'counters': base,
+    }
+
+
+class StrategyView(ComponentViewSet):
+    """The component listing serving the queryset it was created with as is.
+
+    Pages are serialized from model instances, which read the count annotations in
+    place of the counter columns.
+    """
+    values_serialization = False
+
+    def get_queryset(self):
+        return GenericAPIView.get_queryset(self)
+
+
+class Command(BaseCommand):
+    help = 'Time the REST listing with the counts from COUNT(DISTINCT) joins, subqueries or counter columns.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--components', type=int, default=200,
+                            help='The number of components in each dataset.')
+        parser.add_argument('-r', '--relations', default='1,2,4,8',
+                            help='Comma separated numbers of relations per component, one dataset each.')
+        parser.add_argument('--page-size', type=int, default=100,
+                            help='The page size to request.')
+        parser.add_argument('-n', '--iterations', type=int, default=5,
+                            help='Timed iterations per strategy and dataset.')
+        parser.add_argument('--database', default=os.path.join(tempfile.gettempdir(), 'bench_counts.sqlite3'),
+                            help='Database file the datasets are built in.')
+        parser.add_argument('-o', '--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options) -> None:
+        factory = RequestFactory()
+        results = []
+        connection.settings_dict['TEST']['NAME'] = options['database']
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for relations in [int(r) for r in options['relations'].split(',')]:
+                Component.objects.all().delete()
+                create_components(options['components'], relations)
+                outputs = {}
+                for name, queryset in strategies().items():
+                    view = StrategyView.as_view(queryset=queryset)
+                    latencies, queries = [], []
+                    for _ in range(options['iterations']):
+                        recorder = SQLRecorder()
+                        with connection.execute_wrapper(recorder):
+                            start = time.perf_counter()
+                            response = view(factory.get('/api-auth/components/', {'page_size': options['page_size']}))
+                            response.render()
+                            latencies.append(time.perf_counter() - start)
+                        queries.append(recorder.count)
+                    outputs[name] = response.data['results']
+                    result = {
+                        'strategy': name, 'relations': relations,
+                        'p50_ms': percentile(latencies, 50) * 1000, 'queries': percentile(queries, 50),
+                    }
+                    results.append(result)
+                    self.stderr.write(f"relations={relations:<4} {name:15} p50={result['p50_ms']:9.2f}ms "
+                                      f"queries={result['queries']}")
+                if any(output != outputs['distinct_joins'] for output in outputs.values()):
+                    raise CommandError(f'The strategies serialize different results for {relations} relations.')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
@@ -0,0 +1,136 @@
+"""Explain hot queries: Django command to check the query plans of the component listings."""
+import os
+import re
+import tempfile
+from typing import Iterator, List, Tuple
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from components.datasets import generate
+from components.management.commands.bench import GRAPHQL_DEPTHS, graphql_query
+from components.models import Component
+from components.pagination import ORDERING, encode_cursor
+
+# Plan steps that read a whole table or sort the rows outside of an index. Scans of an
+# index are accepted, they read in the index order and stop at the page's LIMIT.
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)\S+(?: AS \S+)?$')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+# Components the plans are judged for. A page of a small dataset is a large share of its
+# tables, which the planner reads with a scan, so the statistics are scaled to this size.
+PLANNED_COMPONENTS = 1_000_000
+
+
+class QueryCollector:
+    """Execute wrapper collecting the distinct SELECT statements of the connection."""
+
+    def __init__(self):
+        self.queries: List[Tuple[str, tuple]] = []
+        self.seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT') and sql not in self.seen:
+            self.seen.add(sql)
+            self.queries.append((sql, tuple(params or ())))
+        return execute(sql, params, many, context)
+
+
+def hot_queries() -> Iterator[Tuple[str, List[Tuple[str, tuple]]]]:
+    """Run the REST listing and the GraphQL `components` connection, yielding the SQL of each."""
+    from components.schema import schema
+    from components.views import ComponentViewSet
+
+    factory = RequestFactory()
+    view = ComponentViewSet.as_view()
+    # The first page is requested uncollected, for the cursor of the second and to warm the lookup cache
+    requests = {
+        'rest': {},
+        'rest expanded': {'expand': ','.join(ComponentViewSet.serializer_class.expandable_fields())},
+    }
+    for name, params in requests.items():
+        first = view(factory.get('/api-auth/components/', params))
+        first.render()
+        collector = QueryCollector()
+        with connection.execute_wrapper(collector):
+            view(factory.get(first.data['next'] or '/api-auth/components/', params)).render()
+        yield name, collector.queries
+
+    # The second page also covers the cursor's seek
+    after = encode_cursor(Component.objects.order_by(*ORDERING)[9])
+    for depth in range(len(GRAPHQL_DEPTHS)):
+        query = graphql_query(10, depth).replace('first: 10', f'first: 10, after: "{after}"')
+        # The plans of the requested pages, which the cost policy could reject or clamp
+        with override_settings(GRAPHQL_QUERY_COST_LIMIT=None):
+            # Warm the lookup cache, its loads are not part of the steady state
+            schema.execute_sync(query)
+            collector = QueryCollector()
+            with connection.execute_wrapper(collector):
+                result = schema.execute_sync(query)
+        if result.errors:
+            raise CommandError(f'GraphQL depth {depth}: {result.errors[0]}')
+        yield f'graphql depth {depth}', collector.queries
+
+
+def scale_statistics(components: int) -> None:
+    """Analyze the tables and scale their row counts as if they held `PLANNED_COMPONENTS` components.
+
+    The average rows per index key are kept, so the plans do not depend on the size of the dataset.
+    """
+    factor = PLANNED_COMPONENTS / max(components, 1)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+        cursor.execute('SELECT tbl, idx, stat FROM sqlite_stat1')
+        for table, index, stat in cursor.fetchall():
+            rows, *averages = stat.split(' ')
+            stat = ' '.join([str(max(round(int(rows) * factor), 1)), *averages])
+            cursor.execute('UPDATE sqlite_stat1 SET stat = %s WHERE tbl = %s AND idx IS %s', (stat, table, index))
+        # Reload the statistics
+        cursor.execute('ANALYZE sqlite_schema')
+
+
+def explain(sql: str, params: tuple) -> List[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan: List[str]) -> List[str]:
+    return [step for step in plan if FULL_SCAN.match(step) or TEMP_SORT.search(step)]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries of the REST and GraphQL component listings and fail on full scans or temp sorts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--components', type=int, default=1000,
+                            help='The number of components in the dataset.')
+        parser.add_argument('--database', default=os.path.join(tempfile.gettempdir(), 'explain_components.sqlite3'),
+                            help='Database file the dataset is built in.')
+
+    def handle(self, *args, **options) -> None:
+        if connection.vendor != 'sqlite':
+            raise CommandError('The query plans are checked for SQLite only.')
+
+        failures = []
+        connection.settings_dict['TEST']['NAME'] = options['database']
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            generate(options['components'], users=options['components'] // 10 + 1)
+            # Give the planner the statistics of a populated database
+            scale_statistics(options['components'])
+            caches['default'].clear()
+            for name, queries in hot_queries():
+                for sql, params in queries:
+                    plan = explain(sql, params)
+                    bad = plan_problems(plan)
+                    self.stdout.write(f"{'FAIL' if bad else 'ok  '} {name}: {sql[:160]}")
+                    for step in plan:
+                        self.stdout.write(f'       {step}')
+                    failures.extend(f'{name}: {step}' for step in bad)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if failures:
+            raise CommandError('Query plans with full scans or temp sorts:\n' + '\n'.join(failures))
@@ -0,0 +1,54 @@
+"""Export: Django command to stream the component catalogue to NDJSON or CSV."""
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from components import exports
+from components.models import Component
+from components.serializers import ComponentSerializer
+from components.views import component_queryset
+
+
+class Command(BaseCommand):
+    help = 'Write all components, or those modified since a point in time, as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-f', '--format', choices=['ndjson', 'csv'], default='ndjson',
+                            help='The output format.')
+        parser.add_argument('-o', '--output', help='The file to write to, standard output by default.')
+        parser.add_argument('--modified-since',
+                            help='Only export components modified at or after this ISO 8601 timestamp.')
+        parser.add_argument('--fields', help='Comma separated fields to export, all by default.')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE,
+                            help='The number of components read and serialized at a time.')
+
+    def handle(self, *args, **options) -> None:
+        fields = options['fields'].split(',') if options['fields'] else None
+        serializer = ComponentSerializer(fields=fields)
+        if fields is not None and set(fields) - set(serializer.fields):
+            raise CommandError(f"Unknown fields: {', '.join(sorted(set(fields) - set(serializer.fields)))}")
+
+        queryset = component_queryset(Component.objects.all(), serializer)
+        if options['modified_since']:
+            try:
+                queryset = queryset.filter(last_modified__gte=exports.parse_modified_since(options['modified_since']))
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        start = time.perf_counter()
+        rows = 0
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for line in exports.stream(queryset, serializer, options['format'], options['chunk_size']):
+                output.write(line)
+                rows += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if options['format'] == 'csv':
+            # Not counting the header
+            rows -= 1
+        elapsed = time.perf_counter() - start
+        self.stderr.write(f'Exported {rows} components in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s).')
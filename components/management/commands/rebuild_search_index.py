@@ -0,0 +1,16 @@
+"""Rebuild search index: Django command to rebuild the full-text search table of the components."""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from components import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FTS5 search table from all components, e.g. after loading a fixture or raw SQL writes.'
+
+    def handle(self, *args, **options) -> None:
+        if connection.vendor != 'sqlite':
+            raise CommandError('The search table is an SQLite FTS5 table.')
+        with transaction.atomic():
+            indexed = search.rebuild()
+        self.stdout.write(f'{indexed} components indexed')
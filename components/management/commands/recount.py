@@ -0,0 +1,15 @@
+"""Recount: Django command to repair the denormalized relation counters of the components."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from components import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the relation counters of all components, e.g. after loading a fixture or raw SQL writes.'
+
+    def handle(self, *args, **options) -> None:
+        with transaction.atomic():
+            for model, (_, counter, _) in counters.COUNTERS.items():
+                drifted = counters.recount(model)
+                self.stdout.write(f'{counters.counted_model(model).__name__}.{counter}: {drifted} repaired')
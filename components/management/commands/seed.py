@@ -0,0 +1,30 @@
+"""Seed: Django command to generate a large synthetic component graph."""
+import time
+
+from django.core.management.base import BaseCommand
+
+from components.datasets import generate
+
+
+class Command(BaseCommand):
+    help = 'Populate the database with users, lookup tables and components with all their relations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--components', type=int, default=10000,
+                            help='The number of components to be generated.')
+        parser.add_argument('-u', '--users', type=int, default=2280,
+                            help='The number of users to be generated.')
+        parser.add_argument('-r', '--max-relations', type=int, default=5,
+                            help='The maximum number of links, f-nodes, qualifications and reviews per component.')
+        parser.add_argument('-s', '--seed', type=int, default=0,
+                            help='Seed of the random generators; the same seed yields the same data.')
+        parser.add_argument('--password', default='password',
+                            help='The password of all generated users.')
+
+    def handle(self, *args, **options) -> None:
+        start = time.perf_counter()
+        generate(
+            options['components'], users=options['users'], seed=options['seed'],
+            max_relations=options['max_relations'], password=options['password'],
+            log=lambda message: self.stdout.write(f'[{time.perf_counter() - start:8.1f}s] {message}'),
+        )
@@ -0,0 +1,294 @@
+"""Querysets and managers of the component models."""
+from collections import Counter
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connections, models
+from django.dispatch import Signal
+from django.utils import timezone
+from ordered_model.models import OrderedModelManager, OrderedModelQuerySet
+
+from .sqlite import BATCH_SIZE
+
+# Sent with the model after the batch writes of the querysets below, which send no
+# `post_save`: `bulk_create()`, `bulk_update()`, `update()` and the reorders
+rows_changed = Signal()
+
+
+class ChangeSignalQuerySetMixin:
+    """Send `rows_changed` after batch writes."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        rows_changed.send(sender=self.model, using=self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        rows_changed.send(sender=self.model, using=self.db)
+        return updated
+
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        rows_changed.send(sender=self.model, using=self.db)
+        return updated
+
+    update.alters_data = True
+
+
+class TimestampedQuerySetMixin:
+    """Stamp the timestamps `Model.save()` sets on the rows of batch writes.
+
+    The model's `created_timestamps` are set where empty by `bulk_create()`, its
+    `modified_timestamps` too and again by every `bulk_update()`. With the
+    `UPDATE_BUMPS_LAST_MODIFIED` setting, `update()` sets the latter as well unless
+    they are updated explicitly.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        now = timezone.now()
+        names = (*getattr(self.model, 'created_timestamps', ()), *getattr(self.model, 'modified_timestamps', ()))
+        for obj in objs:
+            for name in names:
+                if getattr(obj, name) is None:
+                    setattr(obj, name, now)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        names = getattr(self.model, 'modified_timestamps', ())
+        if names:
+            objs = list(objs)
+            now = timezone.now()
+            for obj in objs:
+                for name in names:
+                    setattr(obj, name, now)
+            fields = [*fields, *(name for name in names if name not in fields)]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if getattr(settings, 'UPDATE_BUMPS_LAST_MODIFIED', False):
+            now = timezone.now()
+            for name in getattr(self.model, 'modified_timestamps', ()):
+                kwargs.setdefault(name, now)
+        return super().update(**kwargs)
+
+    update.alters_data = True
+
+
+class MultiTableQuerySetMixin:
+    """`bulk_create()` for a model with a concrete parent, which Django refuses.
+
+    The parent rows are inserted first and their primary keys used for the child rows.
+    Conflicts cannot be ignored or updated then, the child rows need the parents' keys.
+    """
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False, update_conflicts=False,
+                    update_fields=None, unique_fields=None):
+        meta = self.model._meta
+        if not meta.parents:
+            return super().bulk_create(objs, batch_size, ignore_conflicts, update_conflicts, update_fields,
+                                       unique_fields)
+        (parent, link), = meta.parents.items()
+        if parent._meta.parents:
+            raise ValueError(f'{self.model.__name__} inherits from more than one level of concrete models.')
+        if ignore_conflicts or update_conflicts:
+            raise ValueError(f'{self.model.__name__} rows are inserted after their parents, '
+                             f'their conflicts cannot be ignored or updated.')
+
+        objs = list(objs)
+        parent_fields = [field for field in parent._meta.concrete_fields if not field.primary_key]
+        parents = parent._default_manager.using(self.db).bulk_create([
+            parent(**{field.attname: getattr(obj, field.attname) for field in parent_fields}) for obj in objs
+        ], batch_size=batch_size)
+        for obj, parent_obj in zip(objs, parents):
+            setattr(obj, parent._meta.pk.attname, parent_obj.pk)
+            setattr(obj, link.attname, parent_obj.pk)
+
+        fields = meta.local_concrete_fields
+        batch_size = batch_size or max(connections[self.db].ops.bulk_batch_size(fields, objs), 1)
+        for start in range(0, len(objs), batch_size):
+            self.model._base_manager.using(self.db)._insert(objs[start:start + batch_size], fields=fields)
+        for obj in objs:
+            obj._state.adding = False
+            obj._state.db = self.db
+        return objs
+
+
+class CountedQuerySetMixin:
+    """Keep the component counters of `components.counters` right for batch writes.
+
+    `bulk_create()` adds the created rows per component and `delete()` subtracts the
+    deleted ones in one update per distinct count, instead of one per row through the
+    signal receivers. These and `bulk_update()` also touch the components' `last_modified`
+    through `components.changes`.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import changes, counters
+        objs = super().bulk_create(objs, *args, **kwargs)
+        keys = [getattr(obj, counters.key_attname(self.model)) for obj in objs]
+        if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+            # Which rows were inserted is unknown, count the affected components again
+            counters.recount(self.model, pks=set(keys))
+        else:
+            counters.add(self.model, Counter(keys))
+        changes.touch(keys)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        from . import changes, counters
+        objs = list(objs)
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        changes.touch(getattr(obj, counters.key_attname(self.model)) for obj in objs)
+        return updated
+
+    def delete(self):
+        from . import changes, counters
+        counts = Counter(self.values_list(counters.key_attname(self.model), flat=True))
+        with counters.suspended(self.model):
+            deleted = super().delete()
+        counters.add(self.model, {pk: -count for pk, count in counts.items()})
+        changes.touch(counts)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class ReorderQuerySetMixin:
+    """Reorder the rows of many `order_with_respect_to` groups at once.
+
+    `OrderedModel.to()` and its siblings shift the rows in between with an UPDATE per
+    move. `reorder()` and `move()` read the affected groups once, compute their new
+    orders and write the changed ones with `bulk_update()`, a CASE-based UPDATE per
+    batch. Every affected group ends up with the orders 0 to n-1, and the components of
+    the reordered groups are touched through `components.changes`.
+    """
+
+    def _groups(self, keys, by: str) -> Dict[Any, List[Tuple[Any, Any, int]]]:
+        """Return the `(pk, by value, order)` rows of each group in `keys`, in their order."""
+        meta = self.model._meta
+        wrt, = self.model.get_order_with_respect_to()
+        wrt = meta.get_field(wrt).attname
+        by = meta.pk.attname if by == 'pk' else meta.get_field(by).attname
+        order = self.model.order_field_name
+        keys = list(keys)
+        groups = {key: [] for key in keys}
+        for start in range(0, len(keys), BATCH_SIZE):
+            rows = self.model._base_manager.using(self.db).filter(**{f'{wrt}__in': keys[start:start + BATCH_SIZE]})
+            for pk, key, value, position in rows.order_by(wrt, order, 'pk').values_list('pk', wrt, by, order):
+                groups[key].append((pk, value, position))
+        return groups
+
+    def _write(self, groups: Mapping[Any, Sequence[Tuple[Any, Any, int]]]) -> int:
+        from . import changes
+        order = self.model.order_field_name
+        changed, keys = [], set()
+        for key, rows in groups.items():
+            for position, (pk, _, stored) in enumerate(rows):
+                if stored != position:
+                    changed.append(self.model(pk=pk, **{order: position}))
+                    keys.add(key)
+        if changed:
+            self.model._base_manager.using(self.db).bulk_update(changed, [order])
+            rows_changed.send(sender=self.model, using=self.db)
+            changes.touch(keys)
+        return len(changed)
+
+    def reorder(self, orderings: Mapping[Any, Sequence[Any]], by: str = 'pk') -> int:
+        """Give the rows of each group in `orderings` the order of its list.
+
+        `orderings` maps `order_with_respect_to` values to the `by` values of all the
+        group's rows in their new order; rows with the same value keep their relative
+        order. Returns the number of rows whose order changed.
+        """
+        groups = self._groups(orderings, by)
+        for key, values in orderings.items():
+            rows = groups[key]
+            if Counter(values) != Counter(value for _, value, _ in rows):
+                raise ValueError(f'The new order of {key} must list each of its {len(rows)} rows once.')
+            matches: Dict[Any, list] = {}
+            for row in rows:
+                matches.setdefault(row[1], []).append(row)
+            groups[key] = [matches[value].pop(0) for value in values]
+        return self._write(groups)
+
+    reorder.alters_data = True
+
+    def move(self, moves: Mapping[Any, Sequence[Tuple[Any, int]]], by: str = 'pk') -> int:
+        """Move rows of each group in `moves` to new positions, one move after the other.
+
+        `moves` maps `order_with_respect_to` values to `(by value, position)` pairs; the
+        first row with the value moves, positions past either end move it to that end.
+        Returns the number of rows whose order changed.
+        """
+        groups = self._groups(moves, by)
+        for key, group_moves in moves.items():
+            rows = groups[key]
+            for value, position in group_moves:
+                index = next((i for i, row in enumerate(rows) if row[1] == value), None)
+                if index is None:
+                    raise ValueError(f'{key} has no row with {by} {value}.')
+                rows.insert(min(max(position, 0), len(rows) - 1), rows.pop(index))
+        return self._write(groups)
+
+    move.alters_data = True
+
+
+class PresetOrderQuerySetMixin:
+    """`bulk_create(objs, keep_orders=True)` inserts rows whose orders are already set.
+
+    `OrderedModelQuerySet.bulk_create()` otherwise appends every row to its group, with a
+    query for the next order of each group.
+    """
+
+    def bulk_create(self, objs, *args, keep_orders: bool = False, **kwargs):
+        if keep_orders:
+            return super(OrderedModelQuerySet, self).bulk_create(objs, *args, **kwargs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class CountedQuerySet(ChangeSignalQuerySetMixin, CountedQuerySetMixin, models.QuerySet):
+    ...
+
+
+class TimestampedQuerySet(ChangeSignalQuerySetMixin, TimestampedQuerySetMixin, models.QuerySet):
+    ...
+
+
+class TimestampedCountedQuerySet(TimestampedQuerySetMixin, CountedQuerySet):
+    ...
+
+
+class ComponentQuerySet(ChangeSignalQuerySetMixin, TimestampedQuerySetMixin, MultiTableQuerySetMixin, models.QuerySet):
+    """Components, whose batch writes also maintain the search index of `components.search`."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import search
+        objs = super().bulk_create(objs, *args, **kwargs)
+        search.index(objs)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        from . import search
+        objs = list(objs)
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        if set(fields) & set(search.COLUMNS):
+            search.index(objs)
+        return updated
+
+
+class OrderedCountedQuerySet(ChangeSignalQuerySetMixin, ReorderQuerySetMixin, CountedQuerySetMixin,
+                             PresetOrderQuerySetMixin, OrderedModelQuerySet):
+    ...
+
+
+CountedManager = models.Manager.from_queryset(CountedQuerySet)
+TimestampedManager = models.Manager.from_queryset(TimestampedQuerySet)
+TimestampedCountedManager = models.Manager.from_queryset(TimestampedCountedQuerySet)
+ComponentManager = models.Manager.from_queryset(ComponentQuerySet)
+
+
+class OrderedCountedManager(OrderedModelManager.from_queryset(OrderedCountedQuerySet)):
+    ...
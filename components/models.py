@@ -4,6 +4,10 @@ from django.db import models
 from django.utils import timezone
 from ordered_model.models import OrderedModel
 
+from .managers import (
+    ComponentManager, CountedManager, OrderedCountedManager, TimestampedCountedManager, TimestampedManager,
+)
+
 UserModel = get_user_model()
 
 
@@ -18,6 +22,24 @@ def pluralize(noun):
         return noun + 's'
 
 
+class CounterField(models.PositiveIntegerField):
+    """Denormalized count that `Model.save()` writes on insert only.
+
+    Updates keep the stored value, which `components.counters` changes in place, instead
+    of writing back the possibly stale value of the instance.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default', 0)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def pre_save(self, model_instance, add):
+        if add:
+            return super().pre_save(model_instance, add)
+        return models.F(self.attname)
+
+
 class NameDescriptionMixin(models.Model):
     """NameDescriptionMixin adds a name and a description field to a model."""
     name = models.CharField(max_length=256, default='MyName', unique=True)
@@ -52,6 +74,10 @@ class CreatorMixin(models.Model):
     """CreatorMixin adds a reference to the user that created the instance and the creation date."""
     creator = models.ForeignKey(UserModel, on_delete=models.PROTECT, editable=True)
     created = models.DateTimeField(editable=False, blank=True)
+    # Stamped by the batch writes of `TimestampedManager` as `save()` does
+    created_timestamps = ('created',)
+
+    objects = TimestampedManager()
 
     def __init_subclass__(cls) -> None:
         cls.creator.field.remote_field.related_name = f"created_{pluralize(cls.__name__.lower())}"
@@ -73,6 +99,10 @@ class ModifiedMixin(models.Model):
     last_modifier = models.ForeignKey(UserModel, on_delete=models.PROTECT,
                                       editable=True)
     last_modified = models.DateTimeField(editable=False, blank=True)
+    # Stamped by the batch writes of `TimestampedManager` as `save()` does
+    modified_timestamps = ('last_modified',)
+
+    objects = TimestampedManager()
 
     def __init_subclass__(cls) -> None:
         cls.last_modifier.field.remote_field.related_name = f"modified_{pluralize(cls.__name__.lower())}"
@@ -135,10 +165,19 @@ class Review(models.Model):
     )
     component = models.ForeignKey(
         'Component', on_delete=models.CASCADE, related_name="reviews", null=True, 
-        blank=True)
+        blank=True, db_index=False)
     date = models.DateTimeField(editable=False, blank=True)
     reviewer = models.ForeignKey(UserModel, on_delete=models.PROTECT, 
                                  related_name='reviews')
+    created_timestamps = ('date',)
+
+    objects = TimestampedCountedManager()
+
+    class Meta:
+        indexes = [
+            # The reviews of a page of components, read in primary key order
+            models.Index(fields=['component', 'id'], name='review_component_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         # On save, update timestamps
@@ -159,6 +198,9 @@ class BaseComponent(models.Model):
     links = models.ManyToManyField(Link, through='OrderedLink', blank=True,
                                    related_name="components")
     value = models.CharField(max_length=256, unique=False, null=True, blank=True)
+    # Denormalized relation sizes, maintained by `components.counters`
+    f_nodes_count = CounterField()
+    links_count = CounterField()
 
 
 class Component(BaseComponent, CreatorMixin, ModifiedMixin, models.Model):
@@ -180,14 +222,35 @@ class Component(BaseComponent, CreatorMixin, ModifiedMixin, models.Model):
     x = models.FloatField(null=True, blank=True)
     y = models.FloatField(null=True, blank=True)
     z = models.FloatField(null=True, blank=True)
+    # Denormalized relation sizes, maintained by `components.counters`
+    qualifications_count = CounterField()
+    reviews_count = CounterField()
+
+    objects = ComponentManager()
+
+    class Meta(CreatorMixin.Meta):
+        indexes = [
+            # The newest first order of the REST and GraphQL listings and their cursors
+            models.Index(fields=['created', 'basecomponent_ptr'], name='component_created_idx'),
+            # The `modified_since` filter of the export and the oldest first order of the changes
+            models.Index(fields=['last_modified', 'basecomponent_ptr'], name='component_last_modified_idx'),
+        ]
 
 
 class OrderedFNode(OrderedModel):
     f_node = models.ForeignKey(FNode, on_delete=models.PROTECT, related_name="positions")
     base_component = models.ForeignKey(BaseComponent, on_delete=models.CASCADE, 
-                                       related_name="ordered_f_nodes")
+                                       related_name="ordered_f_nodes", db_index=False)
     order_with_respect_to = 'base_component'
 
+    objects = OrderedCountedManager()
+
+    class Meta(OrderedModel.Meta):
+        indexes = [
+            # The f-nodes of a component in order, and the order lookups of `OrderedModel`
+            models.Index(fields=['base_component', 'order'], name='orderedfnode_component_idx'),
+        ]
+
     @property
     def position(self):
         return f'FNode Ref{" " + self.order if self.order != 0 else ""}'
@@ -196,9 +259,17 @@ class OrderedFNode(OrderedModel):
 class OrderedLink(OrderedModel):
     link = models.ForeignKey(Link, on_delete=models.PROTECT, related_name="positions")
     base_component = models.ForeignKey(BaseComponent, on_delete=models.CASCADE,
-                                       related_name="ordered_links")
+                                       related_name="ordered_links", db_index=False)
     order_with_respect_to = 'base_component'
 
+    objects = OrderedCountedManager()
+
+    class Meta(OrderedModel.Meta):
+        indexes = [
+            # The links of a component in order, and the order lookups of `OrderedModel`
+            models.Index(fields=['base_component', 'order'], name='orderedlink_component_idx'),
+        ]
+
     @property
     def position(self) -> str:
         return f'Link{" " + self.order if self.order != 0 else ""}'
@@ -210,3 +281,14 @@ class AnnotatedQualification(models.Model):
                                   related_name="annotated_qualifications")
     qualification = models.ForeignKey(Qualification, on_delete=models.PROTECT,
                                       related_name="annotations")
+
+    objects = CountedManager()
+
+
+class ComponentTombstone(models.Model):
+    """A deleted component, reported to the clients syncing the changes since a point in time."""
+    component_id = models.BigIntegerField()
+    deleted = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['deleted', 'id']
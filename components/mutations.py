@@ -0,0 +1,173 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional, Type
+
+import strawberry
+from django.db import models as django_models, transaction
+from django.utils import timezone
+from strawberry import relay
+from strawberry.types.info import Info
+from strawberry_django_plus import gql
+from strawberry_django_plus.optimizer import optimizer
+from strawberry_django_plus.utils.resolvers import async_safe
+
+from . import bulk, models
+from .types import Component
+
+
+def node_pk(global_id: relay.GlobalID, model: Type[django_models.Model]) -> Any:
+    """Return the primary key of a `model` row from its global ID."""
+    if global_id.type_name != model.__name__:
+        raise ValueError(f'Expected the ID of a {model.__name__}, got one of a {global_id.type_name}.')
+    return model._meta.pk.to_python(global_id.node_id)
+
+
+@gql.input
+class AnnotatedQualificationInput:
+    qualification: relay.GlobalID
+    annotation: Optional[str] = None
+
+
+@gql.input
+class ComponentInput:
+    """A component to create, or to update when `id` is given; omitted fields keep their value.
+
+    `links`, `fNodes` and `qualifications` replace the component's relations, links and
+    f-nodes in the given order.
+    """
+    id: Optional[relay.GlobalID] = strawberry.UNSET
+    type: Optional[relay.GlobalID] = strawberry.UNSET
+    library: Optional[relay.GlobalID] = strawberry.UNSET
+    lifecycle_state: Optional[relay.GlobalID] = strawberry.UNSET
+    manufacturer: Optional[relay.GlobalID] = strawberry.UNSET
+    mounting: Optional[relay.GlobalID] = strawberry.UNSET
+    package: Optional[relay.GlobalID] = strawberry.UNSET
+    mpn: Optional[str] = strawberry.UNSET
+    description: Optional[str] = strawberry.UNSET
+    value: Optional[str] = strawberry.UNSET
+    remarks: Optional[str] = strawberry.UNSET
+    autogenerate_description: Optional[bool] = strawberry.UNSET
+    autogenerate_value: Optional[bool] = strawberry.UNSET
+    stock: Optional[int] = strawberry.UNSET
+    x: Optional[float] = strawberry.UNSET
+    y: Optional[float] = strawberry.UNSET
+    z: Optional[float] = strawberry.UNSET
+    links: Optional[List[relay.GlobalID]] = strawberry.UNSET
+    f_nodes: Optional[List[relay.GlobalID]] = strawberry.UNSET
+    qualifications: Optional[List[AnnotatedQualificationInput]] = strawberry.UNSET
+
+    def to_row(self) -> Dict[str, Any]:
+        """Return the row of `bulk.save_components` with the given fields."""
+        row = {}
+        if self.id:
+            row['pk'] = node_pk(self.id, models.Component)
+        for name, field in bulk.FIELDS.items():
+            value = getattr(self, field.name, strawberry.UNSET)
+            if value is strawberry.UNSET:
+                continue
+            if field.is_relation and value is not None:
+                value = node_pk(value, field.related_model)
+            row[name] = value
+        if self.links is not None and self.links is not strawberry.UNSET:
+            row['links'] = [{'link_id': node_pk(link, models.Link)} for link in self.links]
+        if self.f_nodes is not None and self.f_nodes is not strawberry.UNSET:
+            row['f_nodes'] = [{'f_node_id': node_pk(f_node, models.FNode)} for f_node in self.f_nodes]
+        if self.qualifications is not None and self.qualifications is not strawberry.UNSET:
+            row['qualifications'] = [
+                {'qualification_id': node_pk(q.qualification, models.Qualification), 'annotation': q.annotation}
+                for q in self.qualifications
+            ]
+        return row
+
+
+@gql.input
+class MoveInput:
+    """Moves the first of the component's links or f-nodes with `id` to `position`, counted from 0."""
+    id: relay.GlobalID
+    position: int
+
+
+@gql.input
+class ReorderInput:
+    """New orders of a component's links and f-nodes.
+
+    `links` and `fNodes` list all of them in their new order, `linkMoves` and
+    `fNodeMoves` move single ones, one after the other and after the full orders.
+    """
+    component: relay.GlobalID
+    links: Optional[List[relay.GlobalID]] = strawberry.UNSET
+    f_nodes: Optional[List[relay.GlobalID]] = strawberry.UNSET
+    link_moves: Optional[List[MoveInput]] = strawberry.UNSET
+    f_node_moves: Optional[List[MoveInput]] = strawberry.UNSET
+
+
+def check_batch(info: Info, inputs: list):
+    """Return the signed in user, who may change at most `relay_max_results` components at once."""
+    user = getattr(getattr(info.context, 'request', None), 'user', None)
+    if user is None or not user.is_authenticated:
+        raise PermissionError('Sign in to save components.')
+    max_results = info.schema.config.relay_max_results
+    if len(inputs) > max_results:
+        raise ValueError(f'At most {max_results} components can be saved at once.')
+    return user
+
+
+def reload(info: Info, pks: List[Any]) -> List[models.Component]:
+    """Return the components of `pks` in their order, with the relations and counters the selection reads."""
+    queryset = models.Component.objects.filter(pk__in=pks)
+    extension = optimizer.get()
+    if extension is not None:
+        queryset = extension.optimize(queryset, info)
+    components = {component.pk: component for component in queryset}
+    return [components[pk] for pk in pks]
+
+
+@async_safe
+def save_components(info: Info, inputs: List[ComponentInput]) -> List[models.Component]:
+    user = check_batch(info, inputs)
+    components = bulk.save_components([component.to_row() for component in inputs], user)
+    return reload(info, [component.pk for component in components])
+
+
+@async_safe
+def reorder_components(info: Info, inputs: List[ReorderInput]) -> List[models.Component]:
+    user = check_batch(info, inputs)
+    pks = [node_pk(item.component, models.Component) for item in inputs]
+    # A later entry of a component would replace the orders and moves of an earlier one
+    duplicates = [pk for pk, count in Counter(pks).items() if count > 1]
+    if duplicates:
+        raise ValueError(f"Duplicate Component IDs: {', '.join(map(str, sorted(duplicates)))}")
+    missing = set(pks) - set(models.Component.objects.in_bulk(pks))
+    if missing:
+        raise ValueError(f"Unknown Component IDs: {', '.join(map(str, sorted(missing)))}")
+    # (ordered model, related model, field it is matched by, inputs of the full orders and of the moves)
+    relations = [
+        (models.OrderedLink, models.Link, 'link', 'links', 'link_moves'),
+        (models.OrderedFNode, models.FNode, 'f_node', 'f_nodes', 'f_node_moves'),
+    ]
+    with transaction.atomic():
+        for model, target, field, orders_name, moves_name in relations:
+            orderings, moves = {}, {}
+            for pk, item in zip(pks, inputs):
+                order = getattr(item, orders_name)
+                if order is not None and order is not strawberry.UNSET:
+                    orderings[pk] = [node_pk(global_id, target) for global_id in order]
+                item_moves = getattr(item, moves_name)
+                if item_moves is not None and item_moves is not strawberry.UNSET:
+                    moves[pk] = [(node_pk(move.id, target), move.position) for move in item_moves]
+            model.objects.reorder(orderings, by=field)
+            model.objects.move(moves, by=field)
+        models.Component.objects.filter(pk__in=pks).update(last_modifier=user, last_modified=timezone.now())
+    return reload(info, pks)
+
+
+@gql.type
+class Mutation:
+    """All available mutations for this schema."""
+
+    @gql.mutation(description='Create and update components with their relations in one transaction.')
+    def save_components(self, info: Info, input: List[ComponentInput]) -> List[Component]:
+        return save_components(info, input)
+
+    @gql.mutation(description='Reorder the links and f-nodes of components, each relation in one update.')
+    def reorder_components(self, info: Info, input: List[ReorderInput]) -> List[Component]:
+        return reorder_components(info, input)
@@ -0,0 +1,399 @@
+"""Optimizer additions that resolve nested connection totals in the parent query."""
+import inspect
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, TypeVar, cast
+
+from django.db import models
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from graphql.language import OperationType
+from graphql.type.definition import GraphQLResolveInfo, get_named_type
+from strawberry import relay
+from strawberry.extensions.field_extension import FieldExtension
+from strawberry.lazy_type import LazyType
+from strawberry.object_type import StrawberryObjectDefinition
+from strawberry.type import get_object_definition
+from strawberry.types.info import Info
+from strawberry.types.nodes import SelectedField, convert_selections
+from strawberry_django_plus import optimizer
+from strawberry_django_plus.utils.inspect import get_django_type, get_model_fields, get_selections
+
+from . import lookups
+from .cost import page_limit
+
+# Selections of a nested connection that can be answered from the count alone
+COUNT_ONLY_SELECTIONS = {'totalCount', '__typename'}
+
+
+def total_count_subquery(model: Type[models.Model], relation: str) -> Optional[Coalesce]:
+    """Return a correlated subquery counting the rows of a to-many relation of `model`.
+
+    Counting the through (or reverse foreign key) table per parent row avoids the
+    row multiplication of joining several relations and aggregating afterwards.
+    """
+    field = model._meta.get_field(relation)
+    if field.many_to_many and not field.auto_created:
+        related_model = field.remote_field.through
+        lookup = field.m2m_field_name()
+    elif field.one_to_many:
+        related_model = field.related_model
+        lookup = field.field.name
+    else:
+        return None
+
+    counts = related_model._base_manager \
+        .filter(**{lookup: OuterRef('pk')}) \
+        .order_by() \
+        .values(lookup) \
+        .annotate(total_count=Count('*')) \
+        .values('total_count')
+    return Coalesce(Subquery(counts), 0)
+
+
+def load_fields(qs: models.QuerySet, *fields: str) -> models.QuerySet:
+    """Make sure the `only()` or `defer()` of `qs` did not defer `fields`."""
+    names, defer = qs.query.deferred_loading
+    if defer and names & set(fields):
+        qs = qs._chain()
+        qs.query.deferred_loading = (names - set(fields), True)
+    elif not defer and names and not set(fields) <= names:
+        qs = qs.only(*names, *fields)
+    return qs
+
+
+class KnownCount:
+    """Stand-in for the nodes of a connection of which only the size is needed."""
+
+    def __init__(self, count: int):
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, key: slice) -> list:
+        return []
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(())
+
+
+class TotalCountExtension(FieldExtension):
+    """Answer `totalCount` of a nested connection from its parent row.
+
+    When a connection only selects `totalCount`, `DjangoOptimizerExtension` below
+    loads the parent's `counter` column, if given, or else annotates the parent
+    queryset with `total_count_<field>`; this extension then skips fetching the
+    related rows altogether. If edges are requested, the prefetched list is used and
+    counted by its length.
+    """
+
+    relation: str
+    attname: str
+
+    def __init__(self, counter: Optional[str] = None):
+        self.counter = counter
+
+    def apply(self, field) -> None:
+        self.relation = getattr(field, 'django_name', None) or field.python_name
+        self.attname = f'total_count_{field.python_name}'
+
+    def resolve(self, next_, source: Any, info: Info, **kwargs: Any) -> Any:
+        total_count = getattr(source, self.attname, None)
+        if total_count is None and self.counter is not None:
+            # Read from the instance dict, a deferred counter must not load on access
+            total_count = source.__dict__.get(self.counter)
+        if total_count is not None and _is_count_only(info.selected_fields[0]):
+            return KnownCount(total_count)
+
+        nodes = next_(source, info, **kwargs)
+        if inspect.isawaitable(nodes):
+            async def resolver():
+                return _prefetched_list(await nodes)
+            return resolver()
+        return _prefetched_list(nodes)
+
+
+def _prefetched_list(nodes: Any) -> Any:
+    # A prefetched queryset is sliced into a plain list, which the async connection
+    # resolution rejects as it expects an async iterable. Hand over the list instead.
+    if isinstance(nodes, models.QuerySet) and nodes._result_cache is not None:
+        return nodes._result_cache
+    return nodes
+
+
+def _is_count_only(selection: SelectedField) -> bool:
+    if set(selection.arguments) & {'filters', 'order'}:
+        return False
+    return set(get_selections(selection)) <= COUNT_ONLY_SELECTIONS
+
+
+def interface_types(schema, interface: StrawberryObjectDefinition,
+                    model: Type[models.Model]) -> List[StrawberryObjectDefinition]:
+    """Return the object types implementing `interface` that are types of exactly `model`."""
+    types = []
+    for graphql_type in schema.schema_converter.type_map.values():
+        type_def = graphql_type.definition
+        if not isinstance(type_def, StrawberryObjectDefinition) or type_def.is_interface:
+            continue
+        django_type = get_django_type(type_def.origin)
+        if django_type is not None and django_type.model is model and issubclass(type_def.origin, interface.origin):
+            types.append(type_def)
+    return types
+
+
+def _get_return_type(info: GraphQLResolveInfo) -> Optional[StrawberryObjectDefinition]:
+    type_def = info.schema._strawberry_schema.get_type_by_name(get_named_type(info.return_type).name)
+    return type_def if isinstance(type_def, StrawberryObjectDefinition) else None
+
+
+def _get_field_selections(info: GraphQLResolveInfo) -> Iterator[SelectedField]:
+    for selection in convert_selections(info, info.field_nodes):
+        if isinstance(selection, SelectedField) and selection.name == info.field_name:
+            yield selection
+
+
+def _get_node_selections(info: GraphQLResolveInfo,
+                         model: Type[models.Model]) -> Iterator[Tuple[StrawberryObjectDefinition, Dict[str, SelectedField]]]:
+    """Yield the selections made on the model type returned by the current field.
+
+    For an interface field, such as `node`, those are the fragments on the types of `model`.
+    """
+    schema = info.schema._strawberry_schema
+    type_def = _get_return_type(info)
+    if type_def is None:
+        return
+
+    if type_def.is_interface:
+        for node_def in interface_types(schema, type_def, model):
+            typename = schema.config.name_converter.from_object(node_def)
+            for selection in _get_field_selections(info):
+                yield node_def, get_selections(selection, typename=typename)
+        return
+
+    node_def = type_def
+    is_connection = bool(type_def.concrete_of) and issubclass(type_def.concrete_of.origin, relay.Connection)
+    if is_connection:
+        node_type = type_def.type_var_map[cast(TypeVar, relay.NodeType)]
+        if isinstance(node_type, LazyType):
+            node_type = node_type.resolve_type()
+        node_def = get_object_definition(node_type, strict=True)
+
+    for selection in _get_field_selections(info):
+        if not is_connection:
+            yield node_def, get_selections(selection)
+            continue
+        for edges in get_selections(selection).values():
+            if edges.name != 'edges':
+                continue
+            for node in get_selections(edges).values():
+                if node.name == 'node':
+                    yield node_def, get_selections(node)
+
+
+# The optimizer of strawberry-django-plus 3.1.1 has no public hook for the hints of one
+# model, nor for the configuration of an extension instance. These two functions are the only
+# users of its private API; `NodesTests.test_private_optimizer_api` fails when an upgrade changes it.
+def model_hints(model: Type[models.Model], schema, type_def: StrawberryObjectDefinition, selection: SelectedField,
+                info: GraphQLResolveInfo, config: optimizer.OptimizerConfig) -> Optional[optimizer.OptimizerStore]:
+    return optimizer._get_model_hints(model, schema, type_def, selection, info=info, config=config)
+
+
+def extension_config(extension: optimizer.DjangoOptimizerExtension,
+                     info: GraphQLResolveInfo) -> optimizer.OptimizerConfig:
+    return optimizer.OptimizerConfig(
+        # Sic, the attribute is misspelled in 3.1.1
+        enable_only=extension._enable_ony and info.operation.operation == OperationType.QUERY,
+        enable_select_related=extension._enable_select_related,
+        enable_prefetch_related=extension._enable_prefetch_related,
+        prefetch_custom_queryset=extension._prefetch_custom_queryset,
+    )
+
+
+def optimize_interface(qs: models.QuerySet, info: GraphQLResolveInfo, interface: StrawberryObjectDefinition,
+                       config: optimizer.OptimizerConfig) -> models.QuerySet:
+    """Optimize `qs` for the fragments of an interface field on the types of its model.
+
+    The base optimizer remembers the types implementing an interface for the first model
+    it optimized, so `nodes` of other models went unoptimized. The types are looked up
+    for each model here instead.
+    """
+    schema = info.schema._strawberry_schema
+    store = optimizer.OptimizerStore()
+    for type_def in interface_types(schema, interface, qs.model):
+        for selection in _get_field_selections(info):
+            new_store = model_hints(qs.model, schema, type_def, selection, info=info, config=config)
+            if new_store is not None:
+                store |= new_store
+    if not store:
+        return qs
+    qs = store.apply(qs, info=info, config=config)
+    qs._gql_optimized = True
+    return qs
+
+
+def annotate_total_counts(qs: models.QuerySet, info: GraphQLResolveInfo) -> models.QuerySet:
+    """Move count-only nested connections from prefetches into counter columns or count annotations."""
+    annotations: Dict[str, Coalesce] = {}
+    counters = set()
+    skip_prefetch = set()
+    name_converter = info.schema._strawberry_schema.config.name_converter
+
+    for node_def, selections in _get_node_selections(info, qs.model):
+        fields = {name_converter.get_graphql_name(f): f for f in node_def.fields}
+        for f_selection in selections.values():
+            field = fields.get(f_selection.name)
+            extension = next(
+                (e for e in getattr(field, 'extensions', ()) if isinstance(e, TotalCountExtension)),
+                None,
+            )
+            if extension is None or not _is_count_only(f_selection):
+                continue
+            if extension.counter is not None:
+                counters.add(extension.counter)
+            elif extension.attname not in qs.query.annotations:
+                annotation = total_count_subquery(qs.model, extension.relation)
+                if annotation is None:
+                    continue
+                annotations[extension.attname] = annotation
+            skip_prefetch.add(extension.relation)
+
+    if not skip_prefetch:
+        return qs
+
+    prefetches = [
+        p for p in qs._prefetch_related_lookups
+        if (p if isinstance(p, str) else p.prefetch_to).split('__')[0] not in skip_prefetch
+    ]
+    qs = load_fields(qs.prefetch_related(None).prefetch_related(*prefetches).annotate(**annotations), *counters)
+    # Cloning drops the optimizer's marker, keep it so the queryset is not optimized again
+    qs._gql_optimized = True
+    return qs
+
+
+class SlicedPrefetch(Prefetch):
+    """Prefetch of the first `size` related rows of each instance.
+
+    Django 4.2 slices the prefetch query per instance with a window function, but then
+    fails to filter the sliced queryset for the managers of the instances. Only the query
+    is sliced here, the managers get the queryset unsliced.
+    """
+
+    def __init__(self, lookup: str, queryset: models.QuerySet, size: int):
+        super().__init__(lookup, queryset=queryset)
+        self.size = size
+
+    def get_current_queryset(self, level):
+        queryset = super().get_current_queryset(level)
+        return queryset[:self.size] if queryset is not None else None
+
+
+def limit_prefetches(qs: models.QuerySet, info: GraphQLResolveInfo) -> models.QuerySet:
+    """Slice the prefetches of nested connections whose pages are clamped by the operation's cost budget.
+
+    Such a connection serves the first rows of its clamped page, and one more telling
+    whether there is a next page, so the rows past them are not read. Connections paged
+    backwards or from a cursor, filtered or ordered, or selecting `totalCount` (counted
+    from the prefetched list), and prefetches nested deeper, are read whole.
+    """
+    limit = page_limit.get()
+    if limit is None:
+        return qs
+    return_type = _get_return_type(info)
+    is_connection = return_type is not None and bool(return_type.concrete_of) \
+        and issubclass(return_type.concrete_of.origin, relay.Connection)
+    # The depth of the connections selected on the nodes, as counted by `clamp_page_size`
+    if sum(key == 'edges' for key in info.path.as_list()) + is_connection < limit.depth:
+        return qs
+
+    max_results = info.schema._strawberry_schema.config.relay_max_results
+    name_converter = info.schema._strawberry_schema.config.name_converter
+    sizes: Dict[str, int] = {}
+    for node_def, selections in _get_node_selections(info, qs.model):
+        fields = {name_converter.get_graphql_name(f): f for f in node_def.fields}
+        for f_selection in selections.values():
+            field = fields.get(f_selection.name)
+            arguments = f_selection.arguments
+            subselections = {selection.name for selection in get_selections(f_selection).values()}
+            if field is None or 'edges' not in subselections or 'totalCount' in subselections \
+                    or any(arguments.get(name) for name in ('last', 'after', 'before', 'filters', 'order')):
+                continue
+            # Literal arguments are left unparsed by the selections
+            first = int(arguments['first']) if arguments.get('first') is not None else max_results
+            relation = getattr(field, 'django_name', None) or field.python_name
+            sizes[relation] = min(first, limit.size) + 1
+
+    prefetches = []
+    changed = False
+    for prefetch in qs._prefetch_related_lookups:
+        lookup = prefetch if isinstance(prefetch, str) else prefetch.prefetch_through
+        size = sizes.get(lookup)
+        queryset = getattr(prefetch, 'queryset', None)
+        # Prefetches into attributes are left alone, so are sliced querysets
+        if size is not None and getattr(prefetch, 'to_attr', None) is None and (
+                queryset is None or not queryset.query.is_sliced):
+            if queryset is None:
+                queryset = qs.model._meta.get_field(lookup).related_model._default_manager.all()
+            prefetch = SlicedPrefetch(lookup, queryset, size)
+            changed = True
+        prefetches.append(prefetch)
+    if not changed:
+        return qs
+    qs = qs.prefetch_related(None).prefetch_related(*prefetches)
+    qs._gql_optimized = True
+    return qs
+
+
+def skip_lookup_joins(qs: models.QuerySet, info: GraphQLResolveInfo) -> models.QuerySet:
+    """Drop the JOINs to lookup tables that are resolved from the lookup cache instead."""
+    if not lookups.is_enabled() or not isinstance(qs.query.select_related, dict):
+        return qs
+
+    skip = set()
+    name_converter = info.schema._strawberry_schema.config.name_converter
+    model_fields = get_model_fields(qs.model)
+
+    for node_def, selections in _get_node_selections(info, qs.model):
+        django_type = get_django_type(node_def.origin)
+        if django_type is None or not issubclass(qs.model, django_type.model):
+            continue
+        fields = {name_converter.get_graphql_name(f): f for f in node_def.fields}
+        for f_selection in selections.values():
+            field = fields.get(f_selection.name)
+            if field is None:
+                continue
+            name = getattr(field, 'django_name', None) or field.python_name
+            model_field = model_fields.get(name)
+            if isinstance(model_field, models.ForeignKey) and lookups.is_lookup_model(model_field.related_model):
+                skip.add(name)
+
+    skip &= set(qs.query.select_related)
+    if not skip:
+        return qs
+
+    qs = qs._chain()
+    qs.query.select_related = {k: v for k, v in qs.query.select_related.items() if k not in skip} or False
+    field_names, defer = qs.query.deferred_loading
+    if not defer:
+        # Keep the foreign key columns but not the columns of the skipped tables
+        qs.query.deferred_loading = (
+            frozenset(n for n in field_names if n.split('__', 1)[0] not in skip or '__' not in n),
+            defer,
+        )
+    return qs
+
+
+class DjangoOptimizerExtension(optimizer.DjangoOptimizerExtension):
+    """DjangoOptimizerExtension that also resolves nested `totalCount` in the parent query,
+    leaves cached lookup tables out of the JOINs and optimizes each model of `node`/`nodes`."""
+
+    def optimize(self, qs, info, *, store=None):
+        raw_info = info._raw_info if isinstance(info, Info) else info
+        return_type = _get_return_type(raw_info)
+        if return_type is not None and return_type.is_interface and store is None and self.enabled.get() \
+                and isinstance(qs, models.QuerySet) and qs._result_cache is None \
+                and not getattr(qs, '_gql_optimized', False):
+            qs = optimize_interface(qs, raw_info, return_type, extension_config(self, raw_info))
+        else:
+            qs = super().optimize(qs, info, store=store)
+        if not self.enabled.get() or not isinstance(qs, models.QuerySet) or qs._result_cache is not None:
+            return qs
+        return skip_lookup_joins(limit_prefetches(annotate_total_counts(qs, raw_info), raw_info), raw_info)
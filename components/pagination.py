@@ -0,0 +1,201 @@
+"""Keyset pagination for the GraphQL connections.
+
+The default relay connection encodes the offset of a node in its cursor and pages with
+`OFFSET`, which gets slower the deeper a client pages. `KeysetConnection` orders by
+`(created, id)`, newest first like the REST `RecordPagination`, encodes that pair in the
+cursor and seeks to the next page with a `WHERE` clause instead. Search results, which
+carry the `search_rank` annotation, are paged the same way by `(search_rank, id)`, and
+querysets ordered by `last_modified` (the changes since a point in time) oldest first by
+`(last_modified, id)`.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+import strawberry
+from django.db.models import Q, QuerySet
+from strawberry import relay
+from strawberry.relay.types import NodeIterableType
+from strawberry.relay.utils import from_base64, to_base64
+from strawberry.type import StrawberryContainer, get_object_definition
+from strawberry.types.info import Info
+from strawberry.utils.await_maybe import AwaitableOrValue
+from strawberry.utils.inspect import in_async_context
+from strawberry_django_plus import gql
+from typing_extensions import Self
+
+from .cost import clamp_page_size
+from .optimizer import load_fields
+from .search import RANK
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class Keyset(NamedTuple):
+    """An order of the connection by `field` and then `id`, and the cursors of a node's position in it."""
+    prefix: str
+    field: str
+    descending: bool
+    dump: Callable[[Any], str]
+    load: Callable[[str], Any]
+
+    @property
+    def ordering(self) -> Tuple[str, str]:
+        sign = '-' if self.descending else ''
+        return f'{sign}{self.field}', f'{sign}id'
+
+    @property
+    def reverse_ordering(self) -> Tuple[str, str]:
+        sign = '' if self.descending else '-'
+        return f'{sign}{self.field}', f'{sign}id'
+
+
+# Newest first like the REST `RecordPagination`. Whole microseconds keep the timestamp exact,
+# relay cursors must not contain colons.
+CREATED = Keyset('keyset', 'created', True, lambda value: str((value - EPOCH) // MICROSECOND),
+                 lambda value: EPOCH + int(value) * MICROSECOND)
+# Oldest change first, for the changes since a point in time
+MODIFIED = Keyset('modified', 'last_modified', False, CREATED.dump, CREATED.load)
+# Best match first, for the search results
+RANKED = Keyset('rank', RANK, False, repr, float)
+ORDERING = CREATED.ordering
+REVERSE_ORDERING = CREATED.reverse_ordering
+
+
+def keyset_of(qs: QuerySet) -> Keyset:
+    if RANK in qs.query.annotations:
+        return RANKED
+    if qs.query.order_by[:1] == MODIFIED.ordering[:1]:
+        return MODIFIED
+    return CREATED
+
+
+def encode_cursor(node: Any, keyset: Keyset = CREATED) -> str:
+    return to_base64(keyset.prefix, f'{keyset.dump(getattr(node, keyset.field))},{node.pk}')
+
+
+def decode_cursor(cursor: str, keyset: Keyset = CREATED) -> Tuple[Any, int]:
+    try:
+        prefix, value = from_base64(cursor)
+        if prefix != keyset.prefix:
+            raise ValueError(prefix)
+        key, pk = value.split(',')
+        return keyset.load(key), int(pk)
+    except ValueError as e:
+        raise ValueError(f'Invalid cursor {cursor!r}.') from e
+
+
+def load_cursor_fields(qs: QuerySet) -> QuerySet:
+    """Make sure the optimizer's `only()` did not defer the fields the cursors are made of."""
+    keyset = keyset_of(qs)
+    return load_fields(qs, *(field for field in (keyset.field, 'id') if field not in qs.query.annotations))
+
+
+def seek(qs: QuerySet, after: Optional[str] = None, before: Optional[str] = None) -> QuerySet:
+    """Restrict `qs` to the rows between the `after` and `before` cursors in the order of its keyset."""
+    keyset = keyset_of(qs)
+    field = keyset.field
+    # The redundant bound on the field alone lets the index seek, which the OR cannot
+    for cursor, forward in ((after, True), (before, False)):
+        if not cursor:
+            continue
+        key, pk = decode_cursor(cursor, keyset)
+        op = 'lt' if forward == keyset.descending else 'gt'
+        qs = qs.filter(Q(**{f'{field}__{op}': key}) | Q(**{field: key, f'id__{op}': pk}), **{f'{field}__{op}e': key})
+    return qs
+
+
+@strawberry.type(name='Connection', description='A connection to a list of items.')
+class ListConnection(gql.django.ListConnectionWithTotalCount[relay.NodeType]):
+    """Connection paged by offsets, within the page limit of the operation's cost budget."""
+
+    @classmethod
+    def resolve_connection(
+        cls,
+        nodes: NodeIterableType[relay.NodeType],
+        *,
+        info: Info,
+        first: Optional[int] = None,
+        last: Optional[int] = None,
+        **kwargs: Any,
+    ) -> AwaitableOrValue[Self]:
+        first, last = clamp_page_size(info, first, last)
+        return super().resolve_connection(nodes, info=info, first=first, last=last, **kwargs)
+
+
+@strawberry.type(name='Connection', description='A connection to a list of items, paginated by keyset cursors.')
+class KeysetConnection(gql.django.ListConnectionWithTotalCount[relay.NodeType]):
+    @classmethod
+    def resolve_connection(
+        cls,
+        nodes: NodeIterableType[relay.NodeType],
+        *,
+        info: Info,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        first: Optional[int] = None,
+        last: Optional[int] = None,
+        **kwargs: Any,
+    ) -> AwaitableOrValue[Self]:
+        first, last = clamp_page_size(info, first, last)
+        if not isinstance(nodes, QuerySet):
+            # Prefetched lists are already in memory, offsets are cheap there
+            return super().resolve_connection(
+                nodes, info=info, before=before, after=after, first=first, last=last, **kwargs
+            )
+
+        max_results = info.schema.config.relay_max_results
+        for name, value in (('first', first), ('last', last)):
+            if value is not None and not 0 <= value <= max_results:
+                raise ValueError(f"Argument '{name}' must be between 0 and {max_results}.")
+
+        keyset = keyset_of(nodes)
+        qs = load_cursor_fields(seek(nodes, after=after, before=before))
+        backward = first is None and last is not None
+        limit = last if backward else (first if first is not None else max_results)
+        # Overfetch by one row to know whether there is another page
+        page = qs.order_by(*(keyset.reverse_ordering if backward else keyset.ordering))[:limit + 1]
+
+        def build(rows: List[Any]) -> Self:
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            has_previous_page = bool(after)
+            has_next_page = bool(before)
+            if backward:
+                rows.reverse()
+                has_previous_page = has_more
+            else:
+                has_next_page = has_more
+                if last is not None and len(rows) > last:
+                    rows = rows[-last:]
+                    has_previous_page = True
+
+            edges = [
+                cls.edge_class()(cursor=encode_cursor(row, keyset), node=cls.resolve_node(row, info=info, **kwargs))
+                for row in rows
+            ]
+            conn = cls(
+                edges=edges,
+                page_info=relay.PageInfo(
+                    start_cursor=edges[0].cursor if edges else None,
+                    end_cursor=edges[-1].cursor if edges else None,
+                    has_previous_page=has_previous_page,
+                    has_next_page=has_next_page,
+                ),
+            )
+            conn.nodes = nodes
+            return conn
+
+        if in_async_context():
+            async def resolver():
+                return build([row async for row in page])
+
+            return resolver()
+        return build(list(page))
+
+    @classmethod
+    def edge_class(cls) -> type:
+        field = get_object_definition(cls, strict=True).get_field('edges').type
+        while isinstance(field, StrawberryContainer):
+            field = field.of_type
+        return field
@@ -0,0 +1,237 @@
+"""Sampling profiler of the slow or sampled requests, captured to disk for later aggregation.
+
+`ProfilingMiddleware` watches the requests to `PROFILING_PATHS`. Every `PROFILING_EVERY`-th
+of them, and when `PROFILING_SLOW_MS` is set all of them, have the stacks of the threads
+they run in (the request's, and those executing its SQL queries or GraphQL resolvers)
+sampled every `PROFILING_INTERVAL` seconds by one background thread, instead of being
+traced by `cProfile`. A request sampled by count or slower than `PROFILING_SLOW_MS` leaves
+a `.prof` file readable by `pstats` and a `.json` summary of the request and its queries
+in `PROFILING_DIR`, which keeps the newest `PROFILING_MAX_FILES` profiles. The
+`aggregate_profiles` command reports the hot functions across them.
+"""
+import itertools
+import json
+import marshal
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from . import instrumentation
+
+# Frames kept of the innermost end of deeper stacks
+MAX_DEPTH = 256
+
+Function = Tuple[str, int, str]
+
+
+def profile_dir() -> Path:
+    return Path(settings.PROFILING_DIR)
+
+
+class Capture:
+    """The stack samples of one request."""
+
+    def __init__(self, recorder: instrumentation.Recorder):
+        self.recorder = recorder
+        self.stacks: Counter = Counter()
+
+    def sample(self, frames: Dict[int, Any]) -> None:
+        for ident in tuple(self.recorder.threads):
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                # Outermost frame first
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stats(self, interval: float) -> Dict[Function, tuple]:
+        """The samples in the format of `pstats`, each worth `interval` seconds.
+
+        Sample counts stand in for the call counts, which a sampling profiler does not see.
+        """
+        entries: Dict[Function, list] = {}
+        for stack, count in self.stacks.items():
+            seconds = count * interval
+            for depth, function in enumerate(stack):
+                entry = entries.setdefault(function, [0, 0, 0.0, 0.0, {}])
+                innermost = depth == len(stack) - 1
+                if innermost:
+                    entry[2] += seconds
+                # Recursive functions are counted once per stack
+                if function not in stack[depth + 1:]:
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if depth:
+                    callers = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    callers[0] += count
+                    callers[1] += count
+                    callers[2] += seconds if innermost else 0.0
+                    callers[3] += seconds
+        return {
+            function: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+            for function, (cc, nc, tt, ct, callers) in entries.items()
+        }
+
+
+class Sampler:
+    """Background thread sampling the stacks of the requests being captured."""
+
+    def __init__(self):
+        self.captures = set()
+        self.condition = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+
+    def add(self, capture: Capture) -> None:
+        with self.condition:
+            self.captures.add(capture)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='components-profiler', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def remove(self, capture: Capture) -> None:
+        with self.condition:
+            self.captures.discard(capture)
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                # Idle while no request is captured
+                self.condition.wait_for(lambda: self.captures)
+            time.sleep(settings.PROFILING_INTERVAL)
+            # Sampled under the lock, so a capture is no longer written once `remove()` returns
+            with self.condition:
+                frames = sys._current_frames()
+                for capture in self.captures:
+                    capture.sample(frames)
+                del frames
+
+
+sampler = Sampler()
+
+
+def summary(request, response, duration: float, reason: str, capture: Capture) -> Dict[str, Any]:
+    """The request, its response and its queries, stored next to its profile."""
+    recorder = capture.recorder
+    queries = Counter()
+    for (_, sql), count in recorder.templates.items():
+        queries[sql] += count
+    return {
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration': duration * 1000,
+        'reason': reason,
+        'time': datetime.now(timezone.utc).isoformat(),
+        'samples': sum(capture.stacks.values()),
+        'interval': settings.PROFILING_INTERVAL,
+        'queries': [{'sql': sql, 'count': count} for sql, count in queries.most_common(20)],
+        # Its own `duration` is the recorder's lifetime, not the request's
+        'instrumentation': recorder.report(),
+    }
+
+
+def save(request, response, duration: float, reason: str, capture: Capture) -> Path:
+    """Write the profile and summary of a request to `PROFILING_DIR` and drop the oldest beyond the limit."""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    slug = re.sub(r'[^\w]+', '-', request.path).strip('-') or 'root'
+    path = directory / f'{stamp}-{request.method.lower()}-{slug}-{int(duration * 1000)}ms.prof'
+    with open(path, 'wb') as f:
+        marshal.dump(capture.stats(settings.PROFILING_INTERVAL), f)
+    with open(path.with_suffix('.json'), 'w') as f:
+        json.dump(summary(request, response, duration, reason, capture), f, indent=2, default=str)
+
+    # The names start with their time, so they sort oldest first
+    profiles = sorted(directory.glob('*.prof'))
+    for old in profiles[:max(len(profiles) - settings.PROFILING_MAX_FILES, 0)]:
+        old.unlink(missing_ok=True)
+        old.with_suffix('.json').unlink(missing_ok=True)
+    return path
+
+
+class ProfilingMiddleware:
+    """Capture the profiles of every `PROFILING_EVERY`-th and of the slow requests to `PROFILING_PATHS`."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.counter = itertools.count(1)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def start(self, request) -> Optional[Tuple[Optional[str], Capture, Any]]:
+        """Start sampling `request` if it may be captured, returning its sampling reason, capture and token."""
+        if not request.path.startswith(tuple(settings.PROFILING_PATHS)):
+            return None
+        every = settings.PROFILING_EVERY
+        reason = 'sampled' if every and next(self.counter) % every == 0 else None
+        if reason is None and settings.PROFILING_SLOW_MS is None:
+            return None
+        # Reuse the recorder of a request sampled for instrumentation
+        recorder = instrumentation._recorder.get()
+        token = None
+        if recorder is None:
+            recorder = instrumentation.Recorder(reported=False)
+            token = instrumentation._recorder.set(recorder)
+        capture = Capture(recorder)
+        sampler.add(capture)
+        return reason, capture, token
+
+    @staticmethod
+    def stop(started) -> None:
+        _, capture, token = started
+        sampler.remove(capture)
+        if token is not None:
+            instrumentation._recorder.reset(token)
+
+    @staticmethod
+    def capture(request, response, started, duration: float) -> None:
+        reason, capture, _ = started
+        slow_ms = settings.PROFILING_SLOW_MS
+        if reason is None and slow_ms is not None and duration * 1000 >= slow_ms:
+            reason = 'slow'
+        if reason is not None:
+            save(request, response, duration, reason, capture)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = self.start(request)
+        if started is None:
+            return self.get_response(request)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(started)
+        self.capture(request, response, started, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        started = self.start(request)
+        if started is None:
+            return await self.get_response(request)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(started)
+        # Off the event loop, the profile is written to disk
+        await sync_to_async(self.capture, thread_sensitive=False)(request, response, started,
+                                                                   time.perf_counter() - start)
+        return response
@@ -0,0 +1,202 @@
+"""Cache of whole GraphQL query responses, invalidated by model writes.
+
+Enable it by pointing the `GRAPHQL_RESPONSE_CACHE` setting to an alias of `CACHES`.
+`ResponseCacheExtension` keys the result of a query by its document hash, operation name,
+variables and user. While the query executes, the tables its SQL reads (and the lookup
+tables it takes from `components.lookups`) are recorded as the models it depends on.
+Every model has a version token in the cache, which the receivers in `components.signals`
+replace on save, delete, m2m changes and batch writes; a stored response is served only
+while the tokens of its models are those it was computed with.
+"""
+import json
+import re
+import threading
+import uuid
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Set, Type
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connections, models as django_models, transaction
+from graphql import ExecutionResult, OperationType, get_operation_ast
+from strawberry.extensions import SchemaExtension
+
+from . import conditional
+from .documents import DocumentCache
+
+_dependencies: ContextVar[Optional[Set[str]]] = ContextVar('response_dependencies', default=None)
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'GRAPHQL_RESPONSE_CACHE', None) is not None
+
+
+def _cache():
+    return caches[settings.GRAPHQL_RESPONSE_CACHE]
+
+
+def tracked_models() -> list:
+    """The models responses depend on: those of this app and the users."""
+    return [*apps.get_app_config('components').get_models(), get_user_model()]
+
+
+@lru_cache(maxsize=None)
+def _tables() -> Dict[str, str]:
+    return {model._meta.db_table: model._meta.label_lower for model in tracked_models()}
+
+
+def _version_key(label: str) -> str:
+    return f'graphql-response:version:{label}'
+
+
+def record(model: Type[django_models.Model]) -> None:
+    """Add `model` to the dependencies of the executing response, if one is recorded."""
+    dependencies = _dependencies.get()
+    if dependencies is not None:
+        dependencies.add(model._meta.label_lower)
+
+
+def record_tables(execute, sql, params, many, context):
+    """Database execute wrapper recording the tables of the queries of a cached response."""
+    dependencies = _dependencies.get()
+    if dependencies is not None:
+        tables = _tables()
+        dependencies.update(tables[word] for word in re.findall(r'\w+', sql) if word in tables)
+    return execute(sql, params, many, context)
+
+
+def install(connection, **kwargs) -> None:
+    """Install `record_tables` on a new connection, connected to `connection_created`."""
+    if record_tables not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_tables)
+
+
+def invalidate(model: Type[django_models.Model], using: Optional[str] = None) -> None:
+    """Drop the cached responses depending on `model`, now and once the transaction commits.
+
+    Writes to a model with concrete parents also change their tables, and writes to a
+    counted model the counters of its component.
+    """
+    if not is_enabled():
+        return
+    from . import counters
+    labels = {model._meta.label_lower, *(parent._meta.label_lower for parent in model._meta.get_parent_list())}
+    if model in counters.COUNTERS:
+        labels.add(counters.counted_model(model)._meta.label_lower)
+
+    def bump():
+        _cache().set_many({_version_key(label): uuid.uuid4().hex for label in labels}, timeout=None)
+
+    bump()
+    # A response computed before the commit read the old rows under the new tokens
+    if connections[using or 'default'].in_atomic_block:
+        transaction.on_commit(bump, using=using)
+
+
+class ResponseCacheStats:
+    """Hits and misses of the response cache in this process."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+response_stats = ResponseCacheStats()
+
+
+def set_etag(context, response_etag: str) -> None:
+    # The GraphQL view answers conditional requests with it, without encoding the data
+    if hasattr(context, 'etag'):
+        context.etag = response_etag
+
+
+def response_key(query: str, operation_name: Optional[str], variables: Optional[Dict[str, Any]], user) -> str:
+    user_key = user.pk if user is not None and user.is_authenticated else 'anonymous'
+    variables = json.dumps(variables or {}, sort_keys=True, default=str)
+    parts = f'{DocumentCache.hash(query)}:{operation_name or ""}:{variables}:{user_key}'
+    return f'graphql-response:{DocumentCache.hash(parts)}'
+
+
+class ResponseCacheExtension(SchemaExtension):
+    """Answer queries from the response cache of `GRAPHQL_RESPONSE_CACHE`, reporting its hit rate."""
+
+    hit: Optional[bool] = None
+
+    def on_execute(self) -> Iterator[None]:
+        execution_context = self.execution_context
+        operation = None
+        if is_enabled() and execution_context.graphql_document is not None and not execution_context.errors:
+            operation = get_operation_ast(execution_context.graphql_document, execution_context.operation_name)
+        if operation is None or operation.operation != OperationType.QUERY:
+            yield
+            return
+
+        cache = _cache()
+        user = getattr(getattr(execution_context.context, 'request', None), 'user', None)
+        key = response_key(execution_context.query, execution_context.operation_name,
+                           execution_context.variables, user)
+        entry = cache.get(key)
+        if entry is not None:
+            versions = cache.get_many([_version_key(label) for label in entry['versions']])
+            # A token that is missing, or was when the entry was stored, may have been evicted since
+            if all(version is not None and versions.get(_version_key(label)) == version
+                   for label, version in entry['versions'].items()):
+                self.hit = True
+                response_stats.count(True)
+                set_etag(execution_context.context, entry['etag'])
+                execution_context.result = ExecutionResult(data=entry['data'])
+                yield
+                return
+
+        self.hit = False
+        response_stats.count(False)
+        # The tokens before execution, a write during it leaves the response outdated
+        version_keys = [_version_key(label) for label in _tables().values()]
+        before = cache.get_many(version_keys)
+        missing = [version_key for version_key in version_keys if version_key not in before]
+        if missing:
+            # Seed the tokens of models not written yet, `add()` keeps one set concurrently
+            for version_key in missing:
+                cache.add(version_key, uuid.uuid4().hex, timeout=None)
+            before.update(cache.get_many(missing))
+        dependencies: Set[str] = set()
+        token = _dependencies.set(dependencies)
+        try:
+            yield
+        finally:
+            _dependencies.reset(token)
+        result = execution_context.result
+        if result is not None and not result.errors and result.data is not None:
+            entry = {
+                'data': result.data,
+                # The response body encodes the data, but not byte for byte the same
+                'etag': conditional.etag(result.data, weak=True),
+                'versions': {label: before.get(_version_key(label)) for label in dependencies},
+            }
+            cache.set(key, entry)
+            set_etag(execution_context.context, entry['etag'])
+
+    def get_results(self) -> Dict[str, Any]:
+        if self.hit is None:
+            return {}
+        return {'responseCache': {'hit': self.hit, 'hitRate': response_stats.stats()['hit_rate']}}
@@ -1,30 +1,65 @@
-from typing import Optional
+from datetime import datetime
+from typing import Iterable, List, Optional
 
 import strawberry
 import strawberry.django
 from strawberry.schema.config import StrawberryConfig
+from strawberry.types.info import Info
 
 from strawberry_django_plus import gql
 from strawberry_django_plus.directives import SchemaDirectiveExtension
-from strawberry_django_plus.optimizer import DjangoOptimizerExtension
 
-from .types import Type, BaseComponent, Component, Link
+from . import changes, models
+from .cost import QueryCostExtension
+from .documents import DocumentCacheExtension
+from .instrumentation import InstrumentationExtension
+from .mutations import Mutation
+from .optimizer import DjangoOptimizerExtension
+from .pagination import KeysetConnection, ListConnection
+from .responses import ResponseCacheExtension
+from .search import search as search_components
+from .types import Type, BaseComponent, Component, ComponentFilter, ComponentTombstone, Link
 
 
 @gql.type
 class Query:
     """All available queries for this schema."""
     node: Optional[gql.Node] = gql.django.node()
+    nodes: List[Optional[gql.Node]] = gql.django.node()
+
+    types: ListConnection[Type] = gql.django.connection()
+    base_components: ListConnection[BaseComponent] = gql.django.connection()
+    links: ListConnection[Link] = gql.django.connection()
+
+    @gql.django.connection(KeysetConnection[Component])
+    def components(self, info: Info, search: Optional[str] = None,
+                   filters: Optional[ComponentFilter] = strawberry.UNSET) -> Iterable[models.Component]:
+        """Components, newest first, or the best matches of the full-text `search` first."""
+        # `filters` is applied to the returned queryset by the connection field
+        queryset = models.Component.objects.all()
+        return search_components(queryset, search) if search else queryset
+
+    @gql.django.connection(KeysetConnection[Component])
+    def components_changed_since(self, info: Info, since: datetime,
+                                 filters: Optional[ComponentFilter] = strawberry.UNSET) -> Iterable[models.Component]:
+        """Components created or changed after `since`, with their relations, oldest change first."""
+        return changes.changed_since(models.Component.objects.all(), since)
+
+    @gql.django.connection(ListConnection[ComponentTombstone])
+    def components_deleted_since(self, info: Info, since: datetime) -> Iterable[models.ComponentTombstone]:
+        """Tombstones of the components deleted after `since`, oldest first."""
+        return changes.deleted_since(since)
 
-    types: gql.django.ListConnectionWithTotalCount[Type] = gql.django.connection()
-    base_components: gql.django.ListConnectionWithTotalCount[BaseComponent] = gql.django.connection()
-    components: gql.django.ListConnectionWithTotalCount[Component] = gql.django.connection()
-    links: gql.django.ListConnectionWithTotalCount[Link] = gql.django.connection()
 
 schema = strawberry.Schema(
     query=Query,
+    mutation=Mutation,
     config=StrawberryConfig(relay_max_results=1000),
     extensions=[
+        InstrumentationExtension,
+        DocumentCacheExtension,
+        ResponseCacheExtension,
+        QueryCostExtension,
         SchemaDirectiveExtension,
         DjangoOptimizerExtension
     ]
@@ -0,0 +1,102 @@
+"""Full-text search over the components with an SQLite FTS5 table.
+
+`components_component_search` holds the `mpn`, `description`, `value` and `remarks` of
+every component under its primary key as `rowid`. The trigram tokenizer matches any
+substring of at least three characters, like the `icontains` lookups it replaces, but
+from the index instead of a scan. The receivers in `components.signals` index saved and
+deleted components and the component manager's `bulk_create`/`bulk_update` their batches;
+`QuerySet.update()` and raw SQL are not seen, the `rebuild_search_index` command rebuilds
+the table.
+"""
+from typing import Iterable, List
+
+from django.db import connection
+from django.db.models import FloatField, Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Component
+from .sqlite import BATCH_SIZE
+
+TABLE = 'components_component_search'
+COLUMNS = ('mpn', 'description', 'value', 'remarks')
+# bm25 weights of the columns, a hit in the part number counts most
+WEIGHTS = (10.0, 2.0, 2.0, 1.0)
+# The annotation ranking the matches, lower is better
+RANK = 'search_rank'
+# Shorter terms have no trigram, they are matched with `icontains`
+MIN_TERM_LENGTH = 3
+
+
+def create_table(using=None, **kwargs) -> None:
+    """Create the search table, connected to `post_migrate`."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5({', '.join(COLUMNS)}, tokenize = 'trigram')"
+        )
+
+
+def index(components: Iterable[Component]) -> None:
+    """Add or replace the search rows of `components`."""
+    rows = [(component.pk, *(getattr(component, column) for column in COLUMNS)) for component in components]
+    if connection.vendor != 'sqlite':
+        return
+    unindex([row[0] for row in rows])
+    placeholders = f"({', '.join(['%s'] * (len(COLUMNS) + 1))})"
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, {', '.join(COLUMNS)}) VALUES {', '.join([placeholders] * len(batch))}",
+                [value for row in batch for value in row],
+            )
+
+
+def unindex(pks: Iterable[int]) -> None:
+    pks = list(pks)
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), BATCH_SIZE):
+            batch = pks[start:start + BATCH_SIZE]
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(batch))})", batch)
+
+
+def rebuild() -> int:
+    """Recreate the search table from the components and return the number of indexed rows."""
+    sql, params = Component.objects.order_by().values_list('pk', *COLUMNS).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        create_table()
+        cursor.execute(f"INSERT INTO {TABLE} (rowid, {', '.join(COLUMNS)}) {sql}", params)
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
+
+
+def match_expression(terms: List[str]) -> str:
+    # Quoted, the terms are matched as strings instead of the FTS5 query syntax
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def search(queryset: QuerySet, text: str) -> QuerySet:
+    """Restrict the components of `queryset` to those matching every term of `text`, annotated with `RANK`."""
+    terms = text.split()
+    indexed = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    if connection.vendor != 'sqlite':
+        indexed = []
+    for term in terms:
+        if term not in indexed:
+            queryset = queryset.filter(Q(*(Q(**{f'{column}__icontains': term}) for column in COLUMNS), _connector=Q.OR))
+    if not indexed:
+        return queryset.annotate(**{RANK: Value(0.0, output_field=FloatField())})
+
+    match = match_expression(indexed)
+    pk = f'{Component._meta.db_table}.{Component._meta.pk.column}'
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', (match,)),
+    ).annotate(**{RANK: RawSQL(
+        f"SELECT bm25({TABLE}, {', '.join(map(str, WEIGHTS))}) FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid = {pk}",
+        (match,), output_field=FloatField(),
+    )})
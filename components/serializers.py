@@ -1,6 +1,26 @@
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Type
+
+from django.db import models
 from rest_framework import serializers
 
-from .models import Component, Review
+from .models import Component, ComponentTombstone, Review, UserModel
+
+
+class TotalCountField(serializers.ReadOnlyField):
+    """Number of related rows, from the `total_count_<relation>` annotation or else the `<relation>_count` column."""
+
+    def __init__(self, relation: str, **kwargs):
+        self.relation = relation
+        self.counter = f'{relation}_count'
+        super().__init__(source='*', **kwargs)
+
+    def to_representation(self, instance) -> int:
+        count = getattr(instance, f'total_count_{self.relation}', None)
+        if count is None:
+            count = getattr(instance, self.counter)
+        return count
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -9,13 +29,160 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
         fields = ['id']
 
+class UserSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = UserModel
+        fields = ['id', 'username', 'first_name', 'last_name']
+
+
+class ComponentTombstoneSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ComponentTombstone
+        fields = ['component_id', 'deleted']
+
+
+@lru_cache(maxsize=None)
+def expanded_serializer(model: Type[models.Model]) -> Type[serializers.ModelSerializer]:
+    """Return the serializer that replaces the primary key of an expanded foreign key to `model`."""
+    if model is UserModel:
+        return UserSerializer
+    meta = type('Meta', (), {'model': model, 'fields': '__all__'})
+    return type(f'{model.__name__}Serializer', (serializers.ModelSerializer,), {'Meta': meta})
+
+
 class ComponentSerializer(serializers.ModelSerializer):
-    total_count_links = serializers.IntegerField()
-    total_count_f_nodes = serializers.IntegerField()
-    total_count_qualifications = serializers.IntegerField()
-    total_count_reviews = serializers.IntegerField()
+    """Component with the counts of its relations.
+
+    `fields` limits the serialized fields and `expand` replaces the primary key of the
+    named foreign keys with the related object; expanded fields are always included.
+    """
+    total_count_links = TotalCountField('links')
+    total_count_f_nodes = TotalCountField('f_nodes')
+    total_count_qualifications = TotalCountField('qualifications')
+    total_count_reviews = TotalCountField('reviews')
     reviews = ReviewSerializer(many=True)
 
     class Meta:
         model = Component
-        fields = '__all__'
+        # Serialized as the `total_count_*` fields above
+        exclude = ['f_nodes_count', 'links_count', 'qualifications_count', 'reviews_count']
+
+    def __init__(self, *args, fields: Optional[Iterable[str]] = None, expand: Iterable[str] = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = set(expand)
+        for name in expand:
+            self.fields[name] = expanded_serializer(Component._meta.get_field(name).related_model)(read_only=True)
+        if fields is not None:
+            for name in set(self.fields) - set(fields) - expand:
+                self.fields.pop(name)
+
+    @classmethod
+    def expandable_fields(cls) -> Iterable[str]:
+        return [field.name for field in Component._meta.get_fields() if field.many_to_one]
+
+
+class ValuesSerializer:
+    """Read-only mode of a `ModelSerializer` that works on `values()` rows.
+
+    The serializer's fields are compiled once into getters reading a row dict, so
+    serializing a page neither instantiates models nor walks the DRF field machinery
+    per value. To-many fields are read with one `values_list()` query each. The output
+    equals `serializer.data` for the same rows, supported are plain fields, primary key
+    related fields, `TotalCountField`, nested model serializers of foreign keys and
+    `many=True` model serializers of reverse foreign keys.
+    """
+
+    def __init__(self, serializer: serializers.ModelSerializer, prefix: str = ''):
+        self.model = serializer.Meta.model
+        self.prefix = prefix
+        self.columns = [f'{prefix}pk']
+        self.relations: Dict[str, Callable[[List[Any]], Dict[Any, List[Any]]]] = {}
+        self.getters = [(name, self.compile(name, field)) for name, field in serializer.fields.items()]
+
+    def column(self, name: str) -> str:
+        column = f'{self.prefix}{name}'
+        if column not in self.columns:
+            self.columns.append(column)
+        return column
+
+    def compile(self, name: str, field: serializers.Field) -> Callable[[dict, dict], Any]:
+        if isinstance(field, TotalCountField):
+            get = itemgetter(self.column(field.counter))
+            return lambda row, related: get(row)
+
+        if isinstance(field, serializers.ModelSerializer):
+            nested = ValuesSerializer(field, prefix=f'{self.prefix}{field.source}__')
+            if nested.relations:
+                raise TypeError(f'Field {name!r} nests to-many fields, which cannot be read from the row.')
+            for column in nested.columns:
+                self.column(column[len(self.prefix):])
+            pk = nested.columns[0]
+            return lambda row, related: None if row[pk] is None else nested.represent(row, related)
+
+        model_field = self.model._meta.get_field(field.source)
+        if isinstance(field, serializers.ListSerializer) and model_field.one_to_many:
+            child = ValuesSerializer(field.child)
+            fk = model_field.field.attname
+            # Grouped by the foreign key, the rows are read from its index without sorting
+            queryset = model_field.related_model._default_manager.order_by(fk, 'pk')
+
+            def load(pks):
+                rows = {}
+                values = list(queryset.filter(**{f'{fk}__in': pks}).values(fk, *child.columns))
+                nested = child.related(values)
+                for value in values:
+                    rows.setdefault(value[fk], []).append(child.represent(value, nested))
+                return rows
+
+            return self.relation(name, load)
+
+        if isinstance(field, serializers.ManyRelatedField):
+            through = model_field.remote_field.through
+            source = through._meta.get_field(model_field.m2m_field_name()).attname
+            target = through._meta.get_field(model_field.m2m_reverse_field_name()).attname
+            # Ordered by `source`, so the rows are read from its index whatever the share of the table
+            # the page is; sorted per row below
+            queryset = through._default_manager.order_by(source).values_list(source, target)
+
+            def load(pks):
+                rows = {}
+                for pk, related_pk in queryset.filter(**{f'{source}__in': pks}):
+                    rows.setdefault(pk, []).append(related_pk)
+                for related_pks in rows.values():
+                    related_pks.sort()
+                return rows
+
+            return self.relation(name, load)
+
+        if isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField)) or (
+                model_field.is_relation and not model_field.many_to_one):
+            raise TypeError(f'Field {name!r} cannot be serialized from values.')
+
+        get = itemgetter(self.column(field.source))
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            return lambda row, related: get(row)
+        convert = field.to_representation
+        return lambda row, related: None if (value := get(row)) is None else convert(value)
+
+    def relation(self, name: str, load: Callable) -> Callable[[dict, dict], Any]:
+        pk = self.columns[0]
+        self.relations[name] = load
+        return lambda row, related: related[name].get(row[pk], [])
+
+    def related(self, rows: List[dict]) -> Dict[str, Dict[Any, List[Any]]]:
+        pks = [row[self.columns[0]] for row in rows]
+        return {name: load(pks) for name, load in self.relations.items()}
+
+    def represent(self, row: dict, related: dict) -> Dict[str, Any]:
+        return {name: get(row, related) for name, get in self.getters}
+
+    def values(self, queryset: models.QuerySet, *columns: str) -> models.QuerySet:
+        """Return the rows of `queryset` as dicts with the compiled and the extra `columns`."""
+        columns = [column for column in columns if column not in self.columns]
+        return queryset.prefetch_related(None).values(*self.columns, *columns)
+
+    def to_representation(self, rows: List[dict]) -> List[Dict[str, Any]]:
+        related = self.related(rows)
+        return [self.represent(row, related) for row in rows]
@@ -0,0 +1,101 @@
+"""Signal receivers keeping derived data in sync with model writes."""
+from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+
+from . import changes, counters, lookups, responses, search
+from .managers import rows_changed
+from .models import BaseComponent, Component
+
+
+def invalidate_lookup(sender, instance, **kwargs) -> None:
+    lookups.invalidate(sender, instance.pk)
+
+
+for lookup_model in lookups.LOOKUP_MODELS:
+    post_save.connect(invalidate_lookup, sender=lookup_model)
+    post_delete.connect(invalidate_lookup, sender=lookup_model)
+
+
+def touch_saved(sender, instance, raw, **kwargs) -> None:
+    if raw or counters.is_suspended(sender):
+        return
+    # Before `count_saved` forgets the component a moved row belonged to
+    changes.touch({getattr(instance, counters.key_attname(sender)), getattr(instance, '_counted_key', None)})
+
+
+def touch_deleted(sender, instance, origin=None, **kwargs) -> None:
+    if counters.is_suspended(sender):
+        return
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if issubclass(origin_model, BaseComponent):
+        return
+    changes.touch([getattr(instance, counters.key_attname(sender))])
+
+
+def remember_counted_key(sender, instance, **kwargs) -> None:
+    # The component counted when loaded, to move the count if the foreign key changes
+    instance._counted_key = instance.__dict__.get(counters.key_attname(sender))
+
+
+def count_saved(sender, instance, created, raw, **kwargs) -> None:
+    if raw or counters.is_suspended(sender):
+        return
+    key = getattr(instance, counters.key_attname(sender))
+    if created:
+        counters.add(sender, {key: 1})
+    elif key != instance._counted_key:
+        counters.add(sender, {instance._counted_key: -1})
+        counters.add(sender, {key: 1})
+    instance._counted_key = key
+
+
+def count_deleted(sender, instance, origin=None, **kwargs) -> None:
+    if counters.is_suspended(sender):
+        return
+    # Rows cascading from a deleted component leave no counter to maintain
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if issubclass(origin_model, BaseComponent):
+        return
+    counters.add(sender, {getattr(instance, counters.key_attname(sender)): -1})
+
+
+for counted_model in counters.COUNTERS:
+    post_init.connect(remember_counted_key, sender=counted_model)
+    post_save.connect(touch_saved, sender=counted_model)
+    post_delete.connect(touch_deleted, sender=counted_model)
+    post_save.connect(count_saved, sender=counted_model)
+    post_delete.connect(count_deleted, sender=counted_model)
+
+
+def index_saved(sender, instance, raw, **kwargs) -> None:
+    if sender is Component and not raw:
+        search.index([instance])
+    else:
+        # The parent row holds the description and value, a fixture loads it separately
+        search.index(Component.objects.filter(pk=instance.pk))
+
+
+def unindex_deleted(sender, instance, **kwargs) -> None:
+    search.unindex([instance.pk])
+
+
+def record_deleted(sender, instance, **kwargs) -> None:
+    changes.record_deleted([instance.pk])
+
+
+post_save.connect(index_saved, sender=Component)
+post_save.connect(index_saved, sender=BaseComponent)
+post_delete.connect(unindex_deleted, sender=Component)
+post_delete.connect(record_deleted, sender=Component)
+
+
+def invalidate_responses(sender, using=None, **kwargs) -> None:
+    responses.invalidate(sender, using=using)
+
+
+for tracked_model in responses.tracked_models():
+    post_save.connect(invalidate_responses, sender=tracked_model)
+    post_delete.connect(invalidate_responses, sender=tracked_model)
+    for field in tracked_model._meta.local_many_to_many:
+        m2m_changed.connect(invalidate_responses, sender=field.remote_field.through)
+rows_changed.connect(invalidate_responses)
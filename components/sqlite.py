@@ -0,0 +1,53 @@
+"""Connection profile of the SQLite database.
+
+`configure_connection` runs on `connection_created` and applies the `SQLITE_PRAGMAS`
+setting to every new SQLite connection, e.g. WAL mode, which lets readers proceed while
+a writer commits, and a larger page cache and memory map for the read heavy listings.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# The supported pragmas, in the order they are applied: `busy_timeout` first, so that
+# switching the journal mode waits for other connections instead of failing
+PRAGMAS = ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store')
+VALUE = re.compile(r'^-?\w+$')
+# Rows or keys per batched statement, within SQLite's limit of query parameters
+BATCH_SIZE = 1000
+
+
+def pragma_statements(pragmas: Dict[str, Any]) -> List[str]:
+    unknown = set(pragmas) - set(PRAGMAS)
+    if unknown:
+        raise ImproperlyConfigured(f"Unsupported SQLITE_PRAGMAS: {', '.join(sorted(unknown))}")
+    statements = []
+    for name in PRAGMAS:
+        if name not in pragmas:
+            continue
+        value = str(pragmas[name])
+        if not VALUE.match(value):
+            raise ImproperlyConfigured(f'Invalid value of SQLITE_PRAGMAS[{name!r}]: {value!r}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def configure_connection(sender=None, connection=None, pragmas: Optional[Dict[str, Any]] = None, **kwargs) -> None:
+    if connection is None or connection.vendor != 'sqlite':
+        return
+    if pragmas is None:
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
+
+
+def current_pragmas(connection) -> Dict[str, Any]:
+    """Read back the values of the supported pragmas on `connection`."""
+    with connection.cursor() as cursor:
+        values = {}
+        for name in PRAGMAS:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
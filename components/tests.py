@@ -1,8 +1,16 @@
 """Test GraphQL Interface for speed and functionality."""
+import io
+import json
+import os
 from time import time
 
 # import numpy as np
-from django.test import TestCase
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from . import models
+from .datasets import create_components
 
 
 query = """
@@ -77,10 +85,21 @@ query = """
 """
 
 
+def node_pk(node: dict) -> str:
+    """Return the primary key of a node from its relay global ID."""
+    from strawberry import relay
+    return relay.GlobalID.from_id(node['id']).node_id
+
+
 class GraphQLSpeedTests(TestCase):
     """Test case that bothers about the speed of GraphQL queries and mutations."""
     # fixtures = ['db.json']
-    
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        if not models.Component.objects.exists():
+            create_components(100)
+
     def test_components_speed(self) -> None:
         """This test evaluates the speed of a common GraphQL query."""
         from .schema import schema
@@ -91,5 +110,1289 @@ class GraphQLSpeedTests(TestCase):
         print(f'Elapsed time for query: {stop - start}s')
 
         self.assertTrue(len(res.data['components']['edges']) == 100)
-        
-   
\ No newline at end of file
+
+    def test_components_total_counts_query_count(self) -> None:
+        """Nested totalCount selections are answered by the parent query."""
+        from .schema import schema
+        with self.assertNumQueries(2):
+            res = schema.execute_sync(query)
+
+        self.assertIsNone(res.errors)
+        node = res.data['components']['edges'][0]['node']
+        self.assertEqual(node['links']['totalCount'], models.OrderedLink.objects.filter(base_component=node_pk(node)).count())
+        self.assertEqual(node['reviews']['totalCount'], models.Review.objects.filter(component=node_pk(node)).count())
+
+    def test_components_total_counts_with_edges(self) -> None:
+        """Counting a nested connection with edges uses the prefetched list."""
+        from .schema import schema
+        with self.assertNumQueries(2):
+            res = schema.execute_sync("""
+            {
+              components(first: 100) {
+                edges { node { links(first: 100) { totalCount edges { node { name } } } reviews { totalCount } } }
+              }
+            }
+            """)
+
+        self.assertIsNone(res.errors)
+        links = res.data['components']['edges'][0]['node']['links']
+        self.assertEqual(links['totalCount'], len(links['edges']))
+
+
+class AsyncGraphQLViewTests(TestCase):
+    """Test case for the async GraphQL view and its DataLoaders."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(10)
+
+    def test_foreign_keys_are_batched(self) -> None:
+        """Foreign keys that are not joined by the optimizer are loaded with one query per model."""
+        executed = []
+
+        def log_query(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(log_query):
+            res = self.client.post('/graphql/', json.dumps({'query': """
+            {
+              components(first: 10) {
+                edges { node { mpn reviews { edges { node { reviewer { username } } } } } }
+              }
+            }
+            """}), content_type='application/json')
+
+        data = res.json()
+        self.assertNotIn('errors', data)
+        self.assertEqual(len(data['data']['components']['edges']), 10)
+        # Components, prefetched reviews and a single batch of reviewers
+        self.assertEqual(len(executed), 3)
+
+
+class DocumentCacheTests(TestCase):
+    """Test case for the document cache and persisted queries."""
+
+    def setUp(self) -> None:
+        from .documents import document_cache
+        document_cache.clear()
+
+    def post(self, payload: dict) -> dict:
+        return self.client.post('/graphql/', json.dumps(payload), content_type='application/json').json()
+
+    def test_document_is_parsed_once(self) -> None:
+        """Repeated executions of the same document hit the cache."""
+        from .documents import document_cache
+        from .schema import schema
+        schema.execute_sync(query)
+        schema.execute_sync(query)
+
+        stats = document_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+    def test_persisted_query(self) -> None:
+        """Unknown hashes are reported, registered hashes replace the query text."""
+        from .documents import DocumentCache
+        document = '{ types(first: 1) { totalCount } }'
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': DocumentCache.hash(document)}}
+
+        data = self.post({'extensions': extensions})
+        self.assertEqual(data['errors'][0]['message'], 'PersistedQueryNotFound')
+        self.assertEqual(data['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+
+        data = self.post({'query': document, 'extensions': extensions})
+        self.assertEqual(data['data'], {'types': {'totalCount': 0}})
+
+        data = self.post({'extensions': extensions})
+        self.assertEqual(data['data'], {'types': {'totalCount': 0}})
+
+    def test_persisted_query_hash_mismatch(self) -> None:
+        """A query that does not match its hash is rejected."""
+        data = self.post({'query': '{ types { totalCount } }', 'extensions': {'persistedQuery': {'sha256Hash': 'abc'}}})
+        self.assertEqual(data['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_HASH_MISMATCH')
+
+    def test_malformed_extensions(self) -> None:
+        """Extensions that are not JSON objects are rejected with a 400."""
+        query = '{ types { totalCount } }'
+        for extensions in ([1], {'persistedQuery': 'x'}):
+            res = self.client.post('/graphql/', json.dumps({'query': query, 'extensions': extensions}),
+                                   content_type='application/json')
+            self.assertEqual(res.status_code, 400)
+        for extensions in ('[1]', '{"persistedQuery": "x"}', '{'):
+            res = self.client.get('/graphql/', {'query': query, 'extensions': extensions})
+            self.assertEqual(res.status_code, 400)
+
+
+@override_settings(LOOKUP_CACHE='lookups')
+class LookupCacheTests(TestCase):
+    """Test case for resolving lookup tables from the lookup cache."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(10)
+
+    def setUp(self) -> None:
+        caches['lookups'].clear()
+
+    def test_lookups_are_not_joined(self) -> None:
+        """Lookup relations are read from the cache once it is warm."""
+        from .schema import schema
+        schema.execute_sync(query)
+
+        with self.assertNumQueries(2):
+            res = schema.execute_sync(query)
+
+        self.assertIsNone(res.errors)
+        node = res.data['components']['edges'][0]['node']
+        self.assertEqual(node['type']['name'], 'Resistor')
+        self.assertEqual(node['manufacturer']['name'], 'ACME')
+
+    def test_save_invalidates_entry(self) -> None:
+        """Saving a lookup row replaces its cached instance."""
+        from . import lookups
+        type_ = models.Type.objects.get()
+        self.assertEqual(lookups.get(models.Type, type_.pk).name, 'Resistor')
+
+        type_.name = 'Capacitor'
+        type_.save()
+
+        self.assertEqual(lookups.get(models.Type, type_.pk).name, 'Capacitor')
+
+    def test_rest_listing_does_not_join_lookups(self) -> None:
+        """The REST listing leaves the lookup tables out of its query."""
+        res = self.client.get('/api-auth/components/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['results'][0]['type'], models.Type.objects.get().pk)
+
+        from .views import ComponentViewSet
+        sql = str(ComponentViewSet().get_queryset().query)
+        self.assertNotIn('components_type', sql)
+        self.assertNotIn('components_company', sql)
+
+
+@override_settings(GRAPHQL_RESPONSE_CACHE='responses')
+class ResponseCacheTests(TestCase):
+    """Test case for the whole-response cache and its invalidation."""
+    QUERY = '{ components(first: 5) { edges { node { mpn links { edges { node { name } } } } } } }'
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(5)
+
+    def setUp(self) -> None:
+        from .responses import response_stats
+        caches['responses'].clear()
+        response_stats.clear()
+
+    def execute(self, document: str = QUERY):
+        from .schema import schema
+        res = schema.execute_sync(document)
+        self.assertIsNone(res.errors)
+        return res
+
+    def test_repeated_query_is_served_from_cache(self) -> None:
+        """The same query is answered without a database query and reports the hit rate."""
+        first = self.execute()
+        with self.assertNumQueries(0):
+            second = self.execute()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.extensions['responseCache'], {'hit': True, 'hitRate': 0.5})
+        self.assertEqual(first.extensions['responseCache']['hit'], False)
+
+    def test_async_view(self) -> None:
+        """The tables are recorded from the worker threads of the async view as well."""
+        def post():
+            return self.client.post('/graphql/', json.dumps({'query': self.QUERY}), content_type='application/json').json()
+
+        post()
+        self.assertTrue(post()['extensions']['responseCache']['hit'])
+        models.Link.objects.get(name='Link 0').save()
+        self.assertFalse(post()['extensions']['responseCache']['hit'])
+
+    def test_writes_invalidate_dependent_responses(self) -> None:
+        """Saves of the models a response read invalidate it, other writes do not."""
+        self.execute()
+        models.Type.objects.create(name='Capacitor')
+        self.assertTrue(self.execute().extensions['responseCache']['hit'])
+
+        models.Link.objects.filter(name='Link 0').update(name='Datasheet')
+        self.assertTrue(self.execute().extensions['responseCache']['hit'])
+        link = models.Link.objects.get(name='Datasheet')
+        link.save()
+        res = self.execute()
+        self.assertFalse(res.extensions['responseCache']['hit'])
+        self.assertEqual(res.data['components']['edges'][0]['node']['links']['edges'][0]['node']['name'], 'Datasheet')
+
+    def test_batch_writes_invalidate_responses(self) -> None:
+        """`bulk_update()` and the reorders invalidate the responses reading their model."""
+        self.execute()
+        component = models.Component.objects.order_by('-created', '-pk').first()
+        component.mpn = 'NE555'
+        models.Component.objects.bulk_update([component], ['mpn'])
+        res = self.execute()
+        self.assertFalse(res.extensions['responseCache']['hit'])
+        self.assertEqual(res.data['components']['edges'][0]['node']['mpn'], 'NE555')
+
+        links = list(models.Link.objects.order_by('-name').values_list('pk', flat=True))
+        models.OrderedLink.objects.reorder({component.pk: links}, by='link')
+        res = self.execute()
+        self.assertFalse(res.extensions['responseCache']['hit'])
+        self.assertEqual(res.data['components']['edges'][0]['node']['links']['edges'][0]['node']['name'], 'Link 2')
+
+    def test_evicted_versions_are_misses(self) -> None:
+        """A response is not served once the token of a model it read was evicted, even if it was unset before."""
+        from .responses import _version_key
+        self.execute()
+        component = models.Component.objects.order_by('-created', '-pk').first()
+        component.mpn = 'CHANGED'
+        component.save()
+        caches['responses'].delete_many([_version_key('components.component'), _version_key('components.basecomponent')])
+        res = self.execute()
+        self.assertFalse(res.extensions['responseCache']['hit'])
+        self.assertEqual(res.data['components']['edges'][0]['node']['mpn'], 'CHANGED')
+        self.assertTrue(self.execute().extensions['responseCache']['hit'])
+
+    def test_mutations_are_not_cached(self) -> None:
+        """Mutations are not cached and later queries see their writes; nothing is cached without the setting."""
+        from types import SimpleNamespace
+        from strawberry import relay
+        from .responses import response_key
+        from .schema import schema
+        user = models.UserModel.objects.get(username='tester')
+        component = models.Component.objects.order_by('-created', '-pk').first()
+        self.execute()
+        mutation = 'mutation ($input: [ComponentInput!]!) { saveComponents(input: $input) { mpn } }'
+        variables = {'input': [{'id': str(relay.GlobalID('Component', str(component.pk))), 'mpn': 'SAVED'}]}
+        res = schema.execute_sync(mutation, variable_values=variables,
+                                  context_value=SimpleNamespace(request=SimpleNamespace(user=user)))
+        self.assertIsNone(res.errors)
+        self.assertEqual(res.data['saveComponents'], [{'mpn': 'SAVED'}])
+        self.assertNotIn('responseCache', res.extensions or {})
+        self.assertIsNone(caches['responses'].get(response_key(mutation, None, variables, user)))
+        res = self.execute()
+        self.assertFalse(res.extensions['responseCache']['hit'])
+        self.assertEqual(res.data['components']['edges'][0]['node']['mpn'], 'SAVED')
+        with override_settings(GRAPHQL_RESPONSE_CACHE=None):
+            self.assertNotIn('responseCache', self.execute().extensions or {})
+
+
+class BenchTests(TestCase):
+    RESULT = {'api': 'rest', 'page_size': 10, 'depth': 0, 'mode': 'warm', 'p95_ms': 10.0, 'queries': 3}
+
+    def test_percentile(self) -> None:
+        """Percentiles are nearest-rank, whatever the order of the values."""
+        from .management.commands.bench import percentile
+        values = [5, 1, 4, 2, 3, 10, 9, 8, 7, 6]
+        self.assertEqual(percentile(values, 50), 5)
+        self.assertEqual(percentile(values, 95), 10)
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile([42], 99), 42)
+
+    def test_compare(self) -> None:
+        """A slower p95 beyond the tolerance or more queries than the baseline are regressions."""
+        import tempfile
+
+        from django.core.management.base import CommandError
+
+        from .management.commands.bench import Command
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'results': [self.RESULT]}, f)
+        self.addCleanup(os.remove, f.name)
+
+        command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+        command.compare([{**self.RESULT, 'p95_ms': 12.0}], f.name, 0.25)
+        command.compare([{**self.RESULT, 'page_size': 100, 'p95_ms': 100.0}], f.name, 0.25)
+        with self.assertRaisesRegex(CommandError, 'p95 10.00ms -> 13.00ms'):
+            command.compare([{**self.RESULT, 'p95_ms': 13.0}], f.name, 0.25)
+        with self.assertRaisesRegex(CommandError, 'queries 3 -> 4'):
+            command.compare([{**self.RESULT, 'queries': 4}], f.name, 0.25)
+
+
+class SeedTests(TestCase):
+    def test_generate_fills_save_defaults(self) -> None:
+        """Bulk created rows carry the timestamps and orders `save()` would set."""
+        from django.db.models import Count, Max
+
+        from .datasets import generate
+        generate(30, users=5, max_relations=4)
+
+        self.assertEqual(models.Component.objects.count(), 30)
+        for component in models.Component.objects.all():
+            self.assertLessEqual(component.created, component.last_modified)
+        self.assertFalse(models.Review.objects.filter(date__isnull=True).exists())
+        for model in (models.OrderedLink, models.OrderedFNode):
+            orders = model.objects.values('base_component').annotate(count=Count('id'), max=Max('order'))
+            for row in orders:
+                self.assertEqual(row['max'], row['count'] - 1)
+
+
+class KeysetPaginationTests(TestCase):
+    page = """
+    query ($first: Int, $after: String, $last: Int, $before: String) {
+      components(first: $first, after: $after, last: $last, before: $before) {
+        pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+        edges { node { id } }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        # All components share one `created`, so the pages are told apart by id
+        create_components(25, relations=0)
+
+    def fetch(self, **variables):
+        from .schema import schema
+        res = schema.execute_sync(self.page, variable_values=variables)
+        self.assertIsNone(res.errors)
+        return res.data['components']
+
+    def test_forward_and_backward_paging(self) -> None:
+        """Paging forward visits every component once, paging back returns the same pages."""
+        expected = [str(pk) for pk in models.Component.objects.order_by('-created', '-id').values_list('pk', flat=True)]
+        pages, after = [], None
+        while True:
+            data = self.fetch(first=10, after=after)
+            pages.append([node_pk(edge['node']) for edge in data['edges']])
+            if not data['pageInfo']['hasNextPage']:
+                break
+            after = data['pageInfo']['endCursor']
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), expected)
+
+        data = self.fetch(last=10, before=self.fetch(first=20)['pageInfo']['endCursor'])
+        self.assertEqual([node_pk(edge['node']) for edge in data['edges']], pages[0][9:] + pages[1][:9])
+        self.assertTrue(data['pageInfo']['hasPreviousPage'])
+        self.assertTrue(data['pageInfo']['hasNextPage'])
+
+    def test_seeks_without_offset(self) -> None:
+        """Deep pages are selected with a WHERE clause instead of OFFSET."""
+        after = self.fetch(first=20)['pageInfo']['endCursor']
+        with self.assertNumQueries(1) as queries:
+            self.fetch(first=5, after=after)
+        self.assertNotIn('OFFSET', queries.captured_queries[0]['sql'])
+
+
+class RestTotalCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(3, relations=4)
+
+    def test_counts_without_joins(self) -> None:
+        """The REST listing reads the counter columns instead of counting the relations."""
+        from .views import ComponentViewSet
+        sql = str(ComponentViewSet().get_queryset().query)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('components_review', sql)
+
+        res = self.client.get('/api-auth/components/')
+        self.assertEqual(res.status_code, 200)
+        for component in res.json()['results']:
+            self.assertEqual(component['total_count_links'], 4)
+            self.assertEqual(component['total_count_f_nodes'], 4)
+            self.assertEqual(component['total_count_qualifications'], 4)
+            self.assertEqual(component['total_count_reviews'], 4)
+
+    def test_bench_counts_strategies(self) -> None:
+        """Every counting strategy of `bench_counts` serves the listing's page, in the same order."""
+        from django.test import RequestFactory
+
+        from .management.commands.bench_counts import StrategyView, strategies
+        outputs = {}
+        for name, queryset in strategies().items():
+            response = StrategyView.as_view(queryset=queryset)(RequestFactory().get('/api-auth/components/'))
+            outputs[name] = response.render().data['results']
+        self.assertEqual(len(outputs['counters']), 3)
+        for output in outputs.values():
+            self.assertEqual(output, outputs['counters'])
+        self.assertEqual(outputs['counters'], self.client.get('/api-auth/components/').json()['results'])
+
+
+class ConditionalGetTests(TestCase):
+    QUERY = '{ components(first: 2) { edges { node { mpn } } } }'
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(5)
+
+    def test_rest_listing(self) -> None:
+        """A page whose validator matches is answered with one query, edits within it change the ETag."""
+        url = '/api-auth/components/?page_size=2&fields=id,mpn'
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        # The newest `last_modified` of a page can stay the same when a deletion shifts it
+        self.assertNotIn('Last-Modified', res)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+        # Another field set is another representation
+        self.assertEqual(self.client.get('/api-auth/components/?page_size=2',
+                                         HTTP_IF_NONE_MATCH=res['ETag']).status_code, 200)
+
+        models.Component.objects.order_by('-created', '-pk').last().delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag']).status_code, 304)
+        models.Component.objects.order_by('-created', '-pk').first().delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag']).status_code, 200)
+
+    def test_rest_listing_expand(self) -> None:
+        """Edits of the expanded rows of a page change its ETag."""
+        url = '/api-auth/components/?page_size=2&fields=id&expand=manufacturer'
+        res = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag']).status_code, 304)
+        manufacturer = models.Component.objects.order_by('-created', '-pk').first().manufacturer
+        manufacturer.name = 'Renamed'
+        manufacturer.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['results'][0]['manufacturer']['name'], 'Renamed')
+
+    def test_graphql_get(self) -> None:
+        """GET queries carry an ETag of their data, answered from the response cache without a query."""
+        from django.test.utils import CaptureQueriesContext
+        res = self.client.get('/graphql/', {'query': self.QUERY})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['ETag'].startswith('W/'))
+        # Without the response cache, the query runs before its data is compared
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get('/graphql/', {'query': self.QUERY}, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+        self.assertTrue(queries.captured_queries)
+
+        caches['responses'].clear()
+        with override_settings(GRAPHQL_RESPONSE_CACHE='responses'):
+            res = self.client.get('/graphql/', {'query': self.QUERY})
+            with self.assertNumQueries(0):
+                res = self.client.get('/graphql/', {'query': self.QUERY}, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+
+        self.assertNotIn('ETag', self.client.post('/graphql/', json.dumps({'query': self.QUERY}),
+                                                  content_type='application/json'))
+
+
+class InstrumentationTests(TestCase):
+    QUERY = '{ components(first: 3) { edges { node { mpn manufacturer { name } } } } }'
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(3)
+
+    def test_unsampled(self) -> None:
+        """Requests that are not sampled get neither a report nor a header."""
+        from .schema import schema
+        res = schema.execute_sync(self.QUERY)
+        self.assertNotIn('instrumentation', res.extensions or {})
+        self.assertNotIn('Server-Timing', self.client.get('/api-auth/components/'))
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0)
+    def test_graphql_report(self) -> None:
+        """Sampled operations report their queries and resolver timings."""
+        res = self.client.post('/graphql/', json.dumps({'query': self.QUERY}), content_type='application/json')
+        self.assertIn('sql;dur=', res['Server-Timing'])
+        report = res.json()['extensions']['instrumentation']
+        self.assertGreater(report['sql']['count'], 0)
+        paths = {resolver['path']: resolver['count'] for resolver in report['resolvers']}
+        self.assertEqual(paths['components.edges.node.mpn'], 3)
+        self.assertEqual(report['nPlusOne'], [])
+
+        res = self.client.get('/api-auth/components/')
+        self.assertRegex(res['Server-Timing'], r'sql;dur=[\d.]+;desc="\d+ queries", app;dur=')
+
+    def test_n_plus_one(self) -> None:
+        """The same query repeated under one field is reported with the field."""
+        from .instrumentation import N_PLUS_ONE_THRESHOLD, Recorder, _field, _recorder
+        recorder = Recorder()
+        token = _recorder.set(recorder)
+        field = _field.set('components.edges.node.creator')
+        try:
+            for component in models.Component.objects.all()[:1]:
+                for _ in range(N_PLUS_ONE_THRESHOLD):
+                    models.Component.objects.get(pk=component.pk)
+        finally:
+            _field.reset(field)
+            _recorder.reset(token)
+        (pattern,) = recorder.report()['nPlusOne']
+        self.assertEqual(pattern['field'], 'components.edges.node.creator')
+        self.assertEqual(pattern['count'], N_PLUS_ONE_THRESHOLD)
+        self.assertIn('n-plus-one;desc="patterns: 1"', recorder.server_timing())
+
+
+class ProfilingTests(TestCase):
+    URL = '/api-auth/components/'
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(10)
+
+    def setUp(self) -> None:
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.settings = override_settings(PROFILING_DIR=self.directory.name, PROFILING_INTERVAL=0.001)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def profiles(self) -> list:
+        from pathlib import Path
+        return sorted(Path(self.directory.name).glob('*.prof'))
+
+    def test_capture(self) -> None:
+        """Sampled requests leave a pstats profile and a summary, the oldest beyond the limit are dropped."""
+        import pstats
+
+        from django.core.management import call_command
+        with override_settings(PROFILING_EVERY=1, PROFILING_MAX_FILES=2):
+            for _ in range(3):
+                self.assertEqual(self.client.get(self.URL).status_code, 200)
+            self.client.get('/admin/login/')
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual(len(list(profiles[0].parent.glob('*.json'))), 2)
+        pstats.Stats(str(profiles[0]))
+        with open(profiles[0].with_suffix('.json')) as f:
+            summary = json.load(f)
+        self.assertEqual(summary['path'], self.URL)
+        self.assertEqual(summary['reason'], 'sampled')
+        self.assertGreater(summary['instrumentation']['sql']['count'], 0)
+        self.assertTrue(summary['queries'])
+        # The request's duration, which also names the profile
+        self.assertEqual(f"-{int(summary['duration'])}ms", profiles[0].stem[profiles[0].stem.rindex('-'):])
+
+        out = io.StringIO()
+        call_command('aggregate_profiles', dir=self.directory.name, stdout=out)
+        self.assertIn(f'{self.URL}: 2 requests (0 slow)', out.getvalue())
+
+    def test_slow_requests(self) -> None:
+        """Only the requests over the latency threshold are captured, with the stacks of their threads."""
+        import sys
+
+        from .instrumentation import Recorder
+        from .profiling import Capture
+        with override_settings(PROFILING_SLOW_MS=10 ** 6):
+            self.client.get(self.URL)
+        self.assertEqual(self.profiles(), [])
+
+        capture = Capture(Recorder())
+        capture.sample(sys._current_frames())
+        stats = capture.stats(0.001)
+        code = self.test_slow_requests.__code__
+        self.assertIn((code.co_filename, code.co_firstlineno, code.co_name), stats)
+
+        with override_settings(PROFILING_SLOW_MS=0):
+            self.client.post('/graphql/', json.dumps({'query': '{ components(first: 2) { edges { node { mpn } } } }'}),
+                             content_type='application/json')
+        (profile,) = self.profiles()
+        with open(profile.with_suffix('.json')) as f:
+            self.assertEqual(json.load(f)['reason'], 'slow')
+
+    def test_removed_captures_are_not_sampled(self) -> None:
+        """Once removed from the sampler, a capture's stacks no longer change while it is saved."""
+        import time
+
+        from .instrumentation import Recorder
+        from .profiling import Capture, sampler
+        capture = Capture(Recorder())
+        sampler.add(capture)
+        while not capture.stacks:
+            time.sleep(0.001)
+        sampler.remove(capture)
+        stacks = dict(capture.stacks)
+        time.sleep(0.02)
+        self.assertEqual(capture.stacks, stacks)
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(2, relations=2)
+
+    def assertCounts(self, component: models.Component, links: int, reviews: int) -> None:
+        component.refresh_from_db()
+        self.assertEqual(component.links_count, links)
+        self.assertEqual(component.reviews_count, reviews)
+
+    def test_writes_keep_counters(self) -> None:
+        """Saves, deletes, bulk creates and queryset deletes of the through models are counted."""
+        component, other = models.Component.objects.order_by('pk')
+        self.assertCounts(component, 2, 2)
+
+        review = models.Review.objects.create(component=component, reviewer=component.creator)
+        self.assertCounts(component, 2, 3)
+        review.component = other
+        review.save()
+        self.assertCounts(component, 2, 2)
+        self.assertCounts(other, 2, 3)
+        review.delete()
+        self.assertCounts(other, 2, 2)
+
+        models.Review.objects.bulk_create([
+            models.Review(component=component, reviewer=component.creator, date=component.created) for _ in range(3)
+        ])
+        self.assertCounts(component, 2, 5)
+        models.OrderedLink.objects.create(base_component=component, link=models.Link.objects.first())
+        self.assertCounts(component, 3, 5)
+        link = models.Link.objects.first()
+        with self.assertNumQueries(3):
+            models.OrderedLink.objects.bulk_create([
+                models.OrderedLink(base_component=component, link=link, order=order) for order in (7, 8)
+            ], keep_orders=True)
+        self.assertCounts(component, 5, 5)
+        orders = models.OrderedLink.objects.filter(base_component=component).values_list('order', flat=True)
+        self.assertEqual(list(orders.order_by('-order')[:2]), [8, 7])
+
+        models.Review.objects.filter(component=component).delete()
+        models.OrderedLink.objects.filter(base_component=component).delete()
+        self.assertCounts(component, 0, 0)
+        self.assertCounts(other, 2, 2)
+
+        # Saving a stale instance keeps the counters
+        other.links_count = 100
+        other.save()
+        self.assertCounts(other, 2, 2)
+
+    def test_recount_repairs_drift(self) -> None:
+        from . import counters
+        component = models.Component.objects.order_by('pk').first()
+        models.Component.objects.filter(pk=component.pk).update(reviews_count=7)
+        self.assertEqual(counters.recount(models.Review), 1)
+        self.assertEqual(counters.recount(models.Review), 0)
+        self.assertCounts(component, 2, 2)
+
+    def test_graphql_reads_counters(self) -> None:
+        """Nested totalCount selections are read from the counter columns."""
+        from .schema import schema
+        models.Component.objects.update(reviews_count=5)
+        with self.assertNumQueries(1) as queries:
+            res = schema.execute_sync('{ components(first: 10) { edges { node { reviews { totalCount } } } } }')
+        self.assertIsNone(res.errors)
+        self.assertEqual({edge['node']['reviews']['totalCount'] for edge in res.data['components']['edges']}, {5})
+        self.assertNotIn('components_review', ''.join(query['sql'] for query in queries.captured_queries))
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(30)
+
+    def test_listing_plans_use_indexes(self) -> None:
+        """The queries of the REST listing neither scan whole tables nor sort outside of an index."""
+        from .management.commands.explain_hot_queries import QueryCollector, explain, plan_problems
+        collector = QueryCollector()
+        with connection.execute_wrapper(collector):
+            self.assertEqual(self.client.get('/api-auth/components/', {'page_size': 10}).status_code, 200)
+        self.assertTrue(collector.queries)
+        for sql, params in collector.queries:
+            self.assertEqual(plan_problems(explain(sql, params)), [], sql)
+
+    def test_plans_do_not_depend_on_dataset_size(self) -> None:
+        """With the statistics scaled, a page that is a third of the tables is still read through indexes."""
+        from .management.commands.explain_hot_queries import explain, hot_queries, plan_problems, scale_statistics
+        scale_statistics(30)
+        for name, queries in hot_queries():
+            for sql, params in queries:
+                self.assertEqual(plan_problems(explain(sql, params)), [], f'{name}: {sql}')
+
+
+class SQLiteProfileTests(TestCase):
+    def test_connection_profile(self) -> None:
+        """New connections get the pragmas of the `SQLITE_PRAGMAS` setting."""
+        from django.conf import settings
+        from .sqlite import current_pragmas
+        pragmas = current_pragmas(connection)
+        self.assertEqual(pragmas['journal_mode'], settings.SQLITE_PRAGMAS['journal_mode'])
+        self.assertEqual(pragmas['cache_size'], settings.SQLITE_PRAGMAS['cache_size'])
+        self.assertEqual(pragmas['busy_timeout'], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_invalid_pragmas(self) -> None:
+        from django.core.exceptions import ImproperlyConfigured
+        from .sqlite import configure_connection
+        with self.assertRaises(ImproperlyConfigured):
+            configure_connection(connection=connection, pragmas={'foreign_keys': 0})
+        with self.assertRaises(ImproperlyConfigured):
+            configure_connection(connection=connection, pragmas={'cache_size': '1; DROP TABLE x'})
+
+
+class NodesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(50)
+
+    def test_private_optimizer_api(self) -> None:
+        """The private API of strawberry-django-plus behind the optimizer adapters is still there."""
+        import inspect
+
+        from strawberry_django_plus import optimizer
+
+        from .optimizer import DjangoOptimizerExtension
+        parameters = inspect.signature(optimizer._get_model_hints).parameters
+        self.assertEqual(list(parameters)[:4], ['model', 'schema', 'type_def', 'selection'])
+        self.assertTrue({'info', 'config'} <= set(parameters))
+        extension = DjangoOptimizerExtension()
+        for name in ('_enable_ony', '_enable_select_related', '_enable_prefetch_related', '_prefetch_custom_queryset'):
+            self.assertTrue(hasattr(extension, name), name)
+
+    def test_nodes_batched_in_input_order(self) -> None:
+        """`nodes` loads each type with one query and returns the nodes in the order of the IDs."""
+        from strawberry import relay
+        from .schema import schema
+        ids = [str(relay.GlobalID('Component', str(pk))) for pk in models.Component.objects.values_list('pk', flat=True)]
+        ids += [str(relay.GlobalID('Link', str(pk))) for pk in models.Link.objects.values_list('pk', flat=True)]
+        ids.reverse()
+        ids.insert(3, str(relay.GlobalID('Component', '0')))
+        with self.assertNumQueries(3):
+            res = schema.execute_sync("""
+            query ($ids: [GlobalID!]!) {
+              nodes(ids: $ids) {
+                id
+                ... on Component {
+                  mpn manufacturer { name } reviews { totalCount } links(first: 10) { edges { node { name } } }
+                }
+                ... on Link { url }
+              }
+            }
+            """, variable_values={'ids': ids})
+
+        self.assertIsNone(res.errors)
+        nodes = res.data['nodes']
+        self.assertIsNone(nodes[3])
+        self.assertEqual([node and node['id'] for node in nodes], [None if i == 3 else id for i, id in enumerate(ids)])
+        component = next(node for node in nodes if node and 'mpn' in node)
+        self.assertEqual(component['reviews']['totalCount'], 3)
+        self.assertEqual(len(component['links']['edges']), 3)
+
+
+class QueryCostTests(TestCase):
+    QUERY = '{ components(first: 5) { edges { node { id links { edges { node { id } } } } } } }'
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(10)
+
+    def test_cost_reported(self) -> None:
+        """The estimate multiplies the nested page sizes, the actual cost counts the returned nodes."""
+        from .schema import schema
+        res = schema.execute_sync('{ components(first: 5) { edges { node { id links(first: 2) { edges { node { id } } } } } } }')
+        self.assertIsNone(res.errors)
+        self.assertEqual(res.extensions['cost'], {'estimated': 5 + 5 * 2, 'actual': 5 + 5 * 2, 'budget': 50_000})
+
+    @override_settings(GRAPHQL_QUERY_COST_LIMIT=12, GRAPHQL_QUERY_COST_POLICY='clamp')
+    def test_clamp_nested_pages(self) -> None:
+        """Over the budget, the nested connections get the largest page size that fits."""
+        from .schema import schema
+        res = schema.execute_sync(self.QUERY)
+        self.assertIsNone(res.errors)
+        self.assertEqual(len(res.data['components']['edges']), 5)
+        self.assertTrue(all(len(edge['node']['links']['edges']) == 1 for edge in res.data['components']['edges']))
+        cost = res.extensions['cost']
+        self.assertEqual((cost['clampedPageSize'], cost['clampedFromDepth']), (1, 1))
+        self.assertEqual((cost['estimated'], cost['actual'], cost['requested']), (10, 10, 5 + 5 * 1000))
+
+    @override_settings(GRAPHQL_QUERY_COST_LIMIT=12, GRAPHQL_QUERY_COST_POLICY='clamp')
+    def test_clamp_limits_prefetches(self) -> None:
+        """The nested rows past a clamped page, and the one telling there is a next page, are not read."""
+        from .schema import schema
+        query = """{ components(first: 5) { edges { node {
+          links { pageInfo { hasNextPage } edges { node { id } } }
+          reviews { totalCount edges { node { id } } }
+        } } } }"""
+        executed = []
+
+        def log_query(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(log_query):
+            res = schema.execute_sync(query)
+        self.assertIsNone(res.errors)
+        size = res.extensions['cost']['clampedPageSize']
+        for edge in res.data['components']['edges']:
+            self.assertEqual(len(edge['node']['links']['edges']), size)
+            self.assertTrue(edge['node']['links']['pageInfo']['hasNextPage'])
+            # Counted from the prefetched list, which is read whole
+            self.assertEqual(edge['node']['reviews']['totalCount'], 3)
+        links, = [sql for sql in executed if 'FROM "components_link"' in sql]
+        reviews, = [sql for sql in executed if 'FROM "components_review"' in sql]
+        self.assertIn('ROW_NUMBER()', links)
+        self.assertNotIn('ROW_NUMBER()', reviews)
+
+    @override_settings(GRAPHQL_QUERY_COST_LIMIT=12)
+    def test_reject(self) -> None:
+        """The default `reject` policy fails an operation over the budget without querying the database."""
+        from django.conf import settings
+
+        from .schema import schema
+        del settings.GRAPHQL_QUERY_COST_POLICY
+        with self.assertNumQueries(0):
+            res = schema.execute_sync(self.QUERY)
+        self.assertIsNone(res.data)
+        self.assertEqual(res.errors[0].extensions['code'], 'QUERY_COST_EXCEEDED')
+
+
+class SearchTests(TestCase):
+    QUERY = 'query ($search: String) { components(search: $search) { edges { node { mpn } } } }'
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(5)
+        first, second, third = models.Component.objects.order_by('pk')[:3]
+        first.remarks = 'replaces the LM317T'
+        first.save()
+        second.mpn = 'LM317T'
+        second.save()
+        third.description = 'Adjustable regulator'
+        third.save()
+
+    def test_ranked_matches(self) -> None:
+        """GraphQL and REST return the matches of every term, part numbers first."""
+        from .schema import schema
+        res = schema.execute_sync(self.QUERY, variable_values={'search': 'lm317'})
+        self.assertIsNone(res.errors)
+        self.assertEqual([edge['node']['mpn'] for edge in res.data['components']['edges']], ['LM317T', 'MPN-0'])
+
+        res = self.client.get('/api-auth/components/', {'search': 'regulator adj', 'fields': 'id,mpn'})
+        self.assertEqual([row['mpn'] for row in res.json()['results']], ['MPN-2'])
+        # Terms without a trigram are matched by substring, unranked
+        res = self.client.get('/api-auth/components/', {'search': '17 LM', 'fields': 'id,mpn'})
+        self.assertEqual({row['mpn'] for row in res.json()['results']}, {'LM317T', 'MPN-0'})
+
+    def test_index_follows_writes(self) -> None:
+        """Saves and deletes are indexed, `rebuild_search_index` repairs bulk updates."""
+        from django.core.management import call_command
+        from .schema import schema
+
+        def search(text):
+            res = schema.execute_sync(self.QUERY, variable_values={'search': text})
+            return [edge['node']['mpn'] for edge in res.data['components']['edges']]
+
+        models.Component.objects.get(mpn='LM317T').delete()
+        self.assertEqual(search('lm317'), ['MPN-0'])
+        models.Component.objects.filter(mpn='MPN-4').update(mpn='NE555')
+        self.assertEqual(search('ne555'), [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(search('ne555'), ['NE555'])
+
+
+class BulkMutationTests(TestCase):
+    MUTATION = """
+    mutation ($input: [ComponentInput!]!) {
+      saveComponents(input: $input) { mpn stock created lastModified links { totalCount edges { node { name } } } }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        from strawberry import relay
+        create_components(2)
+        cls.user = models.UserModel.objects.get(username='tester')
+        cls.refs = {
+            name: str(relay.GlobalID(model.__name__, str(model.objects.get().pk)))
+            for name, model in [('type', models.Type), ('library', models.Library), ('manufacturer', models.Company),
+                                ('lifecycleState', models.LifecycleState), ('mounting', models.MountingType)]
+        }
+        cls.links = [str(relay.GlobalID('Link', str(link.pk))) for link in models.Link.objects.order_by('pk')]
+
+    def save(self, components: list) -> dict:
+        from types import SimpleNamespace
+        from .schema import schema
+        context = SimpleNamespace(request=SimpleNamespace(user=self.user))
+        return schema.execute_sync(self.MUTATION, variable_values={'input': components}, context_value=context)
+
+    def test_create_and_update(self) -> None:
+        """New components are stamped and get contiguous link orders, updates replace the links."""
+        from strawberry import relay
+        component = models.Component.objects.order_by('pk').first()
+        res = self.save([
+            {**self.refs, 'mpn': 'NEW', 'links': self.links[::-1]},
+            {'id': str(relay.GlobalID('Component', str(component.pk))), 'stock': 7, 'links': self.links[2:] + self.links[:1]},
+        ])
+
+        self.assertIsNone(res.errors)
+        created, updated = res.data['saveComponents']
+        self.assertEqual([edge['node']['name'] for edge in created['links']['edges']], ['Link 2', 'Link 1', 'Link 0'])
+        self.assertEqual(created['created'], created['lastModified'])
+        self.assertEqual((updated['stock'], updated['links']['totalCount']), (7, 2))
+        self.assertGreater(updated['lastModified'], updated['created'])
+        self.assertEqual(list(models.OrderedLink.objects.filter(base_component=component).values_list('order', 'link__name')),
+                         [(0, 'Link 2'), (1, 'Link 0')])
+
+    def test_queries_independent_of_batch_size(self) -> None:
+        """A batch is written with the same number of queries however many components it holds."""
+        from django.test.utils import CaptureQueriesContext
+        counts = []
+        for size in (2, 20):
+            with CaptureQueriesContext(connection) as queries:
+                res = self.save([{**self.refs, 'mpn': f'NEW-{i}', 'links': self.links} for i in range(size)])
+            self.assertIsNone(res.errors)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_input(self) -> None:
+        """Unknown references and missing fields fail the whole batch."""
+        res = self.save([{**self.refs, 'mpn': 'NEW'}, {**self.refs, 'links': self.links}])
+        self.assertIn('missing fields mpn', res.errors[0].message)
+        res = self.save([{**self.refs, 'mpn': 'NEW', 'type': self.links[0]}])
+        self.assertIn('Expected the ID of a Type', res.errors[0].message)
+        self.assertFalse(models.Component.objects.filter(mpn='NEW').exists())
+
+
+class ReorderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(3, relations=4)
+        cls.components = list(models.Component.objects.order_by('pk'))
+
+    def orders(self, component) -> list:
+        return list(models.OrderedLink.objects.filter(base_component=component).values_list('order', 'link__name'))
+
+    def test_reorder(self) -> None:
+        """Full orders of many components are written with one update and stay contiguous."""
+        first, second, _ = self.components
+        # A gap, as left by raw SQL
+        models.OrderedLink.objects.filter(base_component=second, order=3).update(order=9)
+        links = {link.name: link.pk for link in models.Link.objects.all()}
+        # The groups, their orders and the `last_modified` of their components
+        with self.assertNumQueries(3):
+            models.OrderedLink.objects.reorder({
+                first.pk: [links[f'Link {i}'] for i in (3, 0, 1, 2)],
+                second.pk: [links[f'Link {i}'] for i in range(4)],
+            }, by='link')
+        self.assertEqual(self.orders(first), [(0, 'Link 3'), (1, 'Link 0'), (2, 'Link 1'), (3, 'Link 2')])
+        self.assertEqual(self.orders(second)[-1], (3, 'Link 3'))
+        with self.assertRaises(ValueError):
+            models.OrderedLink.objects.reorder({first.pk: [links['Link 0']]}, by='link')
+
+    def test_move(self) -> None:
+        """Moves are applied one after the other, positions past the end move to the end."""
+        component = self.components[0]
+        rows = list(models.OrderedLink.objects.filter(base_component=component).values_list('pk', flat=True))
+        models.OrderedLink.objects.move({component.pk: [(rows[0], 10), (rows[3], 0)]})
+        self.assertEqual(self.orders(component), [(0, 'Link 3'), (1, 'Link 1'), (2, 'Link 2'), (3, 'Link 0')])
+
+    def test_mutation(self) -> None:
+        """`reorderComponents` applies full orders and moves and returns the components."""
+        from types import SimpleNamespace
+        from strawberry import relay
+        from .schema import schema
+        user = models.UserModel.objects.get(username='tester')
+        component = self.components[1]
+        links = [str(relay.GlobalID('Link', str(link.pk))) for link in models.Link.objects.order_by('pk')]
+        f_node = str(relay.GlobalID('FNode', str(models.FNode.objects.get(ref='F0').pk)))
+        res = schema.execute_sync(
+            """
+            mutation ($input: [ReorderInput!]!) {
+              reorderComponents(input: $input) { links { edges { node { name } } } fNodes { edges { node { ref } } } }
+            }
+            """,
+            variable_values={'input': [{
+                'component': str(relay.GlobalID('Component', str(component.pk))),
+                'links': links[::-1], 'fNodeMoves': [{'id': f_node, 'position': 3}],
+            }]},
+            context_value=SimpleNamespace(request=SimpleNamespace(user=user)),
+        )
+        self.assertIsNone(res.errors)
+        updated, = res.data['reorderComponents']
+        self.assertEqual([edge['node']['name'] for edge in updated['links']['edges']],
+                         ['Link 3', 'Link 2', 'Link 1', 'Link 0'])
+        self.assertEqual([edge['node']['ref'] for edge in updated['fNodes']['edges']], ['F1', 'F2', 'F3', 'F0'])
+
+    def test_unknown_component(self) -> None:
+        """Unknown components fail the mutation before anything is written."""
+        from types import SimpleNamespace
+        from strawberry import relay
+        from .schema import schema
+        user = models.UserModel.objects.get(username='tester')
+        last_modified = self.components[0].last_modified
+        res = schema.execute_sync(
+            'mutation ($input: [ReorderInput!]!) { reorderComponents(input: $input) { mpn } }',
+            variable_values={'input': [
+                {'component': str(relay.GlobalID('Component', str(self.components[0].pk))), 'links': []},
+                {'component': str(relay.GlobalID('Component', '999'))},
+            ]},
+            context_value=SimpleNamespace(request=SimpleNamespace(user=user)),
+        )
+        self.assertEqual(res.errors[0].message, 'Unknown Component IDs: 999')
+        self.assertEqual(models.Component.objects.get(pk=self.components[0].pk).last_modified, last_modified)
+
+    def test_duplicate_component(self) -> None:
+        """A component listed twice fails the mutation instead of applying only its last entry."""
+        from types import SimpleNamespace
+        from strawberry import relay
+        from .schema import schema
+        user = models.UserModel.objects.get(username='tester')
+        component = str(relay.GlobalID('Component', str(self.components[0].pk)))
+        res = schema.execute_sync(
+            'mutation ($input: [ReorderInput!]!) { reorderComponents(input: $input) { mpn } }',
+            variable_values={'input': [{'component': component, 'links': []}, {'component': component}]},
+            context_value=SimpleNamespace(request=SimpleNamespace(user=user)),
+        )
+        self.assertEqual(res.errors[0].message, f'Duplicate Component IDs: {self.components[0].pk}')
+
+
+class DeltaSyncTests(TestCase):
+    QUERY = """
+    query ($since: DateTime!, $after: String) {
+      componentsChangedSince(since: $since, first: 1, after: $after) {
+        edges { cursor node { mpn } }
+        pageInfo { hasNextPage }
+      }
+      componentsDeletedSince(since: $since) { edges { node { component } } }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(4, relations=2)
+        cls.components = list(models.Component.objects.order_by('pk'))
+
+    def setUp(self) -> None:
+        from django.utils import timezone
+        self.since = timezone.now()
+
+    def changes(self, after=None) -> dict:
+        from .schema import schema
+        res = schema.execute_sync(self.QUERY, variable_values={'since': self.since.isoformat(), 'after': after})
+        self.assertIsNone(res.errors)
+        return res.data
+
+    def test_relation_changes_touch_the_component(self) -> None:
+        """Saved and deleted relation rows count as changes of their component, in the order of the changes."""
+        first, second, third, _ = self.components
+        self.assertEqual(self.changes()['componentsChangedSince']['edges'], [])
+
+        annotated = models.AnnotatedQualification.objects.filter(component=second).first()
+        annotated.annotation = 'AEC-Q200'
+        annotated.save()
+        models.OrderedLink.objects.filter(base_component=third).first().delete()
+        models.Review.objects.filter(component=first).delete()
+
+        data = self.changes()['componentsChangedSince']
+        self.assertEqual([edge['node']['mpn'] for edge in data['edges']], [second.mpn])
+        self.assertTrue(data['pageInfo']['hasNextPage'])
+        data = self.changes(after=data['edges'][0]['cursor'])['componentsChangedSince']
+        self.assertEqual([edge['node']['mpn'] for edge in data['edges']], [third.mpn])
+        data = self.changes(after=data['edges'][0]['cursor'])['componentsChangedSince']
+        self.assertEqual([edge['node']['mpn'] for edge in data['edges']], [first.mpn])
+        self.assertFalse(data['pageInfo']['hasNextPage'])
+
+    def test_deleted_components_leave_tombstones(self) -> None:
+        """Deleted components are reported by their global ID, their cascading relations touch nothing."""
+        from strawberry import relay
+        component = self.components[0]
+        pk = component.pk
+        component.delete()
+        data = self.changes()
+        self.assertEqual(data['componentsChangedSince']['edges'], [])
+        self.assertEqual([edge['node']['component'] for edge in data['componentsDeletedSince']['edges']],
+                         [str(relay.GlobalID('Component', str(pk)))])
+
+    def test_rest(self) -> None:
+        """The REST views list the changed components and the tombstones since `?since=`."""
+        component = self.components[1]
+        component.stock = 3
+        component.save()
+        deleted = self.components[2].pk
+        self.components[2].delete()
+
+        since = {'since': self.since.isoformat()}
+        res = self.client.get('/api-auth/components/changes/', {**since, 'fields': 'id,stock'})
+        self.assertEqual(res.json()['results'], [{'id': component.pk, 'stock': 3}])
+        res = self.client.get('/api-auth/components/deleted/', since)
+        self.assertEqual([row['component_id'] for row in res.json()['results']], [deleted])
+        self.assertEqual(self.client.get('/api-auth/components/changes/').status_code, 400)
+
+    def test_rest_pages_through_equal_timestamps(self) -> None:
+        """Pages of one row step over the rows changed or deleted at the same time, each once."""
+        from django.utils import timezone
+        moment = timezone.now()
+        models.Component.objects.update(last_modified=moment)
+        models.ComponentTombstone.objects.bulk_create(
+            models.ComponentTombstone(component_id=pk, deleted=moment) for pk in range(1000, 1003)
+        )
+
+        def pages(url: str) -> list:
+            rows = []
+            params = {'since': self.since.isoformat(), 'page_size': 1}
+            while url:
+                res = self.client.get(url, params).json()
+                rows += res['results']
+                url, params = res['next'], {}
+            return rows
+
+        self.assertEqual([row['id'] for row in pages('/api-auth/components/changes/')],
+                         [component.pk for component in self.components])
+        self.assertEqual([row['component_id'] for row in pages('/api-auth/components/deleted/')],
+                         [1000, 1001, 1002])
+
+    def test_rest_search_keeps_the_change_order(self) -> None:
+        """Searched changes are still listed oldest change first."""
+        for component in self.components:
+            component.save()
+        res = self.client.get('/api-auth/components/changes/', {'since': self.since.isoformat(), 'search': 'MPN'})
+        self.assertEqual([row['id'] for row in res.json()['results']], [component.pk for component in self.components])
+
+
+class TimestampTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(1)
+        cls.component = models.Component.objects.get()
+
+    def test_bulk_create(self) -> None:
+        """`bulk_create` stamps the timestamps `save()` would set."""
+        component = models.Component.objects.bulk_create([models.Component(
+            type=self.component.type, library=self.component.library, creator=self.component.creator,
+            last_modifier=self.component.creator, lifecycle_state=self.component.lifecycle_state,
+            manufacturer=self.component.manufacturer, mpn='NEW', mounting=self.component.mounting,
+        )])[0]
+        stored = models.Component.objects.get(pk=component.pk)
+        self.assertIsNotNone(stored.created)
+        self.assertEqual(stored.created, stored.last_modified)
+        review = models.Review.objects.bulk_create([models.Review(component=stored, reviewer=stored.creator)])[0]
+        self.assertIsNotNone(models.Review.objects.get(pk=review.pk).date)
+
+    def test_bulk_create_options(self) -> None:
+        """The options of `bulk_create` are forwarded, conflicts of components are refused clearly."""
+        def new(mpn):
+            return models.Component(
+                type=self.component.type, library=self.component.library, creator=self.component.creator,
+                last_modifier=self.component.creator, lifecycle_state=self.component.lifecycle_state,
+                manufacturer=self.component.manufacturer, mpn=mpn, mounting=self.component.mounting,
+            )
+
+        created = models.Component.objects.bulk_create([new('A'), new('B'), new('C')], 2)
+        self.assertEqual(models.Component.objects.filter(pk__in=[c.pk for c in created]).count(), 3)
+        with self.assertRaisesRegex(ValueError, 'conflicts cannot be ignored'):
+            models.Component.objects.bulk_create([new('D')], ignore_conflicts=True)
+
+    def test_bulk_update(self) -> None:
+        """`bulk_update` bumps `last_modified` with the given fields."""
+        component = models.Component.objects.get()
+        component.stock = 5
+        models.Component.objects.bulk_update([component], ['stock'])
+        stored = models.Component.objects.get()
+        self.assertEqual(stored.stock, 5)
+        self.assertGreater(stored.last_modified, self.component.last_modified)
+
+    def test_update(self) -> None:
+        """`update` bumps `last_modified` only with `UPDATE_BUMPS_LAST_MODIFIED`."""
+        models.Component.objects.update(stock=1)
+        self.assertEqual(models.Component.objects.get().last_modified, self.component.last_modified)
+        with override_settings(UPDATE_BUMPS_LAST_MODIFIED=True):
+            models.Component.objects.update(stock=2)
+        self.assertGreater(models.Component.objects.get().last_modified, self.component.last_modified)
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(3)
+
+    def test_fields_shape_the_query(self) -> None:
+        """Only the requested fields are serialized and loaded."""
+        with self.assertNumQueries(1) as queries:
+            res = self.client.get('/api-auth/components/', {'fields': 'id,mpn,stock,manufacturer', 'format': 'json'})
+        self.assertEqual(res.status_code, 200)
+        component = res.json()['results'][0]
+        self.assertEqual(set(component), {'id', 'mpn', 'stock', 'manufacturer'})
+        self.assertEqual(component['manufacturer'], models.Company.objects.get().pk)
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('components_company', sql)
+        self.assertNotIn('auth_user', sql)
+        self.assertNotIn('"components_component"."remarks"', sql)
+
+    def test_expand_nests_foreign_keys(self) -> None:
+        """Expanded foreign keys are serialized as objects from a join."""
+        with self.assertNumQueries(1):
+            res = self.client.get('/api-auth/components/', {'fields': 'id', 'expand': 'manufacturer,creator',
+                                                            'format': 'json'})
+        component = res.json()['results'][0]
+        self.assertEqual(component['manufacturer']['name'], 'ACME')
+        self.assertEqual(component['creator']['username'], 'tester')
+        self.assertNotIn('password', component['creator'])
+
+    def test_unknown_fields_are_rejected(self) -> None:
+        res = self.client.get('/api-auth/components/', {'fields': 'id,nope', 'expand': 'mpn', 'format': 'json'})
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(set(res.json()), {'fields', 'expand'})
+
+
+class ValuesSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(12, relations=3)
+        models.Component.objects.filter(pk__in=models.Component.objects.values('pk')[:3]).update(package=None)
+
+    def assertSameResponse(self, params: dict) -> None:
+        from .views import ComponentViewSet
+        from django.test import RequestFactory
+        request = RequestFactory().get('/api-auth/components/', {**params, 'format': 'json'})
+        responses = [
+            ComponentViewSet.as_view(values_serialization=values_serialization)(request).render().content
+            for values_serialization in (False, True)
+        ]
+        self.assertEqual(responses[0], responses[1])
+
+    def test_output_matches_model_serializer(self) -> None:
+        """Serializing from values() rows produces byte-identical JSON."""
+        self.assertSameResponse({'page_size': 5})
+        self.assertSameResponse({'fields': 'id,mpn,stock,manufacturer,reviews,links'})
+        self.assertSameResponse({'fields': 'id,created', 'expand': 'manufacturer,creator,package'})
+
+    def test_large_pages_use_constant_queries(self) -> None:
+        """A page needs one query for the rows and one per to-many field."""
+        with self.assertNumQueries(5):
+            res = self.client.get('/api-auth/components/', {'page_size': 1000, 'format': 'json'})
+        self.assertEqual(len(res.json()['results']), 12)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_components(5, relations=2)
+
+    def test_ndjson_matches_listing(self) -> None:
+        """Every component is streamed as one JSON line, serialized like the listing."""
+        res = self.client.get('/api-auth/components/export/')
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+        listing = self.client.get('/api-auth/components/', {'format': 'json'}).json()['results']
+        self.assertEqual(sorted(rows, key=lambda row: row['id']), sorted(listing, key=lambda row: row['id']))
+
+    def test_csv_with_modified_since(self) -> None:
+        """The CSV export only holds the components modified since the given time."""
+        import csv
+        from datetime import timedelta
+        from django.utils import timezone
+        changed = models.Component.objects.order_by('pk').first()
+        models.Component.objects.exclude(pk=changed.pk).update(last_modified=timezone.now() - timedelta(days=2))
+
+        res = self.client.get('/api-auth/components/export/', {
+            'format': 'csv', 'fields': 'id,mpn,links',
+            'modified_since': (timezone.now() - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+        rows = list(csv.reader(b''.join(res.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['id', 'mpn', 'links'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][:2], [str(changed.pk), changed.mpn])
+        self.assertEqual(len(json.loads(rows[1][2])), 2)
+
+    async def test_asgi_streams_chunks(self) -> None:
+        """Under ASGI the export is streamed a chunk of lines at a time, not read whole first."""
+        import warnings
+
+        from . import exports
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            res = await self.async_client.get('/api-auth/components/export/')
+            self.assertTrue(res.is_async)
+            lines = b''.join([chunk async for chunk in res.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+
+        chunks = [chunk async for chunk in exports.astream(iter(lines), chunk_size=2)]
+        self.assertEqual(chunks, [''.join(lines[:2]), ''.join(lines[2:4]), lines[4]])
+
+    def test_invalid_modified_since(self) -> None:
+        res = self.client.get('/api-auth/components/export/', {'modified_since': 'yesterday'})
+        self.assertEqual(res.status_code, 400)
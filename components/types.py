@@ -4,6 +4,15 @@ from strawberry import relay
 from strawberry_django_plus import gql
 
 from components import models
+from components.loaders import ForeignKeyLoaderExtension
+from components.optimizer import TotalCountExtension
+from components.pagination import ListConnection
+
+
+def foreign_key():
+    """Foreign key field that is batched through the request's DataLoaders when it was not joined."""
+    return gql.django.field(extensions=[ForeignKeyLoaderExtension()])
+
 
 @gql.django.type(models.UserModel)
 class Profile(relay.Node):
@@ -68,16 +77,16 @@ class Qualification(relay.Node):
 @gql.django.type(models.AnnotatedQualification)
 class AnnotatedQualification(relay.Node):
     annotation: gql.auto
-    component: 'Component'
-    qualification: Qualification
+    component: 'Component' = foreign_key()
+    qualification: Qualification = foreign_key()
 
 
 @gql.django.type(models.Review)
 class Review(relay.Node):
-    annotated_qualification: AnnotatedQualification
-    component: 'Component'
+    annotated_qualification: AnnotatedQualification = foreign_key()
+    component: 'Component' = foreign_key()
     date: gql.auto
-    reviewer: Profile
+    reviewer: Profile = foreign_key()
 
 
 @gql.django.type(models.Package)
@@ -88,15 +97,20 @@ class Package(relay.Node):
 
 @gql.django.type(models.BaseComponent)
 class BaseComponent(relay.Node):
-    type: Type
+    type: Type = foreign_key()
     autogenerate_description: gql.auto
     autogenerate_value: gql.auto
     description: gql.auto
-    f_nodes: gql.django.ListConnectionWithTotalCount[FNode] = gql.django.connection()
-    library: Library
-    links: gql.django.ListConnectionWithTotalCount[Link] = gql.django.connection()
+    f_nodes: ListConnection[FNode] = gql.django.connection()
+    library: Library = foreign_key()
+    links: ListConnection[Link] = gql.django.connection()
     value: gql.auto
 
+    @classmethod
+    def is_type_of(cls, obj, info) -> bool:
+        # A `Component` is a `BaseComponent` too, but resolves to its own type
+        return isinstance(obj, cls) or type(obj) is models.BaseComponent
+
 @gql.django.filter(models.Component, lookups=True)
 class ComponentFilter:
     description: gql.auto
@@ -105,27 +119,36 @@ class ComponentFilter:
 
 @gql.django.type(models.Component, filters=ComponentFilter)
 class Component(relay.Node):
-    type: Type
+    type: Type = foreign_key()
     autogenerate_description: gql.auto
     autogenerate_value: gql.auto
-    creator: Profile
+    creator: Profile = foreign_key()
     created: gql.auto
     description: gql.auto
-    f_nodes: gql.django.ListConnectionWithTotalCount[FNode] = gql.django.connection(prefetch_related=['f_nodes'])
+    f_nodes: ListConnection[FNode] = gql.django.connection(prefetch_related=['f_nodes'], extensions=[TotalCountExtension(counter='f_nodes_count')])
     last_modified: gql.auto
-    last_modifier: Profile
-    library: Library
-    lifecycle_state: LifecycleState
-    links: gql.django.ListConnectionWithTotalCount[Link] = gql.django.connection(prefetch_related=['links'])
-    manufacturer: Company
+    last_modifier: Profile = foreign_key()
+    library: Library = foreign_key()
+    lifecycle_state: LifecycleState = foreign_key()
+    links: ListConnection[Link] = gql.django.connection(prefetch_related=['links'], extensions=[TotalCountExtension(counter='links_count')])
+    manufacturer: Company = foreign_key()
     mpn: gql.auto
-    mounting: MountingType
-    package: Optional[Package]
+    mounting: MountingType = foreign_key()
+    package: Optional[Package] = foreign_key()
     remarks: gql.auto
-    reviews: gql.django.ListConnectionWithTotalCount[Review] = gql.django.connection(prefetch_related=['reviews'])
+    reviews: ListConnection[Review] = gql.django.connection(prefetch_related=['reviews'], extensions=[TotalCountExtension(counter='reviews_count')])
     stock: gql.auto
-    qualifications: gql.django.ListConnectionWithTotalCount[Qualification] = gql.django.connection(prefetch_related=['qualifications'])
+    qualifications: ListConnection[Qualification] = gql.django.connection(prefetch_related=['qualifications'], extensions=[TotalCountExtension(counter='qualifications_count')])
     value: gql.auto
     x: gql.auto
     y: gql.auto
     z: gql.auto
+
+
+@gql.django.type(models.ComponentTombstone)
+class ComponentTombstone(relay.Node):
+    deleted: gql.auto
+
+    @gql.field(description='The global ID the deleted component had.')
+    def component(self) -> relay.GlobalID:
+        return relay.GlobalID('Component', str(self.component_id))
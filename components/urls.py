@@ -1,7 +1,10 @@
 from django.urls import path
 
-from .views import ComponentViewSet
+from .views import ComponentChangesView, ComponentExportView, ComponentTombstoneView, ComponentViewSet
 
 urlpatterns = [
-    path('components/', ComponentViewSet.as_view(), name="list")
+    path('components/', ComponentViewSet.as_view(), name="list"),
+    path('components/export/', ComponentExportView.as_view(), name="export"),
+    path('components/changes/', ComponentChangesView.as_view(), name="changes"),
+    path('components/deleted/', ComponentTombstoneView.as_view(), name="deleted"),
 ]
@@ -1,38 +1,320 @@
-from django.db.models import Count
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Prefetch, QuerySet
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView
 from rest_framework.pagination import CursorPagination
+from rest_framework.relations import ManyRelatedField
+from rest_framework.serializers import ListSerializer, ModelSerializer
+from strawberry.django.context import StrawberryDjangoContext
+from strawberry.django.views import AsyncGraphQLView as BaseAsyncGraphQLView
+from strawberry.http.exceptions import HTTPException
+from strawberry.types import ExecutionResult
 
+from . import changes, conditional, exports, search
+from .documents import PersistedQueryError, resolve_persisted_query
+from .loaders import ModelLoaders
 from .models import Component
-from .serializers import ComponentSerializer
+from .serializers import ComponentSerializer, ComponentTombstoneSerializer, TotalCountField, ValuesSerializer
 
 
 class RecordPagination(CursorPagination):
     page_size = 100
     page_size_query_param = 'page_size'
-    ordering = "-created"
+    max_page_size = 1000
+    # Newest first, ties broken like the keyset cursors along the `(created, basecomponent_ptr)` index
+    ordering = ('-created', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # Search results come best match first
+        if search.RANK in queryset.query.annotations:
+            return (search.RANK, '-created', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class ChangesPagination(RecordPagination):
+    # Oldest change first, ties broken along the `(last_modified, basecomponent_ptr)` index
+    ordering = ('last_modified', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        # Search matches too, the cursor the clients resume from follows the changes
+        return self.ordering
+
+
+class TombstonePagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    # The index of `deleted` holds the row ID too
+    ordering = ('deleted', 'id')
+
+
+def since_param(request) -> datetime:
+    """Return the required `?since=` timestamp of the changes views."""
+    value = request.query_params.get('since')
+    if not value:
+        raise ValidationError({'since': ['This parameter is required.']})
+    try:
+        return exports.parse_modified_since(value)
+    except ValueError as e:
+        raise ValidationError({'since': [str(e)]})
+
+
+def component_queryset(queryset: QuerySet, serializer: ComponentSerializer) -> QuerySet:
+    """Shape `queryset` to load just what the fields of `serializer` read.
+
+    Plain fields, counter columns and foreign keys, which are serialized by primary key,
+    are loaded with `only()`, expanded foreign keys are joined and to-many relations are
+    prefetched by primary key.
+    """
+    # `created` orders the cursor pagination
+    only = {'id', 'created'}
+    select_related = []
+    prefetches: Dict[str, Prefetch] = {}
+
+    def prefetch(name: str, *fields: str) -> None:
+        model_field = Component._meta.get_field(name)
+        if model_field.one_to_many:
+            fields += (model_field.field.name,)
+        related_model = model_field.related_model
+        # Ordered by primary key, the same order `ValuesSerializer` reads them in
+        prefetches.setdefault(name, Prefetch(name, queryset=related_model._default_manager.only(
+            related_model._meta.pk.name, *fields
+        ).order_by('pk')))
+
+    for name, field in serializer.fields.items():
+        if isinstance(field, TotalCountField):
+            only.add(field.counter)
+        elif isinstance(field, ModelSerializer):
+            only.add(name)
+            select_related.append(name)
+        elif isinstance(field, ListSerializer):
+            prefetch(name, *(child.source for child in field.child.fields.values()))
+        elif isinstance(field, ManyRelatedField):
+            prefetch(name)
+        else:
+            only.add(field.source)
+
+    queryset = queryset.only(*only).prefetch_related(*prefetches.values())
+    # Without arguments, select_related() would follow every foreign key
+    return queryset.select_related(*select_related) if select_related else queryset
 
 
 # Create your views here.
 class ComponentViewSet(ListAPIView):
+    """Component listing.
+
+    `?fields=id,mpn` limits the serialized fields and `?expand=manufacturer` nests the
+    named foreign keys; the query loads only what these fields need. `?search=` ranks the
+    full-text matches of `mpn`, `description`, `value` and `remarks`. Pages are
+    serialized from `values()` rows by a `ValuesSerializer` unless
+    `values_serialization` is disabled. Pages carry an ETag, and conditional requests
+    whose `If-None-Match` matches are answered with `304 Not Modified`.
+    """
     pagination_class = RecordPagination
     serializer_class = ComponentSerializer
-    queryset = Component.objects \
-        .select_related(
-            'lifecycle_state',
-            'library',
-            'creator',
-            'last_modifier',
-            'mounting',
-            'manufacturer',
-            'package'
-        ) \
-        .prefetch_related(
-            'f_nodes',
-            'qualifications',
-            'links',
-            'reviews'
-        ) \
-        .annotate(total_count_links=Count("ordered_links", distinct=True)) \
-        .annotate(total_count_f_nodes=Count("ordered_f_nodes", distinct=True)) \
-        .annotate(total_count_qualifications=Count("annotated_qualifications", distinct=True)) \
-        .annotate(total_count_reviews=Count("reviews", distinct=True))
+    queryset = Component.objects.all()
+    values_serialization = True
+    # The columns of the ETag of a page
+    validator_fields = ('pk', 'last_modified', 'links_count', 'f_nodes_count', 'qualifications_count', 'reviews_count')
+
+    def get_sparse_fieldset(self) -> Tuple[Optional[List[str]], List[str]]:
+        request = getattr(self, 'request', None)
+        params = request.query_params if request is not None else {}
+        fields = [name for name in params.get('fields', '').split(',') if name] or None
+        expand = [name for name in params.get('expand', '').split(',') if name]
+
+        errors = {}
+        unknown = set(fields or ()) - set(self.serializer_class().fields)
+        if unknown:
+            errors['fields'] = [f'Unknown field: {name}' for name in sorted(unknown)]
+        unknown = set(expand) - set(self.serializer_class.expandable_fields())
+        if unknown:
+            errors['expand'] = [f'Not an expandable field: {name}' for name in sorted(unknown)]
+        if errors:
+            raise ValidationError(errors)
+        return fields, expand
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs['fields'], kwargs['expand'] = self.get_sparse_fieldset()
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        fields, expand = self.get_sparse_fieldset()
+        queryset = component_queryset(super().get_queryset(), self.serializer_class(fields=fields, expand=expand))
+        request = getattr(self, 'request', None)
+        text = request.query_params.get('search', '').strip() if request is not None else ''
+        return search.search(queryset, text) if text else queryset
+
+    def get_validator_fields(self) -> List[str]:
+        """Return the `validator_fields` and the serialized columns of the expanded foreign keys.
+
+        The related models have no `last_modified`, so the nested rows are compared whole.
+        """
+        _, expand = self.get_sparse_fieldset()
+        serializer = self.serializer_class(expand=expand)
+        return [*self.validator_fields, *(
+            f'{name}__{child.source}' for name in expand for child in serializer.fields[name].fields.values()
+        )]
+
+    def get_etag(self, rows: List[Dict[str, Any]]) -> str:
+        """Return the ETag of a page from the `get_validator_fields()` of its rows.
+
+        Edits, counter changes, insertions and deletions within the page and edits of the
+        expanded rows change the ETag, edits of other related rows alone do not. Pages send
+        no Last-Modified: a deletion shifts the window, whose newest `last_modified` may
+        then be as old as before.
+        """
+        request = self.request
+        validator_fields = self.get_validator_fields()
+        return conditional.etag(
+            request.get_full_path(), request.accepted_media_type,
+            [[row[name] for name in validator_fields] for row in rows],
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = [field.lstrip('-') for field in self.paginator.get_ordering(request, queryset, self)]
+        validator_fields = self.get_validator_fields()
+        response_etag = None
+        if not self.values_serialization or conditional.is_conditional(request):
+            # One query of the validator columns over the page window decides on a 304
+            response_etag = self.get_etag(
+                self.paginate_queryset(queryset.prefetch_related(None).values(*validator_fields, *ordering))
+            )
+            response = conditional.not_modified(request._request, response_etag)
+            if response is not None:
+                return response
+
+        if not self.values_serialization:
+            response = super().list(request, *args, **kwargs)
+        else:
+            serializer = ValuesSerializer(self.get_serializer())
+            page = self.paginate_queryset(serializer.values(queryset, *ordering, *validator_fields))
+            response_etag = response_etag or self.get_etag(page)
+            response = self.get_paginated_response(serializer.to_representation(page))
+        conditional.set_validators(response, response_etag)
+        return response
+
+
+class ComponentChangesView(ComponentViewSet):
+    """The components created or changed after `?since=` (ISO 8601), oldest change first.
+
+    Changes of a component's links, f-nodes, qualifications and reviews count as changes
+    of the component. Accepts the same `fields` and `expand` as the listing; the deleted
+    components are listed by `ComponentTombstoneView`.
+    """
+    pagination_class = ChangesPagination
+
+    def get_queryset(self):
+        return changes.changed_since(super().get_queryset(), since_param(self.request))
+
+
+class ComponentTombstoneView(ListAPIView):
+    """The components deleted after `?since=` (ISO 8601), oldest first."""
+    pagination_class = TombstonePagination
+    serializer_class = ComponentTombstoneSerializer
+
+    def get_queryset(self):
+        return changes.deleted_since(since_param(self.request))
+
+
+class ComponentExportView(ComponentViewSet):
+    """Stream the whole catalogue as NDJSON (default) or CSV, chosen by `?format=` or `Accept`.
+
+    Accepts the same `fields` and `expand` as the listing, and `?modified_since=` with an
+    ISO 8601 timestamp to export only the components modified since then.
+    """
+    renderer_classes = [exports.NDJSONRenderer, exports.CSVRenderer]
+    pagination_class = None
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        modified_since = request.query_params.get('modified_since')
+        if modified_since:
+            try:
+                queryset = queryset.filter(last_modified__gte=exports.parse_modified_since(modified_since))
+            except ValueError as e:
+                raise ValidationError({'modified_since': [str(e)]})
+
+        renderer = request.accepted_renderer
+        lines = exports.stream(queryset, self.get_serializer(), renderer.format)
+        if isinstance(request._request, ASGIRequest):
+            lines = exports.astream(lines)
+        response = StreamingHttpResponse(lines, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['Content-Disposition'] = f'attachment; filename="components.{renderer.format}"'
+        return response
+
+
+@dataclass
+class GraphQLContext(StrawberryDjangoContext):
+    """Request context of the GraphQL view, holding the request's DataLoaders."""
+    loaders: ModelLoaders = field(default_factory=ModelLoaders)
+    # ETag of the response data, set by the response cache
+    etag: Optional[str] = None
+
+
+class AsyncGraphQLView(BaseAsyncGraphQLView):
+    """Async GraphQL view that resolves foreign keys through per-request DataLoaders.
+
+    It also accepts automatic persisted queries: a `persistedQuery.sha256Hash` in the
+    request `extensions` replaces the query text once the document is known. Successful
+    GET queries carry an ETag of their data and are answered with `304 Not Modified`
+    when it matches. Responses from the `GRAPHQL_RESPONSE_CACHE` are validated without
+    executing the query; without that cache it runs, and a 304 only saves the transfer.
+    """
+    request_extensions: Optional[Dict[str, Any]] = None
+    context: Optional[GraphQLContext] = None
+
+    async def get_context(self, request, response) -> GraphQLContext:
+        self.context = GraphQLContext(request=request, response=response)
+        return self.context
+
+    def parse_json(self, data):
+        data = super().parse_json(data)
+        if isinstance(data, dict):
+            self.request_extensions = data.get('extensions')
+        return data
+
+    def parse_query_params(self, params):
+        params = super().parse_query_params(params)
+        if isinstance(params.get('extensions'), str):
+            try:
+                params['extensions'] = json.loads(params['extensions'])
+            except json.JSONDecodeError as e:
+                raise HTTPException(400, 'Unable to parse extensions as JSON') from e
+        self.request_extensions = params.get('extensions')
+        return params
+
+    async def parse_http_body(self, request):
+        request_data = await super().parse_http_body(request)
+        extensions = self.request_extensions
+        if extensions is not None and not isinstance(extensions, dict):
+            raise HTTPException(400, 'The extensions must be a JSON object')
+        persisted_query = (extensions or {}).get('persistedQuery')
+        if persisted_query is not None and not isinstance(persisted_query, dict):
+            raise HTTPException(400, 'The persistedQuery extension must be a JSON object')
+        if persisted_query:
+            request_data.query = resolve_persisted_query(persisted_query.get('sha256Hash'), request_data.query)
+        return request_data
+
+    async def execute_operation(self, request, context, root_value) -> ExecutionResult:
+        try:
+            return await super().execute_operation(request, context, root_value)
+        except PersistedQueryError as e:
+            return ExecutionResult(data=None, errors=[e.as_graphql_error()])
+
+    def create_response(self, response_data, sub_response):
+        if self.request.method != 'GET' or response_data.get('errors') or response_data.get('data') is None:
+            return super().create_response(response_data, sub_response)
+        response_etag = (self.context and self.context.etag) or conditional.etag(response_data['data'], weak=True)
+        response = conditional.not_modified(self.request, response_etag)
+        if response is None:
+            response = super().create_response(response_data, sub_response)
+            conditional.set_validators(response, response_etag)
+        return response
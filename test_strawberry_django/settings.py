@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'components.instrumentation.InstrumentationMiddleware',
+    'components.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -95,6 +97,47 @@ DATABASES = {
     }
 }
 
+# Pragmas applied to every new SQLite connection by `components.sqlite`. WAL lets the
+# readers of several worker processes proceed while one writer commits; `synchronous`
+# NORMAL is durable in WAL mode up to a power loss. Sizes: cache in KiB when negative,
+# memory map in bytes, busy timeout in milliseconds.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'lookups': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lookups',
+        'TIMEOUT': 3600,
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': 300,
+    },
+}
+
+# Cache alias holding the lookup tables (types, lifecycle states, packages, ...).
+# Set it to 'lookups' to resolve those relations from the cache instead of joining them.
+LOOKUP_CACHE = None
+
+# Cache alias of whole GraphQL query responses, invalidated by writes to the models they
+# read. Set it to 'responses' (or a file-based cache shared by the workers) to enable it.
+GRAPHQL_RESPONSE_CACHE = None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -144,4 +187,33 @@ INTERNAL_IPS = [
 STRAWBERRY_DJANGO = {
     "FIELD_DESCRIPTION_FROM_HELP_TEXT": True,
     "TYPE_DESCRIPTION_FROM_MODEL_DOCSTRING": True,
-}
\ No newline at end of file
+}
+
+# Number of parsed and validated GraphQL documents kept in memory per process
+GRAPHQL_DOCUMENT_CACHE_SIZE = 256
+
+# Most nodes a GraphQL operation is estimated to resolve, from the page sizes of its
+# nested connections; over it, 'reject' fails the operation with an error. 'clamp' instead
+# quietly lowers the page sizes, which clients only learn from `extensions.cost`
+GRAPHQL_QUERY_COST_LIMIT = 50_000
+GRAPHQL_QUERY_COST_POLICY = 'reject'
+
+# Whether `QuerySet.update()` on models with a `last_modified` timestamp sets it too, as
+# `save()` and the managers' `bulk_update()` always do
+UPDATE_BUMPS_LAST_MODIFIED = False
+
+# Fraction of the requests whose SQL queries and GraphQL resolvers are timed, reported in
+# a `Server-Timing` header and the `instrumentation` key of the GraphQL `extensions`. The
+# requests that are not sampled pay next to nothing; 0 turns it off.
+INSTRUMENTATION_SAMPLE_RATE = 0.0
+
+# Sampling profiler of the requests to PROFILING_PATHS: every PROFILING_EVERY-th of them (0 for
+# none) and those slower than PROFILING_SLOW_MS milliseconds (None for none) leave a profile and
+# a summary in PROFILING_DIR, which keeps the newest PROFILING_MAX_FILES. The stacks are sampled
+# every PROFILING_INTERVAL seconds; `manage.py aggregate_profiles` reports the hot functions.
+PROFILING_PATHS = ('/graphql/', '/api-auth/components/')
+PROFILING_EVERY = 0
+PROFILING_SLOW_MS = None
+PROFILING_INTERVAL = 0.005
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_FILES = 200
@@ -18,13 +18,13 @@ from django.contrib import admin
 from django.urls import include, path, re_path
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import RedirectView
-from strawberry.django.views import GraphQLView
 from components.schema import schema
+from components.views import AsyncGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('components.urls')),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(schema=schema))),
+    path('graphql/', csrf_exempt(AsyncGraphQLView.as_view(schema=schema))),
     path("__debug__/", include("debug_toolbar.urls")),
     re_path(r'^$', csrf_exempt(RedirectView.as_view(url="/graphql/")))
 ]